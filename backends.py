@@ -0,0 +1,390 @@
+"""
+Routing API calls across several backends.
+
+A backend is one API key on one OpenAI-compatible endpoint. With several
+keys (each with its own quota) or endpoints, BackendPool sends each attempt
+to the backend expected to answer soonest, judged by its recent latency,
+the calls it already has in flight, its error rate and the quota it has
+left (from its own rate limiter and the x-ratelimit-* response headers).
+
+Each backend has a circuit breaker: after CIRCUIT_FAILURES consecutive
+failures it gets no calls for CIRCUIT_COOLDOWN seconds, then a single trial
+call decides whether it is healthy again. A 429 takes a backend out of
+rotation until its quota resets instead of counting as a failure.
+"""
+import os
+import re
+import json
+import time
+import random
+import threading
+
+from rate_limiter import RateLimiter, RetryPolicy
+
+# Consecutive failures that open a backend's circuit
+CIRCUIT_FAILURES = 5
+
+# Seconds an open circuit keeps a backend out of rotation before a trial call
+CIRCUIT_COOLDOWN = 30.0
+
+# Weight of the newest observation in the latency and error rate averages
+LATENCY_SMOOTHING = 0.2
+ERROR_SMOOTHING = 0.1
+
+# Latency assumed for a backend before its first call (seconds)
+DEFAULT_LATENCY = 1.0
+
+# How long a rate-limited backend rests when the 429 doesn't say (seconds)
+DEFAULT_RATE_LIMIT_PAUSE = 1.0
+
+# Circuit states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value):
+    """Parse a rate limit reset time such as "1s", "6m0s" or "20ms" into seconds (None if unknown)."""
+    parts = DURATION_PATTERN.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class Backend:
+    """
+    One API key on one endpoint, with its health statistics.
+
+    The statistics are updated by the BackendPool the backend belongs to,
+    under the pool's lock.
+    """
+
+    def __init__(self, name=None, base_url=None, api_key=None, weight=1.0, rpm=None, tpm=None):
+        """
+        Args:
+            name (str): Name shown in stats (defaults to the endpoint and
+                the end of the key)
+            base_url (str): OpenAI-compatible endpoint (defaults to OpenAI's)
+            api_key (str): API key (defaults to OPENAI_API_KEY)
+            weight (float): Relative capacity; a backend with weight 2 is
+                given about twice the concurrent calls of one with weight 1
+            rpm (float): Client-side requests-per-minute limit of this key
+            tpm (float): Client-side tokens-per-minute limit of this key
+        """
+        self.base_url = base_url
+        self.api_key = api_key
+        self.weight = weight
+        self.rate_limiter = RateLimiter(rpm, tpm) if rpm or tpm else None
+        if name is None:
+            key = api_key or os.getenv("OPENAI_API_KEY") or ""
+            name = f"{base_url or 'api.openai.com'} ...{key[-4:]}" if key else base_url or "api.openai.com"
+        self.name = name
+
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = None
+        self.error_rate = 0.0
+
+        # Circuit breaker: consecutive failures, when the circuit opened, and
+        # whether its trial call is running
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+        # Quota: requests left in the current window (from response headers)
+        # and when the backend may be used again after running out or a 429
+        self.remaining_requests = None
+        self.paused_until = 0.0
+
+        self._client = None
+        self._client_generation = None
+        self._client_lock = threading.Lock()
+
+    def client(self, pool):
+        """Return this backend's OpenAI client on the given ConnectionPool (created on first use)."""
+        with self._client_lock:
+            if self._client is None or self._client_generation != pool.generation:
+                from openai import OpenAI
+                self._client = OpenAI(api_key=self.api_key or os.getenv("OPENAI_API_KEY"),
+                                      base_url=self.base_url, max_retries=0,
+                                      http_client=pool.http_client)
+                self._client_generation = pool.generation
+            return self._client
+
+
+class BackendPool:
+    """
+    Health-aware routing across several backends.
+
+    Callers take a backend with acquire() (or choose() to wait themselves)
+    before each attempt and report the outcome with release(). Safe to share
+    between threads.
+    """
+
+    def __init__(self, backends, failure_threshold=CIRCUIT_FAILURES, cooldown=CIRCUIT_COOLDOWN):
+        """
+        Args:
+            backends (list): Backend instances to route between
+            failure_threshold (int): Consecutive failures that open a
+                backend's circuit
+            cooldown (float): Seconds an open circuit lasts before a trial call
+        """
+        if not backends:
+            raise ValueError("A backend pool needs at least one backend")
+        self.backends = list(backends)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.backends)
+
+    @classmethod
+    def from_config(cls, entries, **kwargs):
+        """
+        Create a pool from a list of backend settings.
+
+        Args:
+            entries (list): Dictionaries with any of "name", "base_url",
+                "api_key" (or "api_key_env", the environment variable
+                holding it), "weight", "rpm" and "tpm"
+        """
+        backends = []
+        for entry in entries:
+            entry = dict(entry)
+            if "api_key_env" in entry:
+                entry["api_key"] = os.getenv(entry.pop("api_key_env"))
+            backends.append(Backend(**entry))
+        return cls(backends, **kwargs)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Create a pool from a JSON (or YAML) file holding a list of backend settings (see from_config)."""
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError("Reading YAML backend files requires PyYAML (pip install pyyaml)")
+                entries = yaml.safe_load(f)
+            else:
+                entries = json.load(f)
+        return cls.from_config(entries, **kwargs)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a pool from OPENAI_API_KEYS and/or OPENAI_BASE_URLS (comma separated).
+
+        Keys and endpoints are paired up in order; a single key is used on
+        every endpoint and a single endpoint (or none) with every key.
+
+        Returns:
+            BackendPool: The pool, or None unless they describe several backends
+        """
+        keys = [key.strip() for key in os.getenv("OPENAI_API_KEYS", "").split(",") if key.strip()]
+        urls = [url.strip() for url in os.getenv("OPENAI_BASE_URLS", "").split(",") if url.strip()]
+        count = max(len(keys), len(urls))
+        if count < 2:
+            return None
+        if len(keys) > 1 and len(urls) > 1 and len(keys) != len(urls):
+            raise ValueError("OPENAI_API_KEYS and OPENAI_BASE_URLS must list the same number of entries")
+
+        keys = keys if len(keys) > 1 else (keys or [None]) * count
+        urls = urls if len(urls) > 1 else (urls or [None]) * count
+        return cls([Backend(base_url=url, api_key=key) for url, key in zip(urls, keys)])
+
+    def _state(self, backend, now):
+        """Return a backend's circuit state at time.monotonic() value now."""
+        if backend.opened_at is None:
+            return CLOSED
+        return OPEN if now - backend.opened_at < self.cooldown else HALF_OPEN
+
+    def _expected_wait(self, backend, tokens, now):
+        """Seconds a call sent to backend now is expected to take, or None if it can't take one."""
+        state = self._state(backend, now)
+        if state == OPEN or (state == HALF_OPEN and backend.trial):
+            return None
+        if now < backend.paused_until:
+            return None
+        if backend.remaining_requests is not None and backend.remaining_requests <= backend.in_flight:
+            return None
+
+        # Calls already in flight share the backend; errors mean retries
+        latency = backend.latency if backend.latency is not None else DEFAULT_LATENCY
+        expected = latency * (1 + backend.in_flight / backend.weight) / max(0.05, 1.0 - backend.error_rate)
+        if backend.rate_limiter is not None:
+            expected += backend.rate_limiter.delay(tokens)
+        return expected
+
+    def choose(self, tokens=0, exclude=()):
+        """
+        Pick the backend for one attempt and count it as in flight.
+
+        Args:
+            tokens (int): Estimated tokens of the request
+            exclude (iterable): Backends to avoid (e.g. ones this call
+                already failed on) unless no other backend is available
+
+        Returns:
+            tuple: (backend, 0.0), or (None, seconds until a backend may be
+                available) when every backend's circuit is open or its
+                quota is used up
+        """
+        with self._lock:
+            now = time.monotonic()
+            best = None
+            best_key = None
+            for backend in self.backends:
+                expected = self._expected_wait(backend, tokens, now)
+                if expected is None:
+                    continue
+                # Prefer backends not excluded, then the quickest (random tie-break)
+                key = (backend in exclude, expected, random.random())
+                if best_key is None or key < best_key:
+                    best, best_key = backend, key
+
+            if best is None:
+                return None, self._next_available(now)
+
+            if self._state(best, now) == HALF_OPEN:
+                best.trial = True
+            best.in_flight += 1
+            return best, 0.0
+
+    def available(self, tokens=0, exclude=()):
+        """Return True if a backend not in exclude could take a call right now."""
+        with self._lock:
+            now = time.monotonic()
+            return any(backend not in exclude and self._expected_wait(backend, tokens, now) is not None
+                       for backend in self.backends)
+
+    def _next_available(self, now):
+        """Seconds until the first unavailable backend may take calls again."""
+        waits = []
+        for backend in self.backends:
+            wait = max(0.0, backend.paused_until - now)
+            if backend.opened_at is not None:
+                wait = max(wait, backend.opened_at + self.cooldown - now)
+            waits.append(wait)
+        # A backend held back only by calls in flight frees up when one finishes
+        return max(0.01, min(waits))
+
+    def acquire(self, tokens=0, exclude=(), cancel=None, deadline_at=None):
+        """
+        Wait for a backend (see choose), then for its rate limiter.
+
+        Args:
+            tokens (int): Estimated tokens of the request
+            exclude (iterable): Backends to avoid if possible
+            cancel (threading.Event): Stop waiting once set
+            deadline_at (float): time.perf_counter() value to stop waiting at
+
+        Returns:
+            Backend: The backend, counted as in flight until release(), or
+                None if cancelled or the deadline passed first
+        """
+        while True:
+            backend, wait = self.choose(tokens, exclude)
+            if backend is not None:
+                break
+            if deadline_at is not None:
+                remaining = deadline_at - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                wait = min(wait, remaining)
+            if cancel is not None:
+                if cancel.wait(wait):
+                    return None
+            else:
+                time.sleep(wait)
+
+        if backend.rate_limiter is not None:
+            backend.rate_limiter.acquire(tokens)
+        return backend
+
+    def release(self, backend, latency=None, error=None, headers=None, aborted=False):
+        """
+        Record the outcome of an attempt on a backend.
+
+        Args:
+            backend (Backend): Backend from choose() or acquire()
+            latency (float): Seconds the attempt took, if it succeeded
+            error (Exception): The error it failed with, if it failed
+            headers (Mapping): Response headers, for the remaining quota
+            aborted (bool): The attempt was dropped by the caller (cancelled,
+                or a hedge that lost its race), so it says nothing about the
+                backend's health; an aborted trial call leaves the circuit
+                as it was, ready for another trial
+        """
+        with self._lock:
+            now = time.monotonic()
+            backend.in_flight -= 1
+            backend.trial = False
+            if aborted:
+                return
+            backend.calls += 1
+            rate_limited = error is not None and RetryPolicy.is_rate_limit(error)
+            # Only errors worth retrying (server and connection errors) count
+            # against a backend's health; invalid requests fail anywhere
+            failed = error is not None and not rate_limited and RetryPolicy.is_retryable(error)
+
+            if rate_limited:
+                # Out of quota rather than unhealthy: rest until it resets
+                pause = RetryPolicy.retry_after(error) or DEFAULT_RATE_LIMIT_PAUSE
+                backend.paused_until = max(backend.paused_until, now + pause)
+                backend.errors += 1
+            elif failed:
+                backend.errors += 1
+                backend.failures += 1
+                if backend.opened_at is not None or backend.failures >= self.failure_threshold:
+                    # A failed trial call reopens the circuit for another cooldown
+                    backend.opened_at = now
+            else:
+                backend.failures = 0
+                backend.opened_at = None
+                if latency is not None:
+                    backend.latency = latency if backend.latency is None else (
+                        LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * backend.latency)
+            backend.error_rate += ERROR_SMOOTHING * (failed - backend.error_rate)
+
+            if headers is not None:
+                self._read_quota(backend, headers, now)
+
+    @staticmethod
+    def _read_quota(backend, headers, now):
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is None or not remaining.isdigit():
+            return
+        backend.remaining_requests = int(remaining)
+        if backend.remaining_requests == 0:
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            backend.paused_until = max(backend.paused_until, now + (reset or DEFAULT_RATE_LIMIT_PAUSE))
+            backend.remaining_requests = None
+
+    def stats(self):
+        """
+        Report each backend's health.
+
+        Returns:
+            list: One dictionary per backend with its "name", circuit
+                "state", "calls", "errors", "in_flight", smoothed
+                "latency" (None before its first success) and "error_rate",
+                and "remaining_requests" (None if unknown)
+        """
+        with self._lock:
+            now = time.monotonic()
+            return [{
+                "name": backend.name,
+                "state": self._state(backend, now),
+                "calls": backend.calls,
+                "errors": backend.errors,
+                "in_flight": backend.in_flight,
+                "latency": backend.latency,
+                "error_rate": backend.error_rate,
+                "remaining_requests": backend.remaining_requests
+            } for backend in self.backends]
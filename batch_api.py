@@ -0,0 +1,89 @@
+import json
+import tempfile
+
+# Endpoint every batch line is sent to
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# The only completion window the Batch API offers
+COMPLETION_WINDOW = "24h"
+
+# Most requests the Batch API accepts in one input file; larger sweeps are
+# split across several jobs
+MAX_BATCH_REQUESTS = 50000
+
+# Seconds between status checks of running jobs
+DEFAULT_POLL_INTERVAL = 30.0
+
+# Batch jobs are billed at half the synchronous price
+BATCH_PRICE_FACTOR = 0.5
+
+# Job statuses after which nothing more will happen
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def custom_id(index):
+    """Return the custom_id that ties a batch line to its request index."""
+    return f"request-{index}"
+
+
+def index_from_custom_id(value):
+    """Return the request index encoded by custom_id(), or None if it isn't one."""
+    prefix, _, index = (value or "").partition("-")
+    return int(index) if prefix == "request" and index.isdigit() else None
+
+
+def write_batch_input(requests):
+    """
+    Write a Batch API input file.
+
+    The file is spooled to disk once it grows large, so sweeps of tens of
+    thousands of requests don't have to fit in memory twice.
+
+    Args:
+        requests (iterable): (index, request) pairs, where request holds the
+            chat completions keyword arguments (see build_request)
+
+    Returns:
+        tuple: (file object positioned at the start, number of lines written)
+    """
+    f = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    count = 0
+    for index, request in requests:
+        line = {"custom_id": custom_id(index), "method": "POST", "url": BATCH_ENDPOINT, "body": request}
+        f.write(json.dumps(line).encode("utf-8") + b"\n")
+        count += 1
+    f.seek(0)
+    return f, count
+
+
+def parse_batch_line(line):
+    """
+    Parse one line of a batch output or error file.
+
+    Returns:
+        tuple: (index, body, error)
+            - index (int): Request index from the line's custom_id (None if unknown)
+            - body (dict): The chat completion, or None if the request failed
+            - error (str): Why the request failed, or None on success
+    """
+    record = json.loads(line)
+    index = index_from_custom_id(record.get("custom_id"))
+
+    error = record.get("error")
+    if error:
+        return index, None, error.get("message") or error.get("code") or "Batch request failed"
+
+    response = record.get("response") or {}
+    body = response.get("body")
+    if response.get("status_code") != 200:
+        message = ((body or {}).get("error") or {}).get("message")
+        return index, None, message or f"Batch request failed with status {response.get('status_code')}"
+    return index, body, None
+
+
+def job_failure(batch):
+    """Describe why a job ended without output for some of its requests."""
+    errors = getattr(getattr(batch, "errors", None), "data", None) or []
+    messages = [error.message for error in errors if getattr(error, "message", None)]
+    detail = f": {'; '.join(messages)}" if messages else ""
+    return f"Batch job {batch.id} {batch.status}{detail}"
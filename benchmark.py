@@ -0,0 +1,342 @@
+"""
+Offline throughput benchmark for OpenAIWrapper.
+
+Starts mock_server.py in a subprocess (so the server doesn't compete with the
+wrapper for the GIL) and points the wrapper at it through base_url. Then it
+measures:
+
+    single   generate_response called back to back
+    batch    batch_generate at each concurrency level and sweep size
+
+For each scenario it reports calls/sec, p50/p95/p99 latency, errors and peak
+Python memory (tracemalloc). Results are written as JSON, tagged with the
+current git commit, so runs can be compared across commits:
+
+    python benchmark.py --latency lognormal:0.2,0.5 --concurrency 1 8 32 --sizes 36 360
+    python benchmark.py --compare benchmark_results/old.json
+
+Use --base-url to benchmark against an already running server instead.
+
+--startup measures startup instead: the time to import openai_wrapper and
+prompt_playground, and until the playground window is ready (when a display
+is available), each in a fresh interpreter. It exits with status 1 if a
+scenario imports one of STARTUP_DEFERRED_MODULES, which should only load
+once results arrive.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+
+from openai_wrapper import OpenAIWrapper
+from rate_limiter import RetryPolicy
+from metrics import percentile
+
+# Where results are written by default
+DEFAULT_RESULTS_DIR = "benchmark_results"
+
+# Startup scenarios: code timed in a fresh interpreter
+STARTUP_SCENARIOS = (
+    ("import_openai_wrapper", "import openai_wrapper"),
+    ("import_playground", "import prompt_playground"),
+    ("window_ready", "import prompt_playground; app = prompt_playground.PromptPlayground(); app.update(); app.destroy()"),
+)
+
+# Heavy modules no startup scenario may import
+STARTUP_DEFERRED_MODULES = ("numpy", "pyarrow")
+
+
+def start_mock_server(args):
+    """
+    Launch mock_server.py on a free port.
+
+    Returns:
+        tuple: (process, base_url)
+    """
+    command = [
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py"),
+        "--port", "0", "--latency", args.latency, "--token-interval", str(args.token_interval),
+        "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate)
+    ]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Listening on "):
+        process.kill()
+        raise SystemExit("Mock server failed to start")
+    return process, line.split()[-1]
+
+
+def git_commit():
+    """Return the current git commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def sweep_grid(size):
+    """Build batch_generate parameter lists with size cells in total."""
+    temperatures = [round(2.0 * i / size, 6) for i in range(size)]
+    return temperatures, [150], [0.0], [0.0]
+
+
+def summarize(name, elapsed, latencies, errors, peak_memory, **details):
+    """Build the result record of one scenario."""
+    calls = len(latencies)
+    return {
+        "scenario": name,
+        **details,
+        "calls": calls,
+        "errors": errors,
+        "seconds": elapsed,
+        "calls_per_second": calls / elapsed if elapsed > 0 else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "peak_memory_bytes": peak_memory
+    }
+
+
+def measure(function):
+    """
+    Run function while tracking time and peak Python memory.
+
+    Returns:
+        tuple: (function's return value, elapsed seconds, peak bytes)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        value = function()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, elapsed, peak
+
+
+def bench_single(wrapper, calls, stream=False):
+    """Call generate_response back to back."""
+    def run():
+        latencies = []
+        errors = 0
+        for i in range(calls):
+            start = time.perf_counter()
+            if stream:
+                response = wrapper.generate_response("gpt-3.5-turbo", "You are a copywriter.", "Describe:",
+                                                     f"product {i}", temperature=0.7, stream=True)
+                for _ in response:
+                    pass
+                error = response.error
+            else:
+                _, error = wrapper.generate_response("gpt-3.5-turbo", "You are a copywriter.", "Describe:",
+                                                     f"product {i}", temperature=0.7)
+            latencies.append(time.perf_counter() - start)
+            errors += bool(error)
+        return latencies, errors
+
+    (latencies, errors), elapsed, peak = measure(run)
+    return summarize("single_stream" if stream else "single", elapsed, latencies, errors, peak,
+                     concurrency=1, size=calls)
+
+
+def bench_batch(wrapper, size, concurrency):
+    """Run one batch_generate sweep of the given size."""
+    def run():
+        return wrapper.batch_generate("gpt-3.5-turbo", "You are a copywriter.", "Describe:", "product",
+                                      *sweep_grid(size), max_workers=concurrency)
+
+    results, elapsed, peak = measure(run)
+    latencies = [result["latency"] for result in results]
+    errors = sum("error" in result for result in results)
+    return summarize("batch", elapsed, latencies, errors, peak, concurrency=concurrency, size=size)
+
+
+def bench_startup(runs):
+    """
+    Time each startup scenario in fresh interpreters.
+
+    Scenarios that can't run here (e.g. window_ready without a display) are
+    skipped.
+
+    Returns:
+        list: Scenario records with the median and best "seconds", and the
+        "deferred_imports" (see STARTUP_DEFERRED_MODULES) the scenario loaded
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PLAYGROUND_WARM_UP="0")
+
+    scenarios = []
+    for name, code in STARTUP_SCENARIOS:
+        script = (f"import sys, time; start = time.perf_counter(); {code}; elapsed = time.perf_counter() - start; "
+                  f"print(elapsed, *(name for name in {STARTUP_DEFERRED_MODULES!r} if name in sys.modules))")
+        timings = []
+        deferred = set()
+        for _ in range(runs):
+            completed = subprocess.run([sys.executable, "-c", script], cwd=directory, env=env,
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                break
+            fields = completed.stdout.splitlines()[-1].split()
+            timings.append(float(fields[0]))
+            deferred.update(fields[1:])
+
+        if len(timings) < runs:
+            print(f"{name:>22} skipped (failed to run here)", file=sys.stderr)
+            continue
+        scenarios.append({
+            "scenario": name,
+            "size": None,
+            "concurrency": None,
+            "runs": runs,
+            "seconds": statistics.median(timings),
+            "seconds_min": min(timings),
+            "deferred_imports": sorted(deferred)
+        })
+        print(f"{name:>22} median {scenarios[-1]['seconds'] * 1000:7.1f} ms"
+              f"  best {scenarios[-1]['seconds_min'] * 1000:7.1f} ms", file=sys.stderr)
+        if deferred:
+            print(f"{name:>22} imported {', '.join(sorted(deferred))} at startup", file=sys.stderr)
+    return scenarios
+
+
+def run_benchmarks(args, base_url):
+    """Run every scenario and return the list of scenario records."""
+    # Short backoff: the mock's Retry-After is what paces retries
+    wrapper = OpenAIWrapper(base_url=base_url, api_key=os.getenv("OPENAI_API_KEY") or "mock",
+                            retry_policy=RetryPolicy(max_retries=args.max_retries, base_delay=0.05))
+
+    # Warm up connections and imports so the first scenario isn't penalised
+    wrapper.generate_response("gpt-3.5-turbo", "", "Warm up", "product")
+
+    scenarios = [bench_single(wrapper, args.single_calls),
+                 bench_single(wrapper, args.single_calls, stream=True)]
+    print_scenario(scenarios[0])
+    print_scenario(scenarios[1])
+    for size in args.sizes:
+        for concurrency in args.concurrency:
+            scenarios.append(bench_batch(wrapper, size, concurrency))
+            print_scenario(scenarios[-1])
+    return scenarios
+
+
+def print_scenario(record):
+    p95 = record["latency_p95"]
+    print(f"{record['scenario']:>14} size={record['size']:<6} concurrency={record['concurrency']:<4}"
+          f" {record['calls_per_second'] or 0:8.1f} calls/s  p95 {p95 if p95 is not None else 0:6.3f}s"
+          f"  errors {record['errors']:<4} peak {record['peak_memory_bytes'] / 1024 / 1024:6.1f} MiB",
+          file=sys.stderr)
+
+
+def scenario_key(record):
+    return record["scenario"], record["size"], record["concurrency"]
+
+
+def compare(baseline, current):
+    """Print the calls/sec and p95 change of every scenario found in both runs."""
+    previous = {scenario_key(record): record for record in baseline["scenarios"]}
+    print(f"Compared with {baseline.get('commit') or 'unknown commit'}:", file=sys.stderr)
+    for record in current["scenarios"]:
+        before = previous.get(scenario_key(record))
+        if before is None:
+            continue
+        if "calls_per_second" not in record:
+            change = record["seconds"] / before["seconds"] - 1
+            print(f"{record['scenario']:>22} seconds {change:+7.1%}", file=sys.stderr)
+            continue
+        if not before["calls_per_second"] or before["latency_p95"] is None:
+            continue
+        throughput = record["calls_per_second"] / before["calls_per_second"] - 1
+        p95 = record["latency_p95"] / before["latency_p95"] - 1 if before["latency_p95"] else 0.0
+        print(f"{record['scenario']:>14} size={record['size']:<6} concurrency={record['concurrency']:<4}"
+              f" calls/s {throughput:+7.1%}  p95 {p95:+7.1%}", file=sys.stderr)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark OpenAIWrapper against a local mock server.")
+    parser.add_argument("--base-url", help="Use an already running server instead of starting mock_server.py")
+    parser.add_argument("--latency", default="lognormal:0.1,0.5",
+                        help="Mock server latency distribution (see mock_server.py)")
+    parser.add_argument("--token-interval", type=float, default=0.0,
+                        help="Mock server delay between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock server 500 rate")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Mock server 429 rate")
+    parser.add_argument("--seed", type=int, default=0, help="Mock server random seed")
+    parser.add_argument("--single-calls", type=int, default=20,
+                        help="Calls made in the back-to-back generate_response scenarios")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="batch_generate worker counts to measure")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[36, 360],
+                        help="batch_generate sweep sizes to measure")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per call")
+    parser.add_argument("-o", "--output",
+                        help=f"Results file (default: {DEFAULT_RESULTS_DIR}/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--startup", action="store_true",
+                        help="Measure import and window startup time instead of throughput")
+    parser.add_argument("--startup-runs", type=int, default=5,
+                        help="Fresh interpreters started per startup scenario")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    process = None
+    base_url = args.base_url
+    if args.startup:
+        scenarios = bench_startup(args.startup_runs)
+    else:
+        if base_url is None:
+            process, base_url = start_mock_server(args)
+        try:
+            scenarios = run_benchmarks(args, base_url)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": None if args.base_url or args.startup else {
+            "latency": args.latency,
+            "token_interval": args.token_interval,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+            "seed": args.seed
+        },
+        "scenarios": scenarios
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(DEFAULT_RESULTS_DIR, f"{stamp}-{(commit or 'nocommit')[:10]}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    if any(scenario.get("deferred_imports") for scenario in scenarios):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+import os
+import time
+import socket
+import threading
+
+import httpx
+
+# Default pool limits and timeouts (seconds). Completions can take a while to
+# generate, so reads get much longer than connects.
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+DEFAULT_WRITE_TIMEOUT = 30.0
+DEFAULT_POOL_TIMEOUT = 60.0
+
+# Trace events that mark a request getting hold of a connection
+_CONNECTION_ACQUIRED_EVENTS = (
+    "connection.connect_tcp.started",
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+)
+
+# Trace events up to the response headers, where an aborted request stops
+_ABORTABLE_EVENTS = (
+    "connection.connect_tcp.started",
+    "connection.start_tls.started",
+    "http11.send_request_headers.started",
+    "http11.send_request_body.started",
+    "http11.receive_response_headers.started",
+    "http2.send_request_headers.started",
+    "http2.send_request_body.started",
+    "http2.receive_response_headers.started",
+)
+
+
+class _PoolTracer:
+    """Tracks one request through the connection pool via the httpx trace extension."""
+
+    def __init__(self, started):
+        self.started = started
+        # Every connection was busy when the request arrived
+        self.queued = False
+        self.acquired = None
+        self.connected = False
+        self.aborted = False
+
+    def event(self, name):
+        if self.aborted and name in _ABORTABLE_EVENTS:
+            raise ConnectionAbortedError("Request aborted")
+        if self.acquired is None and name in _CONNECTION_ACQUIRED_EVENTS:
+            self.acquired = time.perf_counter()
+        if name == "connection.connect_tcp.started":
+            self.connected = True
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """A response body that hands its connection back to the ConnectionPool's count when closed."""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            if self.release is not None:
+                self.release()
+                self.release = None
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """Asynchronous counterpart of _ReleasingStream."""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if self.release is not None:
+                self.release()
+                self.release = None
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """
+    An HTTP transport that reports connection use to its ConnectionPool.
+
+    It counts the requests holding a connection (until their response is
+    closed), so the pool knows when a request has to queue and when a
+    retired transport has drained.
+    """
+
+    def __init__(self, pool, max_connections, **kwargs):
+        super().__init__(**kwargs)
+        self.connection_pool = pool
+        self.max_connections = max_connections
+        self.active = 0
+        self.retired = False
+
+    def handle_request(self, request):
+        pool = self.connection_pool
+        thread = threading.get_ident()
+        tracer = _PoolTracer(time.perf_counter())
+        tracer.queued = pool._acquire(self, thread, request.extensions, tracer)
+        request.extensions["trace"] = lambda name, info: tracer.event(name)
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            pool._release(self, thread)
+            raise
+        finally:
+            pool._record(tracer)
+        response.stream = _ReleasingStream(response.stream, lambda: pool._release(self, thread))
+        return response
+
+
+class _AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    """Asynchronous counterpart of _CountingTransport."""
+
+    def __init__(self, pool, max_connections, **kwargs):
+        super().__init__(**kwargs)
+        self.connection_pool = pool
+        self.max_connections = max_connections
+        self.active = 0
+        self.retired = False
+
+    async def handle_async_request(self, request):
+        pool = self.connection_pool
+        tracer = _PoolTracer(time.perf_counter())
+        tracer.queued = pool._acquire(self)
+
+        async def trace(name, info):
+            tracer.event(name)
+
+        request.extensions["trace"] = trace
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            pool._release(self)
+            raise
+        finally:
+            pool._record(tracer)
+        response.stream = _AsyncReleasingStream(response.stream, lambda: pool._release(self))
+        return response
+
+
+class ConnectionPool:
+    """
+    A tuned HTTP connection pool shared by the wrappers' API clients.
+
+    Holds one httpx client with explicit connection limits, keep-alive and
+    timeouts (and optionally HTTP/2), so every worker thread reuses the same
+    warm connections instead of paying new TLS handshakes. The pool grows
+    when a batch needs more connections than it allows (see
+    ensure_capacity), and counts connections opened, reused and waited for.
+    It is safe to share one instance between threads.
+    """
+
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS, max_keepalive_connections=None,
+                 keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, write_timeout=DEFAULT_WRITE_TIMEOUT,
+                 pool_timeout=DEFAULT_POOL_TIMEOUT, http2=False):
+        """
+        Args:
+            max_connections (int): Maximum number of open connections
+            max_keepalive_connections (int): Idle connections kept open for
+                reuse (defaults to max_connections)
+            keepalive_expiry (float): Seconds an idle connection is kept open
+            connect_timeout (float): Seconds allowed to establish a connection
+            read_timeout (float): Seconds allowed between bytes of a response
+            write_timeout (float): Seconds allowed to send a request
+            pool_timeout (float): Seconds a request may wait for a free connection
+            http2 (bool): Negotiate HTTP/2 (requires the h2 package)
+        """
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise ImportError("HTTP/2 requires the h2 package (pip install 'httpx[http2]')")
+
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout,
+                                     write=write_timeout, pool=pool_timeout)
+        self.http2 = http2
+
+        # Bumped whenever the client is rebuilt, so API clients built on the
+        # old one know to rebuild too
+        self.generation = 0
+
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "opened": 0, "reused": 0, "waited": 0, "wait_time": 0.0}
+        # Thread id -> (transport, request extensions, tracer) of the request
+        # the thread has in flight on the shared client, and the threads
+        # whose requests are aborted until resume() (see abort)
+        self._in_flight = {}
+        self._aborted = set()
+        self._transport = None
+        self._http_client = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a pool configured from OPENAI_MAX_CONNECTIONS, OPENAI_CONNECT_TIMEOUT,
+        OPENAI_READ_TIMEOUT and OPENAI_HTTP2 (any unset value keeps its default).
+        """
+        kwargs = {}
+        if os.getenv("OPENAI_MAX_CONNECTIONS"):
+            kwargs["max_connections"] = int(os.environ["OPENAI_MAX_CONNECTIONS"])
+        if os.getenv("OPENAI_CONNECT_TIMEOUT"):
+            kwargs["connect_timeout"] = float(os.environ["OPENAI_CONNECT_TIMEOUT"])
+        if os.getenv("OPENAI_READ_TIMEOUT"):
+            kwargs["read_timeout"] = float(os.environ["OPENAI_READ_TIMEOUT"])
+        if os.getenv("OPENAI_HTTP2", "").lower() in ("1", "true", "yes"):
+            kwargs["http2"] = True
+        return cls(**kwargs)
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections or self.max_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    @property
+    def http_client(self):
+        """The shared httpx.Client (created on first use)."""
+        with self._lock:
+            if self._http_client is None:
+                self._transport = _CountingTransport(self, self.max_connections, limits=self._limits(),
+                                                     http2=self.http2)
+                self._http_client = httpx.Client(transport=self._transport, timeout=self.timeout,
+                                                 follow_redirects=True)
+            return self._http_client
+
+    def create_async_client(self):
+        """
+        Create an httpx.AsyncClient with this pool's limits and timeouts.
+
+        Asynchronous clients are tied to the event loop they are used on, so
+        each caller gets its own; their connections are still counted in stats().
+        """
+        transport = _AsyncCountingTransport(self, self.max_connections, limits=self._limits(),
+                                            http2=self.http2)
+        return httpx.AsyncClient(transport=transport, timeout=self.timeout, follow_redirects=True)
+
+    def ensure_capacity(self, connections):
+        """
+        Grow the pool so it allows at least the given number of connections.
+
+        Called with a batch's concurrency before it starts, so workers never
+        queue for a connection. Growing replaces the httpx client and bumps
+        generation; requests in flight finish on the old client, which is
+        closed once the last of them does.
+
+        Args:
+            connections (int): Number of requests that will run at once
+        """
+        with self._lock:
+            if connections <= self.max_connections:
+                return
+            self.max_connections = connections
+            if self.max_keepalive_connections is not None:
+                self.max_keepalive_connections = max(self.max_keepalive_connections, connections)
+            retired = self._transport
+            self._transport = None
+            self._http_client = None
+            self.generation += 1
+            if retired is not None:
+                retired.retired = True
+                drained = retired.active == 0
+        if retired is not None and drained:
+            retired.close()
+
+    def _acquire(self, transport, thread=None, extensions=None, tracer=None):
+        """Count a request starting on transport; returns whether it has to queue for a connection."""
+        with self._lock:
+            transport.active += 1
+            if thread is not None:
+                self._in_flight[thread] = (transport, extensions, tracer)
+                tracer.aborted = thread in self._aborted
+            return transport.active > transport.max_connections
+
+    def _release(self, transport, thread=None):
+        """Count a request's connection as free again, closing a retired transport once drained."""
+        with self._lock:
+            transport.active -= 1
+            if thread is not None and self._in_flight.get(thread, (None,))[0] is transport:
+                del self._in_flight[thread]
+            drained = transport.retired and transport.active == 0
+        if drained:
+            transport.close()
+
+    def abort(self, thread):
+        """
+        Abort the request a thread has in flight on the shared client, if it
+        has one, and any request it sends until resume(thread). A request
+        that hasn't got its response headers yet fails at its next step; one
+        already waiting for (or reading) the response has its connection
+        shut down. Either way it fails with a connection error.
+
+        httpx can't cancel a request from another thread, so this reaches
+        into httpcore's pool. HTTP/2 connections, whose other streams would
+        go down too, are not shut down.
+
+        Args:
+            thread (int): The thread's identifier (threading.get_ident())
+
+        Returns:
+            bool: Whether the thread had a request in flight
+        """
+        with self._lock:
+            self._aborted.add(thread)
+            transport, extensions, tracer = self._in_flight.get(thread, (None, None, None))
+        if transport is None:
+            return False
+        tracer.aborted = True
+
+        pool = getattr(transport, "_pool", None)
+        for pool_request in list(getattr(pool, "_requests", ())):
+            if pool_request.request.extensions is not extensions:
+                continue
+            connection = getattr(pool_request.connection, "_connection", None)
+            stream = getattr(connection, "_network_stream", None)
+            if stream is not None and "HTTP/2" not in connection.info():
+                sock = stream.get_extra_info("socket")
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except (AttributeError, OSError):
+                    pass
+            break
+        return True
+
+    def resume(self, thread):
+        """Let a thread send requests again after abort(thread)."""
+        with self._lock:
+            self._aborted.discard(thread)
+
+    def _record(self, tracer):
+        with self._lock:
+            self._stats["requests"] += 1
+            if tracer.acquired is None:
+                # Failed before it got a connection (e.g. pool timeout)
+                return
+            if tracer.connected:
+                self._stats["opened"] += 1
+            else:
+                self._stats["reused"] += 1
+
+            if tracer.queued:
+                self._stats["waited"] += 1
+                self._stats["wait_time"] += tracer.acquired - tracer.started
+
+    def stats(self):
+        """
+        Report connection usage.
+
+        Returns:
+            dict: "open" (connections currently open in the shared client, or
+                None if unknown), "max_connections", "requests", "opened",
+                "reused", "waited" (requests that arrived while every
+                connection was busy and queued for one) and "wait_time"
+                (total seconds those requests spent queued)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["max_connections"] = self.max_connections
+            # httpx doesn't expose its pool publicly; report what we can see
+            pool = getattr(self._transport, "_pool", None)
+            connections = getattr(pool, "connections", None)
+            stats["open"] = len(connections) if connections is not None else None
+        return stats
+
+    def close(self):
+        """Close the shared client and its connections."""
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+            self._transport = None
+            self._http_client = None
+            self.generation += 1
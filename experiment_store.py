@@ -0,0 +1,414 @@
+import json
+import time
+import sqlite3
+import threading
+
+# Default location of the experiment database
+DEFAULT_STORE_PATH = "experiments.sqlite3"
+
+# Run columns that can be used in query filters
+RUN_FILTER_COLUMNS = (
+    "sweep_id", "cell_index", "created_at", "model", "system_prompt", "user_prompt",
+    "product", "temperature", "max_tokens", "presence_penalty", "frequency_penalty",
+    "latency", "prompt_tokens", "completion_tokens", "finish_reason", "cost", "cached_tokens", "score"
+)
+
+# Run columns added after the table was first created, with their types
+ADDED_RUN_COLUMNS = (("finish_reason", "TEXT"), ("cost", "REAL"), ("cached_tokens", "INTEGER"), ("score", "REAL"))
+
+# Sweep columns added after the table was first created, with their types
+ADDED_SWEEP_COLUMNS = (("spec", "TEXT"), ("finished_at", "REAL"))
+
+# Comparison operators allowed in query filters
+FILTER_OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "LIKE")
+
+
+class ExperimentStore:
+    """
+    A persistent, indexed record of every generation and reflection.
+
+    Runs are grouped into sweeps (one per Generate or Batch Generate click, or
+    per headless sweep) and written incrementally as results arrive. The
+    database uses SQLite in WAL mode, so reads (e.g. browsing history) don't
+    block writes from a running sweep. Every run is committed as soon as it
+    is added, so the store doubles as a journal of a sweep's progress: a
+    sweep created with its spec can be resumed after a crash by re-running
+    only the cells without a successful run (see latest_runs). It is safe
+    to share one instance between threads.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        """
+        Open (or create) the store.
+
+        Args:
+            path (str): SQLite database file (":memory:" for a throwaway store)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sweeps (
+                id INTEGER PRIMARY KEY,
+                created_at REAL NOT NULL,
+                kind TEXT NOT NULL,
+                description TEXT,
+                spec TEXT,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                sweep_id INTEGER NOT NULL REFERENCES sweeps (id),
+                cell_index INTEGER,
+                created_at REAL NOT NULL,
+                model TEXT,
+                system_prompt TEXT,
+                user_prompt TEXT,
+                product TEXT,
+                temperature REAL,
+                max_tokens INTEGER,
+                presence_penalty REAL,
+                frequency_penalty REAL,
+                response TEXT,
+                responses TEXT,
+                error TEXT,
+                latency REAL,
+                time_to_first_token REAL,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                derived_from TEXT,
+                finish_reason TEXT,
+                cost REAL,
+                cached_tokens INTEGER,
+                score REAL
+            );
+            CREATE TABLE IF NOT EXISTS reflections (
+                id INTEGER PRIMARY KEY,
+                sweep_id INTEGER REFERENCES sweeps (id),
+                created_at REAL NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS runs_sweep ON runs (sweep_id, cell_index);
+            CREATE INDEX IF NOT EXISTS runs_model_product ON runs (model, product, presence_penalty);
+            CREATE INDEX IF NOT EXISTS runs_parameters ON runs (temperature, max_tokens, presence_penalty, frequency_penalty);
+            CREATE INDEX IF NOT EXISTS reflections_sweep ON reflections (sweep_id);
+        """)
+
+        # Bring databases created by older versions up to date
+        for table, added_columns in (("runs", ADDED_RUN_COLUMNS), ("sweeps", ADDED_SWEEP_COLUMNS)):
+            existing = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in added_columns:
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+
+    def create_sweep(self, kind, description=None, spec=None):
+        """
+        Start a new sweep.
+
+        Args:
+            kind (str): What produced the sweep, e.g. "single" or "batch"
+            description (str): Optional human-readable summary
+            spec: JSON-serialisable description of the sweep's requests,
+                enough to rebuild them (with the same cell indexes) when
+                the sweep is resumed
+
+        Returns:
+            int: The new sweep's id
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO sweeps (created_at, kind, description, spec) VALUES (?, ?, ?, ?)",
+                (time.time(), kind, description, json.dumps(spec) if spec is not None else None)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def finish_sweep(self, sweep_id):
+        """Mark a sweep as having run to the end (its cells may still include errors)."""
+        with self._lock:
+            self._conn.execute("UPDATE sweeps SET finished_at = ? WHERE id = ?", (time.time(), sweep_id))
+            self._conn.commit()
+
+    def get_sweep(self, sweep_id):
+        """
+        Fetch one sweep.
+
+        Returns:
+            dict: "id", "created_at", "kind", "description", "spec" (decoded,
+                or None) and "finished_at" (None while unfinished), or None
+                if there is no such sweep
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM sweeps WHERE id = ?", (sweep_id,)).fetchone()
+        if row is None:
+            return None
+        sweep = dict(row)
+        sweep["spec"] = json.loads(sweep["spec"]) if sweep["spec"] is not None else None
+        return sweep
+
+    def latest_runs(self, sweep_id):
+        """
+        Fetch the most recent run of each cell of a sweep.
+
+        A resumed sweep records new runs for the cells it retries, so a cell
+        can have several runs; only the last one counts.
+
+        Returns:
+            dict: Cell index -> result dictionary (see row_to_result)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM runs WHERE id IN"
+                " (SELECT MAX(id) FROM runs WHERE sweep_id = ? GROUP BY cell_index)"
+                " ORDER BY cell_index",
+                (sweep_id,)
+            ).fetchall()
+        return {row["cell_index"]: self.row_to_result(row) for row in rows}
+
+    def add_runs(self, sweep_id, results):
+        """
+        Record completed results, committing them in one transaction.
+
+        Args:
+            sweep_id (int): Sweep the results belong to
+            results (iterable): Result dictionaries as produced by the wrapper
+        """
+        now = time.time()
+        rows = [self._run_row(sweep_id, result, now) for result in results]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO runs (sweep_id, cell_index, created_at, model, system_prompt, user_prompt,"
+                " product, temperature, max_tokens, presence_penalty, frequency_penalty, response,"
+                " responses, error, latency, time_to_first_token, prompt_tokens, completion_tokens,"
+                " derived_from, finish_reason, cost, cached_tokens, score)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def add_run(self, sweep_id, result):
+        """Record a single completed result."""
+        self.add_runs(sweep_id, [result])
+
+    @staticmethod
+    def _run_row(sweep_id, result, created_at):
+        params = result.get("parameters", {})
+        usage = result.get("usage") or {}
+        responses = result.get("responses")
+        derived_from = result.get("derived_from")
+        return (
+            sweep_id,
+            result.get("index"),
+            created_at,
+            result.get("model"),
+            result.get("system_prompt"),
+            result.get("user_prompt"),
+            result.get("product"),
+            params.get("temperature"),
+            params.get("max_tokens"),
+            params.get("presence_penalty"),
+            params.get("frequency_penalty"),
+            result.get("response"),
+            json.dumps(responses) if responses is not None else None,
+            result.get("error"),
+            result.get("latency"),
+            result.get("time_to_first_token"),
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens"),
+            json.dumps(derived_from) if derived_from is not None else None,
+            result.get("finish_reason"),
+            result.get("cost"),
+            usage.get("cached_tokens"),
+            result.get("score")
+        )
+
+    @staticmethod
+    def row_to_result(row):
+        """
+        Convert a stored run back into a result dictionary.
+
+        Args:
+            row (sqlite3.Row): A row from the runs table
+
+        Returns:
+            dict: Result in the same shape the wrapper produces
+        """
+        result = {
+            "index": row["cell_index"],
+            "model": row["model"],
+            "system_prompt": row["system_prompt"],
+            "user_prompt": row["user_prompt"],
+            "product": row["product"],
+            "parameters": {
+                "temperature": row["temperature"],
+                "max_tokens": row["max_tokens"],
+                "presence_penalty": row["presence_penalty"],
+                "frequency_penalty": row["frequency_penalty"]
+            }
+        }
+
+        if row["error"] is not None:
+            result["error"] = row["error"]
+        else:
+            result["response"] = row["response"]
+        if row["responses"] is not None:
+            result["responses"] = json.loads(row["responses"])
+        if row["derived_from"] is not None:
+            result["derived_from"] = json.loads(row["derived_from"])
+
+        for key in ("latency", "time_to_first_token", "finish_reason", "cost", "score"):
+            if row[key] is not None:
+                result[key] = row[key]
+        if row["prompt_tokens"] is not None or row["completion_tokens"] is not None:
+            result["usage"] = {
+                "prompt_tokens": row["prompt_tokens"],
+                "completion_tokens": row["completion_tokens"]
+            }
+            if row["cached_tokens"] is not None:
+                result["usage"]["cached_tokens"] = row["cached_tokens"]
+        return result
+
+    def query_runs(self, filters=None, limit=100, offset=0, order_by="id"):
+        """
+        Fetch runs matching the given filters, one page at a time.
+
+        Filters map a column name to either a value (equality) or an
+        (operator, value) tuple, e.g.
+        {"model": "gpt-4", "product": "iPhone", "presence_penalty": (">=", 1.5)}.
+
+        Args:
+            filters (dict): Column filters, combined with AND
+            limit (int): Maximum number of runs to return (None for all)
+            offset (int): Number of matching runs to skip
+            order_by (str): Column to sort by
+
+        Returns:
+            list: Matching result dictionaries (see row_to_result)
+        """
+        rows = self._query_rows(filters, limit, offset, order_by)
+        return [self.row_to_result(row) for row in rows]
+
+    def _query_rows(self, filters=None, limit=100, offset=0, order_by="id", after=None):
+        """
+        Fetch matching rows of the runs table (see query_runs).
+
+        Args:
+            after (tuple): (order_by value, id) of the last row of the
+                previous page; only rows sorting after it are returned, so
+                paging doesn't re-read every earlier page as OFFSET does
+        """
+        clauses = []
+        values = []
+        for column, condition in (filters or {}).items():
+            if column not in RUN_FILTER_COLUMNS:
+                raise ValueError(f"Cannot filter runs on '{column}'")
+
+            operator, value = condition if isinstance(condition, tuple) else ("=", condition)
+            if operator not in FILTER_OPERATORS:
+                raise ValueError(f"Unsupported filter operator '{operator}'")
+            clauses.append(f"{column} {operator} ?")
+            values.append(value)
+
+        if order_by not in RUN_FILTER_COLUMNS + ("id",):
+            raise ValueError(f"Cannot sort runs by '{order_by}'")
+
+        if after is not None:
+            last_value, last_id = after
+            if order_by == "id":
+                clauses.append("id > ?")
+                values.append(last_id)
+            elif last_value is None:
+                # NULLs sort first
+                clauses.append(f"({order_by} IS NULL AND id > ? OR {order_by} IS NOT NULL)")
+                values.append(last_id)
+            else:
+                clauses.append(f"({order_by} > ? OR {order_by} = ? AND id > ?)")
+                values += [last_value, last_value, last_id]
+
+        sql = "SELECT * FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by}, id LIMIT ? OFFSET ?" if order_by != "id" else " ORDER BY id LIMIT ? OFFSET ?"
+        values += [-1 if limit is None else limit, offset]
+
+        with self._lock:
+            return self._conn.execute(sql, values).fetchall()
+
+    def iter_runs(self, filters=None, page_size=500, order_by="id"):
+        """
+        Lazily iterate over every matching run, fetching a page at a time.
+
+        Yields:
+            dict: Result dictionaries (see row_to_result)
+        """
+        after = None
+        while True:
+            rows = self._query_rows(filters, limit=page_size, order_by=order_by, after=after)
+            for row in rows:
+                yield self.row_to_result(row)
+            if len(rows) < page_size:
+                return
+            after = (rows[-1][order_by], rows[-1]["id"])
+
+    def list_sweeps(self, limit=50, offset=0):
+        """
+        List sweeps, newest first, with their run counts.
+
+        Returns:
+            list: Dictionaries with "id", "created_at", "kind", "description",
+                "finished_at", "resumable" (whether it was created with a
+                spec), "runs" and "errors"
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT sweeps.id, sweeps.created_at, sweeps.kind, sweeps.description, sweeps.finished_at,"
+                " sweeps.spec IS NOT NULL AS resumable, COUNT(runs.id) AS runs, COUNT(runs.error) AS errors"
+                " FROM sweeps LEFT JOIN runs ON runs.sweep_id = sweeps.id"
+                " GROUP BY sweeps.id ORDER BY sweeps.id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def add_reflection(self, text, sweep_id=None):
+        """
+        Save a reflection, optionally linked to the sweep it reflects on.
+
+        Returns:
+            int: The new reflection's id
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO reflections (sweep_id, created_at, text) VALUES (?, ?, ?)",
+                (sweep_id, time.time(), text)
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def get_reflections(self, sweep_id=None):
+        """
+        Fetch reflections, newest first.
+
+        Args:
+            sweep_id (int): Only return reflections linked to this sweep
+
+        Returns:
+            list: Dictionaries with "id", "sweep_id", "created_at" and "text"
+        """
+        sql = "SELECT * FROM reflections"
+        values = ()
+        if sweep_id is not None:
+            sql += " WHERE sweep_id = ?"
+            values = (sweep_id,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id DESC", values).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
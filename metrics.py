@@ -0,0 +1,343 @@
+import json
+import math
+import time
+import bisect
+import threading
+import collections
+
+# Approximate USD prices per 1K tokens as (prompt, completion). Dated model
+# names (e.g. "gpt-4o-2024-08-06") use the price of their longest prefix.
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+
+# Prompt tokens served from the provider's prompt cache are billed at this
+# fraction of the prompt price
+CACHED_PROMPT_PRICE_FACTOR = 0.5
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Per-call timings kept as histograms
+TIMING_METRICS = ("queue_wait", "latency", "time_to_first_byte", "time_to_first_token")
+
+# Seconds of completed calls used to compute throughput
+THROUGHPUT_WINDOW = 60.0
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    """
+    Estimate the cost of a call from its token usage.
+
+    Args:
+        model (str): Model the call was made with
+        prompt_tokens (int): Prompt tokens billed
+        completion_tokens (int): Completion tokens billed
+        cached_tokens (int): How many of the prompt tokens were prompt cache hits
+
+    Returns:
+        float: Estimated cost in USD, or None if the model's price is unknown
+    """
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    if not matches:
+        return None
+    prompt_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    cached_tokens = cached_tokens or 0
+    prompt_cost = ((prompt_tokens or 0) - cached_tokens + cached_tokens * CACHED_PROMPT_PRICE_FACTOR) * prompt_price
+    return (prompt_cost + (completion_tokens or 0) * completion_price) / 1000.0
+
+
+def cached_prompt_tokens(usage):
+    """Return how many of a response's prompt tokens hit the prompt cache (None if not reported)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None)
+
+
+def percentile(values, q):
+    """
+    Return the q-th percentile (0-100) of values by nearest rank.
+
+    Returns:
+        float: The percentile, or None if values is empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(q / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format (backslash, quote and newline)."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def start_call(model, queued_at=None):
+    """
+    Start the metrics record for one API call.
+
+    Args:
+        model (str): Model the call is made with
+        queued_at (float): time.perf_counter() value when the call was queued,
+            so the wait for a worker counts as queue wait
+
+    Returns:
+        dict: Call record, filled in by the wrapper as the call progresses
+    """
+    return {
+        "model": model,
+        "queue_wait": time.perf_counter() - queued_at if queued_at is not None else 0.0,
+        "latency": None,
+        "time_to_first_byte": None,
+        "time_to_first_token": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "cached_tokens": None,
+        "cost": None,
+        "finish_reason": None,
+        "retries": 0,
+        "cache_hit": False,
+        "hedged": False,
+        "error": False
+    }
+
+
+def finish_call(call, usage=None, finish_reason=None):
+    """
+    Record a call's token usage (including prompt cache hits), cost estimate
+    and finish reason.
+
+    Args:
+        call (dict): Call record from start_call()
+        usage: The response's usage object (may be None)
+        finish_reason (str): Why the first choice stopped, e.g. "stop" or "length"
+    """
+    if usage is not None:
+        call["prompt_tokens"] = usage.prompt_tokens
+        call["completion_tokens"] = usage.completion_tokens
+        call["cached_tokens"] = cached_prompt_tokens(usage)
+        call["cost"] = estimate_cost(call["model"], usage.prompt_tokens, usage.completion_tokens,
+                                     call["cached_tokens"])
+    if finish_reason is not None:
+        call["finish_reason"] = finish_reason
+
+
+class Histogram:
+    """
+    A cumulative bucket histogram plus a window of recent observations.
+
+    The buckets back the Prometheus export; percentiles are computed from the
+    most recent observations, so they follow the current sweep rather than
+    the whole session.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=1000):
+        """
+        Args:
+            buckets (tuple): Ascending bucket upper bounds
+            window (int): Number of recent observations kept for percentiles
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = collections.deque(maxlen=window)
+
+    def observe(self, value):
+        """Add one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def summary(self):
+        """
+        Summarise the histogram.
+
+        Returns:
+            dict: "count", "sum", "p50", "p95" and "p99"
+        """
+        recent = list(self.recent)
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": percentile(recent, 50),
+            "p95": percentile(recent, 95),
+            "p99": percentile(recent, 99)
+        }
+
+    def cumulative_buckets(self):
+        """Return (upper bound, cumulative count) pairs, ending with +Inf."""
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        total = 0
+        pairs = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class MetricsRegistry:
+    """
+    Rolling per-model statistics for every API call the wrappers make.
+
+    Wrappers record one call record (see start_call) per generation; the
+    registry keeps counters, token and cost totals, finish reasons and timing
+    histograms for each model, and can export them as JSON or in the
+    Prometheus text format. It is safe to share one instance between threads.
+    """
+
+    def __init__(self, window=1000):
+        """
+        Args:
+            window (int): Recent observations kept per histogram for percentiles
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._models = {}
+        self.started_at = time.time()
+
+    def _model_stats(self, model):
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = {
+                "calls": 0,
+                "errors": 0,
+                "cache_hits": 0,
+                "retries": 0,
+                "hedges": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cached_tokens": 0,
+                "cost": 0.0,
+                "finish_reasons": collections.Counter(),
+                "histograms": {name: Histogram(window=self.window) for name in TIMING_METRICS},
+                "completed": collections.deque()
+            }
+        return stats
+
+    def record(self, call):
+        """
+        Add a finished call.
+
+        Args:
+            call (dict): Call record from start_call()
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = self._model_stats(call.get("model") or "unknown")
+            stats["calls"] += 1
+            stats["errors"] += bool(call.get("error"))
+            stats["cache_hits"] += bool(call.get("cache_hit"))
+            stats["retries"] += call.get("retries") or 0
+            stats["hedges"] += bool(call.get("hedged"))
+            stats["prompt_tokens"] += call.get("prompt_tokens") or 0
+            stats["completion_tokens"] += call.get("completion_tokens") or 0
+            stats["cached_tokens"] += call.get("cached_tokens") or 0
+            stats["cost"] += call.get("cost") or 0.0
+            if call.get("finish_reason"):
+                stats["finish_reasons"][call["finish_reason"]] += 1
+
+            # Cache hits never reach the network, so they would skew timings
+            if not call.get("cache_hit"):
+                for name, histogram in stats["histograms"].items():
+                    if call.get(name) is not None:
+                        histogram.observe(call[name])
+
+            completed = stats["completed"]
+            completed.append(now)
+            while completed and completed[0] < now - THROUGHPUT_WINDOW:
+                completed.popleft()
+
+    def snapshot(self):
+        """
+        Report the current statistics.
+
+        Returns:
+            dict: Model name -> counters, token and cost totals,
+                "finish_reasons", "throughput" (calls per second over the last
+                minute) and a summary (see Histogram.summary) per timing
+        """
+        now = time.monotonic()
+        snapshot = {}
+        with self._lock:
+            for model, stats in self._models.items():
+                completed = [t for t in stats["completed"] if t >= now - THROUGHPUT_WINDOW]
+                span = min(THROUGHPUT_WINDOW, time.time() - self.started_at)
+                snapshot[model] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "cache_hits": stats["cache_hits"],
+                    "retries": stats["retries"],
+                    "hedges": stats["hedges"],
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "cached_tokens": stats["cached_tokens"],
+                    "cost": stats["cost"],
+                    "finish_reasons": dict(stats["finish_reasons"]),
+                    "throughput": len(completed) / span if span > 0 else 0.0,
+                    **{name: histogram.summary() for name, histogram in stats["histograms"].items()}
+                }
+        return snapshot
+
+    def to_json(self):
+        """Export the snapshot as a JSON document."""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Export the statistics in the Prometheus text exposition format.
+
+        Returns:
+            str: Counters and histograms labelled by model
+        """
+        counters = (
+            ("calls", "API calls made"),
+            ("errors", "API calls that failed"),
+            ("cache_hits", "Calls served from the response cache"),
+            ("retries", "Retried API attempts"),
+            ("hedges", "Calls that sent a hedged duplicate request"),
+            ("prompt_tokens", "Prompt tokens used"),
+            ("completion_tokens", "Completion tokens used"),
+            ("cached_tokens", "Prompt tokens served from the prompt cache"),
+            ("cost", "Estimated cost in USD")
+        )
+
+        lines = []
+        with self._lock:
+            models = [(escape_label(model), stats) for model, stats in sorted(self._models.items())]
+            for name, help_text in counters:
+                metric = f"playground_{name}_total"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for model, stats in models:
+                    lines.append(f'{metric}{{model="{model}"}} {stats[name]}')
+
+            lines.append("# HELP playground_finish_reason_total Completions by finish reason")
+            lines.append("# TYPE playground_finish_reason_total counter")
+            for model, stats in models:
+                for reason, count in sorted(stats["finish_reasons"].items()):
+                    lines.append(f'playground_finish_reason_total{{model="{model}",reason="{escape_label(reason)}"}}'
+                                 f' {count}')
+
+            for name in TIMING_METRICS:
+                metric = f"playground_{name}_seconds"
+                lines.append(f"# HELP {metric} Per-call {name.replace('_', ' ')} in seconds")
+                lines.append(f"# TYPE {metric} histogram")
+                for model, stats in models:
+                    histogram = stats["histograms"][name]
+                    for bound, count in histogram.cumulative_buckets():
+                        lines.append(f'{metric}_bucket{{model="{model}",le="{bound}"}} {count}')
+                    lines.append(f'{metric}_sum{{model="{model}"}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{model="{model}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Forget every recorded call."""
+        with self._lock:
+            self._models.clear()
+            self.started_at = time.time()
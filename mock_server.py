@@ -0,0 +1,632 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Serves POST /v1/chat/completions (streaming and non-streaming, with n,
+logprobs and stream_options.include_usage) from a standard-library HTTP
+server, so the wrappers can be exercised and benchmarked without network
+access or API spend. Repeated prompts of 1024 tokens or more report cached
+prompt tokens, like the real prompt cache. The Batch API is mocked too: files uploaded to
+/v1/files can be run as /v1/batches jobs, which finish after
+--batch-duration seconds. Latency, error rate and 429 injection are configurable,
+and --rpm-quota enforces a per-minute request quota, reported in
+x-ratelimit-* headers like the real API's:
+
+    python mock_server.py --port 8000 --latency lognormal:0.4,0.5 --rate-limit-rate 0.05
+
+and point a wrapper at it with OpenAIWrapper(base_url="http://127.0.0.1:8000/v1",
+api_key="mock"). Latency distributions are given as "<kind>:<params>":
+
+    const:S             always S seconds
+    uniform:A,B         uniformly between A and B seconds
+    normal:MEAN,SD      normally distributed (clamped at zero)
+    lognormal:MEDIAN,SIGMA
+    exp:MEAN            exponentially distributed
+
+The latency applies before the response headers are sent; streamed
+responses then spend --token-interval seconds on each token.
+"""
+import sys
+import json
+import math
+import time
+import email
+import random
+import hashlib
+import argparse
+import itertools
+import threading
+import collections
+import email.policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prompts shorter than this (in tokens) are never cached; longer ones are
+# cached in PROMPT_CACHE_INCREMENT token steps
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+
+# Words the mock completions are made of (each one is a token)
+WORDS = (
+    "sleek", "powerful", "design", "battery", "display", "camera", "lightweight",
+    "premium", "comfort", "performance", "everyday", "durable", "smart", "fast",
+    "crafted", "innovative", "seamless", "bold", "quality", "experience"
+)
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec.
+
+    Args:
+        spec (str): "<kind>:<params>", e.g. "uniform:0.05,0.2" (see module docstring)
+
+    Returns:
+        callable: Takes a random.Random and returns a delay in seconds
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+
+    if kind == "const" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"Invalid latency distribution '{spec}'")
+
+
+def completion_tokens(request, choice_index):
+    """
+    Make up the tokens of one choice.
+
+    Requests at temperature 0 always get the same tokens (so shorter
+    max_tokens completions are prefixes of longer ones); otherwise the text
+    differs between calls and choices.
+
+    Returns:
+        tuple: (tokens, finish_reason)
+    """
+    max_tokens = request.get("max_tokens") or 150
+    prompt = json.dumps(request.get("messages", []), sort_keys=True)
+    if request.get("temperature", 1.0) == 0:
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    else:
+        seed = f"{prompt}{choice_index}{random.random()}"
+    rng = random.Random(seed)
+
+    # Natural length of the completion, cut short by max_tokens
+    length = rng.randint(20, 400)
+    tokens = [("" if i == 0 else " ") + rng.choice(WORDS) for i in range(min(length, max_tokens))]
+    return tokens, "length" if length > max_tokens else "stop"
+
+
+def prompt_token_count(request):
+    """Count a request's prompt tokens (about four characters each)."""
+    return sum(len(message.get("content", "")) for message in request.get("messages", [])) // 4
+
+
+def completion_usage(request, completion_count, cached_tokens=0):
+    """Make up the usage of a completion."""
+    prompt_tokens = prompt_token_count(request)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_count,
+        "total_tokens": prompt_tokens + completion_count,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens}
+    }
+
+
+def make_completion(request, cached_tokens=0):
+    """Build the non-streaming chat completion for a request."""
+    choices = []
+    completion_count = 0
+    for index in range(request.get("n") or 1):
+        tokens, finish_reason = completion_tokens(request, index)
+        completion_count += len(tokens)
+        choice = {
+            "index": index,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "finish_reason": finish_reason,
+            "logprobs": None
+        }
+        if request.get("logprobs"):
+            choice["logprobs"] = {"content": [
+                {"token": token, "logprob": -0.1, "bytes": list(token.encode("utf-8")),
+                 "top_logprobs": []}
+                for token in tokens
+            ]}
+        choices.append(choice)
+
+    return {
+        "id": f"chatcmpl-mock-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "mock"),
+        "choices": choices,
+        "usage": completion_usage(request, completion_count, cached_tokens)
+    }
+
+
+def parse_multipart(content_type, body):
+    """
+    Parse a multipart/form-data body.
+
+    Returns:
+        dict: Field name -> (filename, content bytes)
+    """
+    message = email.message_from_bytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body,
+        policy=email.policy.HTTP
+    )
+    return {
+        part.get_param("name", header="content-disposition"): (part.get_filename(), part.get_payload(decode=True))
+        for part in message.iter_parts()
+    }
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    """A threading HTTP server that stays quiet when clients hang up early."""
+
+    def handle_error(self, request, client_address):
+        # Cancelled, timed out and hedged requests drop their connections
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockOpenAIServer:
+    """
+    A threaded mock of the chat completions and Batch API endpoints.
+
+    Run it in the background with start() / stop() (or as a context manager)
+    or in the foreground with serve_forever(). Counters of served requests,
+    injected errors and 429s are kept in stats.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency="const:0", token_interval=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=0.05, seed=None,
+                 batch_duration=1.0, rpm_quota=None):
+        """
+        Args:
+            host (str): Interface to listen on
+            port (int): Port to listen on (0 picks a free port)
+            latency (str): Distribution of the delay before each response
+                (see parse_latency)
+            token_interval (float): Seconds between streamed tokens
+            error_rate (float): Fraction of requests failed with a 500
+            rate_limit_rate (float): Fraction of requests rejected with a 429
+            retry_after (float): Seconds advertised in Retry-After on 429s
+            seed (int): Seed for the latency and error injection randomness
+            batch_duration (float): Seconds a batch job runs before completing
+                (error_rate also fails that fraction of its requests)
+            rpm_quota (int): Completions allowed in any 60 second window;
+                requests beyond it get a 429 (None for no quota)
+        """
+        self.latency = parse_latency(latency)
+        self.token_interval = token_interval
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.batch_duration = batch_duration
+        self.rpm_quota = rpm_quota
+
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "batches": 0}
+        self.files = {}
+        self.batches = {}
+        self._cached_prompts = set()
+        self._quota_window = collections.deque()
+        self._ids = itertools.count(1)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.httpd = _HTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        """The URL to pass to the wrappers as base_url."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Serve requests from a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve requests until interrupted."""
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _draw(self):
+        """Decide the fate of one request: (delay, outcome)."""
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency(self._rng)
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return 0.0, "rate_limited"
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return delay, "error"
+            return delay, "ok"
+
+    def take_quota(self):
+        """
+        Count a completion against the request quota.
+
+        Returns:
+            tuple: (allowed, x-ratelimit-* headers to send); no headers
+                without a quota
+        """
+        if self.rpm_quota is None:
+            return True, {}
+        with self._lock:
+            now = time.monotonic()
+            while self._quota_window and now - self._quota_window[0] >= 60.0:
+                self._quota_window.popleft()
+            allowed = len(self._quota_window) < self.rpm_quota
+            if allowed:
+                self._quota_window.append(now)
+            else:
+                self.stats["rate_limited"] += 1
+            # The next slot frees up when the oldest request leaves the window
+            reset = 60.0 - (now - self._quota_window[0]) if self._quota_window else 0.0
+            return allowed, {
+                "x-ratelimit-limit-requests": str(self.rpm_quota),
+                "x-ratelimit-remaining-requests": str(self.rpm_quota - len(self._quota_window)),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s"
+            }
+
+    @staticmethod
+    def _prompt_key(request):
+        return hashlib.sha256(json.dumps([request.get("model"), request.get("messages")]).encode("utf-8")).hexdigest()
+
+    def cached_tokens(self, request):
+        """Return how many of the request's prompt tokens the mock prompt cache serves."""
+        prompt_tokens = prompt_token_count(request)
+        if prompt_tokens < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        with self._lock:
+            if self._prompt_key(request) not in self._cached_prompts:
+                return 0
+        return prompt_tokens // PROMPT_CACHE_INCREMENT * PROMPT_CACHE_INCREMENT
+
+    def cache_prompt(self, request):
+        """Cache a request's prompt once its response is done, like the real prompt cache."""
+        if prompt_token_count(request) >= PROMPT_CACHE_MIN_TOKENS:
+            with self._lock:
+                self._cached_prompts.add(self._prompt_key(request))
+
+    def add_file(self, filename, purpose, content):
+        """Store an uploaded file and return its file object."""
+        with self._lock:
+            file_id = f"file-mock-{next(self._ids)}"
+            self.files[file_id] = {
+                "object": {
+                    "id": file_id,
+                    "object": "file",
+                    "bytes": len(content),
+                    "created_at": int(time.time()),
+                    "filename": filename,
+                    "purpose": purpose,
+                    "status": "processed"
+                },
+                "content": content
+            }
+            return self.files[file_id]["object"]
+
+    def create_batch(self, request):
+        """Create a batch job from a /v1/batches request and start running it."""
+        now = int(time.time())
+        with self._lock:
+            self.stats["batches"] += 1
+            batch_id = f"batch-mock-{next(self._ids)}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request.get("endpoint"),
+                "errors": None,
+                "input_file_id": request.get("input_file_id"),
+                "completion_window": request.get("completion_window", "24h"),
+                "status": "validating",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": now,
+                "in_progress_at": None,
+                "expires_at": now + 24 * 3600,
+                "finalizing_at": None,
+                "completed_at": None,
+                "failed_at": None,
+                "expired_at": None,
+                "cancelling_at": None,
+                "cancelled_at": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "metadata": request.get("metadata")
+            }
+            batch = dict(self.batches[batch_id])
+        threading.Thread(target=self._run_batch, args=(batch_id,), daemon=True).start()
+        return batch
+
+    def cancel_batch(self, batch_id):
+        """Ask a running batch job to stop; it keeps the requests already done."""
+        with self._lock:
+            batch = self.batches[batch_id]
+            if batch["status"] in ("validating", "in_progress"):
+                batch["status"] = "cancelling"
+                batch["cancelling_at"] = int(time.time())
+            return dict(batch)
+
+    def _run_batch(self, batch_id):
+        with self._lock:
+            batch = self.batches[batch_id]
+            input_file = self.files.get(batch["input_file_id"])
+            if input_file is None:
+                batch["status"] = "failed"
+                batch["failed_at"] = int(time.time())
+                batch["errors"] = {"object": "list", "data": [{
+                    "code": "invalid_file", "message": f"File {batch['input_file_id']} not found",
+                    "line": None, "param": "input_file_id"
+                }]}
+                return
+            lines = [json.loads(line) for line in input_file["content"].splitlines() if line.strip()]
+            batch["status"] = "in_progress"
+            batch["in_progress_at"] = int(time.time())
+            batch["request_counts"]["total"] = len(lines)
+
+        # Work through the requests over batch_duration, so progress and
+        # cancellation can be observed while the job runs
+        output, errors = [], []
+        for position, line in enumerate(lines):
+            with self._lock:
+                if batch["status"] == "cancelling":
+                    break
+                failed = self._rng.random() < self.error_rate
+                batch["request_counts"]["failed" if failed else "completed"] += 1
+
+            record = {"id": f"batch_req_{batch_id}_{position}", "custom_id": line.get("custom_id"), "error": None}
+            if failed:
+                record["response"] = {"status_code": 500, "request_id": record["id"], "body": {
+                    "error": {"message": "Internal server error (mock)", "type": "server_error"}
+                }}
+                errors.append(record)
+            else:
+                body = line.get("body") or {}
+                record["response"] = {"status_code": 200, "request_id": record["id"],
+                                      "body": make_completion(body, self.cached_tokens(body))}
+                output.append(record)
+                self.cache_prompt(body)
+            if self.batch_duration:
+                time.sleep(self.batch_duration / len(lines))
+
+        def write(records, name):
+            if not records:
+                return None
+            content = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+            return self.add_file(name, "batch_output", content)["id"]
+
+        output_file_id = write(output, f"{batch_id}_output.jsonl")
+        error_file_id = write(errors, f"{batch_id}_error.jsonl")
+        with self._lock:
+            batch["output_file_id"] = output_file_id
+            batch["error_file_id"] = error_file_id
+            if batch["status"] == "cancelling":
+                batch["status"] = "cancelled"
+                batch["cancelled_at"] = int(time.time())
+            else:
+                batch["status"] = "completed"
+                batch["finalizing_at"] = batch["completed_at"] = int(time.time())
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Streamed chunks are small writes; don't let Nagle delay them
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                # Benchmarks make thousands of requests; keep stderr quiet
+                pass
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                with server._lock:
+                    stored = server.files.get(parts[2]) if parts[:2] == ["v1", "files"] and len(parts) > 2 else None
+                    batch = server.batches.get(parts[2]) if parts[:2] == ["v1", "batches"] and len(parts) == 3 else None
+                    batch = dict(batch) if batch is not None else None
+
+                if stored is not None and len(parts) == 3:
+                    self._send_json(200, stored["object"])
+                elif stored is not None and parts[3:] == ["content"]:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(stored["content"])))
+                    self.end_headers()
+                    self.wfile.write(stored["content"])
+                elif batch is not None:
+                    self._send_json(200, batch)
+                else:
+                    self._not_found()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                path = self.path.rstrip("/")
+                if path == "/v1/files":
+                    self._upload_file(body)
+                    return
+                if path.startswith("/v1/batches/") and path.endswith("/cancel"):
+                    batch_id = path.split("/")[3]
+                    if batch_id not in server.batches:
+                        self._not_found()
+                        return
+                    self._send_json(200, server.cancel_batch(batch_id))
+                    return
+                if path not in ("/v1/chat/completions", "/v1/batches"):
+                    self._not_found()
+                    return
+                try:
+                    request = json.loads(body)
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+                    return
+                if path == "/v1/batches":
+                    self._send_json(200, server.create_batch(request))
+                    return
+
+                allowed, quota_headers = server.take_quota()
+                if not allowed:
+                    reset = float(quota_headers["x-ratelimit-reset-requests"].rstrip("s"))
+                    self._send_json(429, {"error": {"message": "Request quota exceeded (mock)", "type": "rate_limit_error"}},
+                                    dict(quota_headers, **{"retry-after-ms": str(int(reset * 1000))}))
+                    return
+
+                delay, outcome = server._draw()
+                if outcome == "rate_limited":
+                    self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                                    {"retry-after-ms": str(int(server.retry_after * 1000))})
+                    return
+
+                time.sleep(delay)
+                if outcome == "error":
+                    self._send_json(500, {"error": {"message": "Internal server error (mock)", "type": "server_error"}})
+                elif request.get("stream"):
+                    self._stream_completion(request, quota_headers)
+                    server.cache_prompt(request)
+                else:
+                    self._send_json(200, make_completion(request, server.cached_tokens(request)), quota_headers)
+                    server.cache_prompt(request)
+
+            def _upload_file(self, body):
+                fields = parse_multipart(self.headers.get("Content-Type", ""), body)
+                filename, content = fields.get("file", (None, None))
+                if content is None:
+                    self._send_json(400, {"error": {"message": "Missing file", "type": "invalid_request_error"}})
+                    return
+                purpose = (fields.get("purpose") or (None, b""))[1].decode("utf-8")
+                self._send_json(200, server.add_file(filename or "upload.jsonl", purpose, content))
+
+            def _not_found(self):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+            def _send_json(self, status, payload, headers=None):
+                encoded = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def _stream_completion(self, request, headers=None):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+                chunk_id = f"chatcmpl-mock-{time.time_ns()}"
+                model = request.get("model", "mock")
+
+                def send(payload):
+                    data = f"data: {payload}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+
+                def chunk(choices, usage=None):
+                    return json.dumps({
+                        "id": chunk_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": choices,
+                        "usage": usage
+                    })
+
+                cached_tokens = server.cached_tokens(request)
+                samples = [completion_tokens(request, index) for index in range(request.get("n") or 1)]
+                for position in range(max(len(tokens) for tokens, _ in samples)):
+                    if server.token_interval:
+                        time.sleep(server.token_interval)
+                    send(chunk([
+                        {"index": index, "delta": {"content": tokens[position]}, "finish_reason": None}
+                        for index, (tokens, _) in enumerate(samples) if position < len(tokens)
+                    ]))
+
+                send(chunk([
+                    {"index": index, "delta": {}, "finish_reason": finish_reason}
+                    for index, (_, finish_reason) in enumerate(samples)
+                ]))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    completion_count = sum(len(tokens) for tokens, _ in samples)
+                    send(chunk([], completion_usage(request, completion_count, cached_tokens)))
+                send("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Serve a local mock of the OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (0 picks a free port)")
+    parser.add_argument("--latency", default="const:0",
+                        help="Delay before each response, e.g. const:0.2, uniform:0.05,0.5 or lognormal:0.4,0.5")
+    parser.add_argument("--token-interval", type=float, default=0.0,
+                        help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests that fail with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Fraction of requests rejected with a 429")
+    parser.add_argument("--retry-after", type=float, default=0.05,
+                        help="Seconds advertised in Retry-After on 429 responses")
+    parser.add_argument("--seed", type=int, help="Seed for latency and error injection")
+    parser.add_argument("--batch-duration", type=float, default=1.0,
+                        help="Seconds a Batch API job runs before completing")
+    parser.add_argument("--rpm-quota", type=int,
+                        help="Completions allowed per minute before responding with 429s")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    server = MockOpenAIServer(args.host, args.port, latency=args.latency,
+                              token_interval=args.token_interval, error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                              seed=args.seed, batch_duration=args.batch_duration,
+                              rpm_quota=args.rpm_quota)
+
+    # The first line tells launchers (e.g. benchmark.py) where to connect
+    print(f"Listening on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
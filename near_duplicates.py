@@ -0,0 +1,412 @@
+"""
+Near-duplicate detection with MinHash and locality-sensitive hashing (LSH).
+
+Texts are reduced to MinHash signatures: for each of a fixed number of hash
+functions, the smallest hash of the text's shingles (short runs of characters). The share of
+positions where two signatures agree estimates the Jaccard similarity of
+the two texts' shingle sets. LSH splits signatures into bands and buckets
+each band, so a lookup only compares against texts that share a bucket
+instead of every text indexed.
+
+    MinHashIndex        Groups near-duplicate texts (e.g. batch outputs)
+                        into clusters as they are added
+    SimilarPromptCache  Reuses the answer to an already answered prompt
+                        when a new request's prompts are close enough to it
+"""
+import re
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Hash functions per signature; more gives better estimates at more cost
+DEFAULT_PERMUTATIONS = 128
+
+# Bytes per shingle (characters, for ASCII text). Short shingles make small
+# edits (a changed word) cost little similarity, which suits short prompts
+SHINGLE_SIZE = 5
+
+# Estimated Jaccard similarity at which outputs count as near-duplicates
+DUPLICATE_THRESHOLD = 0.7
+
+# Estimated Jaccard similarity at which a prompt counts as already answered
+PROMPT_THRESHOLD = 0.9
+
+# Most answered prompts SimilarPromptCache remembers; the oldest go first
+MAX_PROMPTS = 10000
+
+# Smallest prime above 2**32; shingle hashes and coefficients are 32-bit,
+# so (a * x + b) fits in 64 bits
+_PRIME = 4294967311
+
+# Largest prime below 2**32, folding packed shingles into 32-bit hashes
+_SHINGLE_PRIME = 4294967291
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """
+    Hash the shingles of text, ignoring case and spacing.
+
+    Every run of size bytes of the UTF-8 text is packed into an integer and
+    folded to 32 bits, all at once with NumPy.
+
+    Returns:
+        numpy.ndarray: Distinct uint64 shingle hashes
+    """
+    data = np.frombuffer(WHITESPACE_PATTERN.sub(" ", text.lower()).strip().encode("utf-8"), dtype=np.uint8)
+    if len(data) < size:
+        data = np.pad(data, (0, size - len(data)))
+    weights = np.uint64(256) ** np.arange(size - 1, -1, -1, dtype=np.uint64)
+    packed = sliding_window_view(data, size).astype(np.uint64) @ weights
+    return np.unique(packed % np.uint64(_SHINGLE_PRIME))
+
+
+def lsh_bands(threshold, permutations):
+    """
+    Pick the LSH band layout for a similarity threshold.
+
+    Two texts with similarity s share at least one bucket with probability
+    1 - (1 - s**rows)**bands, which rises steeply around
+    (1 / bands) ** (1 / rows); the layout puts that point closest to the
+    threshold, leaning low so few true near-duplicates are missed.
+
+    Returns:
+        tuple: (bands, rows per band)
+    """
+    layouts = [(permutations // rows, rows) for rows in range(1, permutations + 1)
+               if permutations % rows == 0]
+    return min(layouts, key=lambda layout: abs((1 / layout[0]) ** (1 / layout[1]) - threshold * 0.9))
+
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed, seeded set of hash functions."""
+
+    def __init__(self, permutations=DEFAULT_PERMUTATIONS, seed=1, shingle_size=SHINGLE_SIZE):
+        """
+        Args:
+            permutations (int): Hash functions per signature
+            seed (int): Seed for the hash functions; signatures are only
+                comparable between hashers with the same seed
+            shingle_size (int): Bytes per shingle (at most 8)
+        """
+        rng = np.random.default_rng(seed)
+        self.permutations = permutations
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, 2 ** 32, size=(permutations, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=(permutations, 1), dtype=np.uint64)
+
+    def signature(self, text):
+        """Return text's MinHash signature as a uint64 array."""
+        hashes = shingle_hashes(text, self.shingle_size)
+        return ((self._a * hashes + self._b) % np.uint64(_PRIME)).min(axis=1)
+
+
+def similarity(signature, other):
+    """Estimate the Jaccard similarity of two texts from their signatures."""
+    return float(np.mean(signature == other))
+
+
+class MinHashIndex:
+    """
+    An LSH index of texts that clusters near-duplicates as they are added.
+
+    Adding a text only compares it against the texts it shares an LSH
+    bucket with, and joins the clusters of those at least threshold
+    similar (so clusters are transitive: a ~ b and b ~ c puts a, b and c
+    together). Safe to share between threads.
+    """
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD, hasher=None):
+        """
+        Args:
+            threshold (float): Estimated Jaccard similarity at which texts
+                count as near-duplicates
+            hasher (MinHasher): Hasher to compute signatures with (defaults
+                to a new MinHasher())
+        """
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        self.bands, self.rows = lsh_bands(threshold, self.hasher.permutations)
+
+        self._signatures = {}
+        self._buckets = [{} for _ in range(self.bands)]
+        # Union-find over keys: parent links (always straight to the root)
+        # and the members of each root's cluster
+        self._parents = {}
+        self._members = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, key):
+        return key in self._signatures
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _candidates(self, signature, threshold):
+        """Return (key, similarity) for indexed texts at least threshold similar, most similar first."""
+        candidates = set()
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(buckets.get(band_key, ()))
+        if not candidates:
+            return []
+
+        # Compare against every candidate at once
+        candidates = list(candidates)
+        scores = (np.stack([self._signatures[key] for key in candidates]) == signature).mean(axis=1)
+        matches = [(key, float(score)) for key, score in zip(candidates, scores) if score >= threshold]
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    def _find(self, key):
+        root = key
+        while self._parents[root] != root:
+            root = self._parents[root]
+        # Point the path straight at the root so later lookups are quick
+        while self._parents[key] != root:
+            self._parents[key], key = root, self._parents[key]
+        return root
+
+    def _union(self, key, other):
+        root, other_root = self._find(key), self._find(other)
+        if root == other_root:
+            return
+        if len(self._members[root]) < len(self._members[other_root]):
+            root, other_root = other_root, root
+        # Re-point the smaller cluster so every key links to its root directly
+        # (which lets remove() take a key out without breaking any path)
+        merged = self._members.pop(other_root)
+        for member in merged:
+            self._parents[member] = root
+        self._members[root] |= merged
+
+    def add(self, key, text, signature=None):
+        """
+        Index a text and join it to the clusters of its near-duplicates.
+
+        Adding a key again replaces its text for later lookups; clusters it
+        already joined are kept.
+
+        Args:
+            key: Hashable identifier of the text (e.g. a result index)
+            text (str): The text
+            signature (numpy.ndarray): The text's signature from this
+                index's hasher, if already computed
+        """
+        if signature is None:
+            signature = self.hasher.signature(text)
+        with self._lock:
+            self._remove_from_buckets(key)
+            if key not in self._parents:
+                self._parents[key] = key
+                self._members[key] = {key}
+
+            for other, _ in self._candidates(signature, self.threshold):
+                self._union(key, other)
+
+            self._signatures[key] = signature
+            for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+                buckets.setdefault(band_key, []).append(key)
+
+    def _remove_from_buckets(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = buckets[band_key]
+            bucket.remove(key)
+            if not bucket:
+                del buckets[band_key]
+
+    def remove(self, key):
+        """
+        Drop a key from the index and from its cluster.
+
+        The rest of the cluster stays together, even where the removed text
+        was what linked its members.
+        """
+        with self._lock:
+            self._remove_from_buckets(key)
+            if key not in self._parents:
+                return
+            root = self._find(key)
+            del self._parents[key]
+            members = self._members[root]
+            members.discard(key)
+            if root == key:
+                del self._members[root]
+                if members:
+                    new_root = next(iter(members))
+                    for member in members:
+                        self._parents[member] = new_root
+                    self._members[new_root] = members
+
+    def query(self, text, threshold=None):
+        """
+        Find indexed texts similar to text.
+
+        Args:
+            text (str): Text to look up
+            threshold (float): Minimum estimated similarity (defaults to
+                the index's threshold; lower values may miss matches the
+                LSH buckets don't surface)
+
+        Returns:
+            list: (key, estimated similarity) pairs, most similar first
+        """
+        signature = self.hasher.signature(text)
+        with self._lock:
+            return self._candidates(signature, self.threshold if threshold is None else threshold)
+
+    def cluster_of(self, key):
+        """
+        Return the cluster a key belongs to.
+
+        Returns:
+            tuple: (root key identifying the cluster, number of texts in it),
+                or (None, 0) if the key isn't indexed
+        """
+        with self._lock:
+            if key not in self._parents:
+                return None, 0
+            root = self._find(key)
+            return root, len(self._members[root])
+
+    def clusters(self, min_size=2):
+        """Return the clusters of at least min_size texts as lists of keys, largest first."""
+        with self._lock:
+            members = {}
+            for key in self._parents:
+                members.setdefault(self._find(key), []).append(key)
+        return sorted((keys for keys in members.values() if len(keys) >= min_size), key=len, reverse=True)
+
+
+class SimilarPromptCache:
+    """
+    Answers to already answered prompts, looked up by prompt similarity.
+
+    A request matches an earlier one when everything but its system and
+    user prompts is identical (model, product, sampling parameters, stop
+    sequence and number of samples) and its prompts are at least threshold
+    similar. The product has to match exactly because prompt templates for
+    different products differ in only a word or two. Entries live in memory
+    only; safe to share between threads.
+    """
+
+    def __init__(self, threshold=PROMPT_THRESHOLD, max_temperature=None, max_prompts=MAX_PROMPTS,
+                 hasher=None):
+        """
+        Args:
+            threshold (float): Estimated Jaccard similarity at which a
+                prompt counts as already answered
+            max_temperature (float): Only reuse answers for requests at or
+                below this temperature; None reuses them at any temperature
+            max_prompts (int): Most answered prompts to remember
+            hasher (MinHasher): Hasher to compute signatures with
+        """
+        self.threshold = threshold
+        self.max_temperature = max_temperature
+        self.max_prompts = max_prompts
+        self.hasher = hasher or MinHasher()
+
+        self.hits = 0
+        self.misses = 0
+
+        # Scope (the request minus its prompts) -> index of that scope's prompts
+        self._indexes = {}
+        # Entry id -> (scope, answer), oldest first, and answers per scope
+        self._answers = {}
+        self._scope_counts = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _split(request, product):
+        """Split a request into (scope key, prompt text)."""
+        scope = tuple(sorted((name, repr(value)) for name, value in request.items() if name != "messages"))
+        text = "\n".join(message["content"] for message in request["messages"])
+        return (product, scope), text
+
+    def is_cacheable(self, temperature):
+        """Return True if answers may be reused for requests at this temperature."""
+        return self.max_temperature is None or temperature <= self.max_temperature
+
+    def get(self, request, product):
+        """
+        Look up the answer to the most similar prompt already answered.
+
+        Args:
+            request (dict): Chat completions keyword arguments (see
+                openai_wrapper.build_request)
+            product (str): The product the prompts describe
+
+        Returns:
+            tuple: (answer, estimated similarity), or None if no answered
+                prompt is similar enough
+        """
+        scope, text = self._split(request, product)
+        with self._lock:
+            index = self._indexes.get(scope)
+        matches = index.query(text, self.threshold) if index is not None else []
+
+        with self._lock:
+            for entry, score in matches:
+                if entry in self._answers:
+                    self.hits += 1
+                    return self._answers[entry][1], score
+            self.misses += 1
+        return None
+
+    def put(self, request, product, answer):
+        """
+        Remember the answer to a request.
+
+        Args:
+            request (dict): Chat completions keyword arguments
+            product (str): The product the prompts describe
+            answer: The response content
+        """
+        scope, text = self._split(request, product)
+        # Hashing is the slow part, so it happens before taking the lock
+        signature = self.hasher.signature(text)
+        with self._lock:
+            entry = self._next_id
+            self._next_id += 1
+            index = self._indexes.get(scope)
+            if index is None:
+                index = self._indexes[scope] = MinHashIndex(self.threshold, self.hasher)
+            self._answers[entry] = (scope, answer)
+            self._scope_counts[scope] = self._scope_counts.get(scope, 0) + 1
+            index.add(entry, text, signature)
+
+            # Forget the oldest answers, removing them from their scope's index
+            # (and the index once none of its answers are left)
+            while len(self._answers) > self.max_prompts:
+                old_entry = next(iter(self._answers))
+                old_scope, _ = self._answers.pop(old_entry)
+                self._scope_counts[old_scope] -= 1
+                if self._scope_counts[old_scope]:
+                    self._indexes[old_scope].remove(old_entry)
+                else:
+                    del self._scope_counts[old_scope]
+                    self._indexes.pop(old_scope, None)
+
+    def stats(self):
+        """
+        Report usage.
+
+        Returns:
+            dict: "hits", "misses" and "prompts"
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "prompts": len(self._answers)}
+
+    def clear(self):
+        """Forget every answer."""
+        with self._lock:
+            self._indexes = {}
+            self._answers = {}
+            self._scope_counts = {}
@@ -1,12 +1,584 @@
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import json
+import time
+import asyncio
+import itertools
+import threading
+import contextlib
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from rate_limiter import RetryPolicy, estimate_tokens
+from metrics import start_call, finish_call, percentile
+from batch_api import (
+    write_batch_input, parse_batch_line, job_failure, BATCH_ENDPOINT, COMPLETION_WINDOW,
+    MAX_BATCH_REQUESTS, DEFAULT_POLL_INTERVAL, BATCH_PRICE_FACTOR, FINAL_STATUSES
+)
 
-# Load environment variables
-load_dotenv()
+# The openai SDK takes a large share of startup time to import, so it is only
+# imported (and the shared pool and client built) when the first request needs it
+_pool = None
+_client = None
+_client_generation = None
+_client_lock = threading.Lock()
+_env_loaded = False
+
+# Default parameter grid for batch sweeps
+DEFAULT_TEMPERATURES = [0.0, 0.7, 1.2]
+DEFAULT_MAX_TOKENS_VALUES = [50, 150, 300]
+DEFAULT_PRESENCE_PENALTIES = [0.0, 1.5]
+DEFAULT_FREQUENCY_PENALTIES = [0.0, 1.5]
+
+# Default number of API calls a batch runs in parallel
+DEFAULT_MAX_WORKERS = 8
+
+# Default number of requests an async batch keeps in flight
+DEFAULT_MAX_CONCURRENCY = 64
+
+# How often a cancellable batch checks whether it has been cancelled (seconds)
+CANCEL_POLL_INTERVAL = 0.1
+
+# Hedged requests: a model's hedge delay is picked from its most recent
+# HEDGE_WINDOW latencies, once at least HEDGE_MIN_SAMPLES have been seen.
+# Attempts run on a pool of at most HEDGE_MAX_WORKERS threads per wrapper.
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MAX_WORKERS = 128
+
+# Shortest prompt (in tokens) the provider caches; shorter prompts gain
+# nothing from waiting for another request to warm the cache
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+class CallCancelled(Exception):
+    """Raised inside a call whose batch has been cancelled."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call (retries included) runs past its deadline."""
+
+
+def load_env():
+    """Load variables from .env into the environment (only the first call does any work)."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_pool():
+    """
+    Return the connection pool shared by every wrapper, creating it on first use.
+    
+    The pool is configured from the environment (see ConnectionPool.from_env).
+    
+    Returns:
+        ConnectionPool: The shared pool
+    """
+    global _pool
+    if _pool is None:
+        with _client_lock:
+            if _pool is None:
+                from connection_pool import ConnectionPool
+                load_env()
+                _pool = ConnectionPool.from_env()
+    return _pool
+
+
+def get_client():
+    """
+    Return the OpenAI client shared by every wrapper, creating it on first use.
+    
+    The client sends its requests through the shared connection pool, so
+    connections opened by one wrapper (or by warm_up) are reused by the
+    others. It is rebuilt if the pool has grown since. Retries are handled by
+    the wrappers' RetryPolicy, so the client itself never retries.
+    
+    Returns:
+        OpenAI: The shared client
+    """
+    global _client, _client_generation
+    pool = get_pool()
+    with _client_lock:
+        if _client is None or _client_generation != pool.generation:
+            from openai import OpenAI
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0,
+                             http_client=pool.http_client)
+            _client_generation = pool.generation
+    return _client
+
+
+def warm_up():
+    """
+    Build the shared client and open a connection to the API ahead of time.
+    
+    Meant to run on a background thread at startup, so the first generation
+    doesn't pay for importing the SDK and the TLS handshake. Failures are
+    ignored; the first real request will report them.
+    """
+    try:
+        get_client().with_options(timeout=10.0).models.list()
+    except Exception:
+        pass
+
+
+def iter_param_grid(temperatures, max_tokens_values, presence_penalties, frequency_penalties):
+    """
+    Yield every parameter combination of a batch grid, in grid order.
+    
+    Args:
+        temperatures (list): List of temperature values
+        max_tokens_values (list): List of max_tokens values
+        presence_penalties (list): List of presence_penalty values
+        frequency_penalties (list): List of frequency_penalty values
+        
+    Yields:
+        dict: Parameter dictionary for one grid cell
+    """
+    for temp, max_tok, pres_pen, freq_pen in itertools.product(
+            temperatures, max_tokens_values, presence_penalties, frequency_penalties):
+        yield {
+            "temperature": temp,
+            "max_tokens": max_tok,
+            "presence_penalty": pres_pen,
+            "frequency_penalty": freq_pen
+        }
+
+
+def iter_sweep_requests(models, system_prompts, user_prompts, products, temperatures,
+                        max_tokens_values, presence_penalties, frequency_penalties,
+                        stop_sequence=None, n=1):
+    """
+    Yield the generate_response arguments of a sweep over prompts, products and a grid.
+    
+    Requests come out grouped by model, system prompt, user prompt and
+    product (in that nesting), so requests sharing a prompt are adjacent.
+    
+    Args:
+        models (list): Models to use
+        system_prompts (list): System prompts to test
+        user_prompts (list): User prompts to test
+        products (list): Products to describe
+        temperatures, max_tokens_values, presence_penalties, frequency_penalties
+            (list): Parameter grid (see iter_param_grid)
+        stop_sequence (str): Optional stop sequence
+        n (int): Number of samples per cell
+        
+    Yields:
+        dict: Keyword arguments for one generate_response call
+    """
+    for model, system_prompt, user_prompt, product in itertools.product(
+            models, system_prompts, user_prompts, products):
+        for params in iter_param_grid(temperatures, max_tokens_values,
+                                      presence_penalties, frequency_penalties):
+            yield dict(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                       product=product, stop_sequence=stop_sequence, n=n, **params)
+
+
+def prefix_key(request):
+    """
+    Return the key requests sharing a prompt prefix sort together by.
+    
+    The key follows the order of the messages (system prompt, then user
+    prompt, then product), so sorting by it also puts requests that share
+    only the system prompt, or the system and user prompts, next to each other.
+    """
+    return (request.get("model") or "", request.get("system_prompt") or "",
+            request.get("user_prompt") or "", request.get("product") or "")
+
+
+def order_by_prefix(requests):
+    """
+    Sort (index, request) pairs so requests with the same prompt are adjacent.
+    
+    The sort is stable, so each prompt's requests keep their grid order.
+    
+    Returns:
+        list: The (index, request) pairs in prefix order
+    """
+    return sorted(requests, key=lambda pair: prefix_key(pair[1]))
+
+
+def is_prompt_cacheable(request):
+    """Whether a request's prompt is long enough for the provider's prompt cache."""
+    characters = sum(len(request.get(key) or "") for key in ("system_prompt", "user_prompt", "product"))
+    return characters // 4 >= PROMPT_CACHE_MIN_TOKENS
+
+
+def build_messages(system_prompt, user_prompt, product):
+    """
+    Build the chat messages for a product description request.
+    
+    Args:
+        system_prompt (str): The system prompt (omitted if empty)
+        user_prompt (str): The user prompt
+        product (str): The product to generate a description for
+        
+    Returns:
+        list: Chat messages for the chat completions API
+    """
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+        
+    # Add product to user prompt
+    full_user_prompt = f"{user_prompt} Product: {product}"
+    messages.append({"role": "user", "content": full_user_prompt})
+    return messages
+
+
+def build_request(model, system_prompt, user_prompt, product, temperature=0.7,
+                  max_tokens=150, presence_penalty=0.0, frequency_penalty=0.0,
+                  stop_sequence=None, n=1):
+    """
+    Build the keyword arguments for a chat completions request.
+    
+    The returned dictionary fully describes the request, so it doubles as
+    the input for response cache keys.
+    
+    Returns:
+        dict: Keyword arguments for client.chat.completions.create
+    """
+    request = {
+        "model": model,
+        "messages": build_messages(system_prompt, user_prompt, product),
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "presence_penalty": presence_penalty,
+        "frequency_penalty": frequency_penalty,
+        "stop": stop_sequence
+    }
+    
+    # Only send n when asking for several samples, so single-sample requests
+    # (and their cache keys) stay unchanged
+    if n != 1:
+        request["n"] = n
+    return request
+
+
+def plan_prefix_sharing(requests):
+    """
+    Group deterministic requests that differ only in max_tokens.
+    
+    At temperature 0 a shorter max_tokens generation is a truncation of the
+    longest one, so each group only needs its largest-max_tokens request (the
+    leader) to be sent; the others (followers) can be derived from it.
+    
+    Args:
+        requests (iterable): (index, request) pairs, where request holds the
+            keyword arguments for generate_response
+        
+    Returns:
+        tuple: (planned, followers)
+            - planned (list): (index, request) pairs to send, in input order
+            - followers (dict): Leader index -> list of (index, request) pairs
+              to derive from that leader's response
+    """
+    planned = []
+    groups = {}
+    for index, request in requests:
+        if request.get("temperature", 0.7) != 0 or request.get("n", 1) != 1:
+            planned.append((index, request))
+            continue
+            
+        key = json.dumps({k: v for k, v in request.items() if k != "max_tokens"}, sort_keys=True)
+        groups.setdefault(key, []).append((index, request))
+    
+    followers = {}
+    for members in groups.values():
+        members.sort(key=lambda member: member[1].get("max_tokens", 150), reverse=True)
+        leader_index, leader = members[0]
+        planned.append((leader_index, leader))
+        if len(members) > 1:
+            followers[leader_index] = members[1:]
+    
+    planned.sort(key=lambda member: member[0])
+    return planned, followers
+
+
+def truncate_to_tokens(content, token_ends, max_tokens):
+    """
+    Cut a completion down to its first max_tokens tokens.
+    
+    Args:
+        content (str): The full completion text
+        token_ends (list): Cumulative UTF-8 byte offset at the end of each token
+        max_tokens (int): Number of tokens to keep
+        
+    Returns:
+        str: The text of the first max_tokens tokens
+    """
+    if max_tokens >= len(token_ends):
+        return content
+    # Tokens can split multi-byte characters, so cut on bytes and drop any
+    # trailing partial character
+    return content.encode("utf-8")[:token_ends[max_tokens - 1]].decode("utf-8", errors="ignore")
+
+
+def choice_contents(response, n=1):
+    """
+    Extract the generated text from a chat completion.
+    
+    Args:
+        response: The ChatCompletion returned by the API
+        n (int): Number of samples that were requested
+        
+    Returns:
+        str or list: The text, or a list of every sample's text (in choice
+            order) when n is greater than 1
+    """
+    if n == 1:
+        return response.choices[0].message.content
+    choices = sorted(response.choices, key=lambda choice: choice.index)
+    return [choice.message.content for choice in choices]
+
+
+def make_result(index, request, response_content, error, timing=None):
+    """
+    Build the result dictionary for one completed batch request.
+    
+    Args:
+        index (int): Position of the request in the batch
+        request (dict): Keyword arguments the request was generated with
+        response_content (str or list): The generated text (a list of samples
+            when the request asked for several), or None on error
+        error (str): Error message, or None on success
+        timing (dict): Optional "latency" / "time_to_first_token" in seconds,
+            plus any per-call metrics (see call_fields)
+        
+    Returns:
+        dict: Result with "index", the request's model, prompts and product,
+            "parameters" and a "response" or "error"
+    """
+    result = {
+        "index": index,
+        "model": request.get("model"),
+        "system_prompt": request.get("system_prompt"),
+        "user_prompt": request.get("user_prompt"),
+        "product": request.get("product"),
+        "parameters": {
+            "temperature": request.get("temperature", 0.7),
+            "max_tokens": request.get("max_tokens", 150),
+            "presence_penalty": request.get("presence_penalty", 0.0),
+            "frequency_penalty": request.get("frequency_penalty", 0.0)
+        }
+    }
+    
+    if error:
+        result["error"] = error
+    elif isinstance(response_content, list):
+        # Several samples: keep them all, with the first as the main response
+        result["response"] = response_content[0]
+        result["responses"] = response_content
+    else:
+        result["response"] = response_content
+        
+    if timing:
+        result.update(timing)
+        
+    return result
+
+
+def call_fields(call):
+    """
+    Pick the per-call metrics reported on a result.
+    
+    Args:
+        call (dict): Call record from metrics.start_call()
+        
+    Returns:
+        dict: "queue_wait", "time_to_first_byte", "usage", "cost",
+            "finish_reason", "cache_hit", "similar_prompt" (the estimated
+            similarity of the answered prompt reused, see SimilarPromptCache),
+            "hedged" and "backend" (the name of the backend that answered,
+            see BackendPool), omitting unknown values
+    """
+    fields = {}
+    for key in ("queue_wait", "time_to_first_byte", "cost", "finish_reason"):
+        if call.get(key) is not None:
+            fields[key] = call[key]
+    if call.get("prompt_tokens") is not None:
+        fields["usage"] = {
+            "prompt_tokens": call["prompt_tokens"],
+            "completion_tokens": call["completion_tokens"],
+            "total_tokens": call["prompt_tokens"] + (call["completion_tokens"] or 0)
+        }
+        if call.get("cached_tokens") is not None:
+            fields["usage"]["cached_tokens"] = call["cached_tokens"]
+    if call.get("cache_hit"):
+        fields["cache_hit"] = True
+    if call.get("similar_prompt") is not None:
+        fields["similar_prompt"] = call["similar_prompt"]
+    if call.get("hedged"):
+        fields["hedged"] = True
+    if call.get("backend"):
+        fields["backend"] = call["backend"]
+    return fields
+
+
+class ResponseStream:
+    """
+    A streaming completion, iterated as text deltas.
+    
+    Iterating sends the request and yields each piece of text as it arrives.
+    Once iteration finishes, content holds the full text (or error the error
+    message), and time_to_first_token / latency hold the call's timings in
+    seconds. When several samples are requested, only the first sample's
+    deltas are yielded and content is the list of all samples.
+    """
+    
+    def __init__(self, create, request, cache=None, cache_key=None, cached_content=None,
+                 call=None, on_finish=None, cancel=None, deadline=None):
+        """
+        Args:
+            create (callable): Sends the request and returns the chunk stream
+            request (dict): Keyword arguments for client.chat.completions.create
+            cache (ResponseCache): Optional cache to store the completed text in
+            cache_key (str): Key for the cache entry
+            cached_content (str): Previously cached text to replay instead of
+                calling the API
+            call (dict): Optional call record (see metrics.start_call) to fill
+                in with the stream's timings, token usage and finish reason
+            on_finish (callable): Called with the call record once the stream ends
+            cancel (threading.Event): Stop the stream (with a "Cancelled"
+                error) when set
+            deadline (float): Seconds the whole stream may take
+        """
+        self.create = create
+        self.request = request
+        self.cache = cache
+        self.cache_key = cache_key
+        self.cached_content = cached_content
+        self.call = call
+        self.on_finish = on_finish
+        self.cancel = cancel
+        self.deadline = deadline
+        
+        self.content = None
+        self.error = None
+        self.time_to_first_token = None
+        self.latency = None
+    
+    def __iter__(self):
+        start = time.perf_counter()
+        samples = self.request.get("n", 1) if self.request else 1
+        parts = [[] for _ in range(samples)]
+        
+        # Replay a cache hit as a single delta
+        if self.cached_content is not None:
+            self.content = self.cached_content
+            self.time_to_first_token = self.latency = time.perf_counter() - start
+            if self.call is not None:
+                self.call["cache_hit"] = True
+                self._finish()
+            yield self.content[0] if isinstance(self.content, list) else self.content
+            return
+        
+        usage = finish_reason = None
+        opened = stream = None
+        deadline_at = start + self.deadline if self.deadline else None
+        try:
+            # The final chunk carries the token usage
+            stream = self.create(stream=True, stream_options={"include_usage": True}, **self.request)
+            opened = time.perf_counter()
+            for chunk in stream:
+                if self.cancel is not None and self.cancel.is_set():
+                    raise CallCancelled("Cancelled")
+                if deadline_at is not None and time.perf_counter() > deadline_at:
+                    raise DeadlineExceeded(f"Deadline of {self.deadline:g}s exceeded")
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                for choice in chunk.choices:
+                    if choice.index == 0 and choice.finish_reason:
+                        finish_reason = choice.finish_reason
+                    delta = choice.delta.content
+                    if not delta:
+                        continue
+                        
+                    if self.time_to_first_token is None:
+                        self.time_to_first_token = time.perf_counter() - start
+                    parts[choice.index].append(delta)
+                    if choice.index == 0:
+                        yield delta
+            
+            texts = ["".join(sample_parts) for sample_parts in parts]
+            self.content = texts if samples > 1 else texts[0]
+            if self.cache_key is not None:
+                self.cache.put(self.cache_key, self.content)
+                
+        except Exception as e:
+            self.error = str(e)
+            
+        finally:
+            # Closing early (cancelled, past the deadline or abandoned by the
+            # caller) drops the connection instead of reading the rest
+            if stream is not None:
+                stream.close()
+            self.latency = time.perf_counter() - start
+            if self.call is not None:
+                # Network latency runs from sending the request to the last chunk
+                if opened is not None and self.call["time_to_first_byte"] is not None:
+                    self.call["latency"] = self.call["time_to_first_byte"] + time.perf_counter() - opened
+                self.call["time_to_first_token"] = self.time_to_first_token
+                self.call["error"] = self.error is not None
+                finish_call(self.call, usage, finish_reason)
+                self._finish()
+    
+    def _finish(self):
+        if self.on_finish is not None:
+            self.on_finish(self.call)
+    
+    def timing(self):
+        """Return the call's timings and metrics as a dictionary (omitting unknown values)."""
+        timing = {"latency": self.latency}
+        if self.time_to_first_token is not None:
+            timing["time_to_first_token"] = self.time_to_first_token
+        if self.call is not None:
+            timing.update(call_fields(self.call))
+        return timing
+
+
+class _BackendStream:
+    """
+    A streaming attempt's chunk stream that reports the outcome to its
+    backend pool once closed, so the backend counts as in flight until the
+    last chunk and its latency covers the whole body.
+    """
+    
+    def __init__(self, stream, backends, backend, sent, aborted=None):
+        self.stream = stream
+        self.backends = backends
+        self.backend = backend
+        self.sent = sent
+        # Tells whether the stream's connection was aborted on purpose,
+        # which is no fault of the backend's
+        self.aborted = aborted
+        self.finished = False
+        self.error = None
+    
+    def __iter__(self):
+        try:
+            yield from self.stream
+        except Exception as e:
+            if self.aborted is None or not self.aborted():
+                self.error = e
+            raise
+        self.finished = True
+    
+    def close(self):
+        if self.backend is None:
+            return
+        backend, self.backend = self.backend, None
+        try:
+            self.stream.close()
+        finally:
+            # A stream closed early (cancelled, aborted or abandoned) has no
+            # full latency to report and says nothing about the backend's health
+            response = getattr(self.stream, "response", None)
+            self.backends.release(backend, latency=time.perf_counter() - self.sent if self.finished else None,
+                                  error=self.error, headers=response.headers if response is not None else None,
+                                  aborted=not self.finished and self.error is None)
 
-# Set up OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 class OpenAIWrapper:
     """
@@ -14,15 +586,94 @@ class OpenAIWrapper:
     This class separates the OpenAI API logic from the UI code.
     """
     
-    def __init__(self):
-        """Initialize the OpenAI wrapper."""
+    def __init__(self, cache=None, rate_limiter=None, retry_policy=None, metrics=None,
+                 base_url=None, api_key=None, pool=None, deadline=None, hedge_percentile=None,
+                 similar_prompts=None, backends=None):
+        """
+        Initialize the OpenAI wrapper.
+        
+        Args:
+            cache (ResponseCache): Optional cache consulted before calling the API
+            rate_limiter (RateLimiter): Optional limiter shared by all callers
+                of the same account
+            retry_policy (RetryPolicy): Retry behaviour for rate limits and
+                server errors (defaults to RetryPolicy())
+            metrics (MetricsRegistry): Optional registry every call is recorded in
+            base_url (str): Send requests to this OpenAI-compatible endpoint
+                (e.g. a local mock server) instead of the default client's
+            api_key (str): API key for base_url (defaults to OPENAI_API_KEY)
+            pool (ConnectionPool): Connection pool to send requests through
+                (defaults to the pool shared by every wrapper, see get_pool)
+            deadline (float): Seconds each call may take, retries included;
+                calls still running then fail with DeadlineExceeded
+            hedge_percentile (float): If given, a non-streaming request that
+                hasn't answered within this percentile (e.g. 95) of the
+                model's recent latencies is sent a second time, and the
+                first reply wins
+            similar_prompts (SimilarPromptCache): Optional index of answered
+                prompts; a request whose prompts are close enough to one
+                already answered (with the same model, product and
+                parameters) reuses that answer instead of calling the API
+            backends (BackendPool): Route chat completions across several
+                API keys and/or endpoints by their health and quota instead
+                of sending them all through one client (see backends.py)
+        """
+        load_env()
+        
         # Verify API key is set
-        if not client.api_key:
+        if backends is None and not (api_key or os.getenv("OPENAI_API_KEY")):
             raise ValueError("OpenAI API key is not set. Please check your .env file.")
+        
+        # Without an endpoint or pool of its own, the wrapper uses the shared client
+        self.base_url = base_url
+        self.api_key = api_key
+        self.pool = pool
+        self.backends = backends
+        self._client = None
+        self._client_generation = None
+        
+        self.cache = cache
+        self.similar_prompts = similar_prompts
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics
+        
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=HEDGE_WINDOW))
+        self._latencies_lock = threading.Lock()
+        self._hedge_executor = None
+        
+        # Abort key (a batch's cancel event or a hedged call's race) -> the
+        # threads sending requests on its behalf, and the threads whose
+        # request has been aborted (see _abort)
+        self._abortable = {}
+        self._aborted = set()
+        self._abort_lock = threading.Lock()
+    
+    @property
+    def connection_pool(self):
+        """The ConnectionPool this wrapper's requests go through."""
+        return self.pool if self.pool is not None else get_pool()
+    
+    @property
+    def client(self):
+        """The OpenAI client requests are sent with (created on first use)."""
+        if self.base_url is None and self.api_key is None and self.pool is None:
+            return get_client()
+        
+        pool = self.connection_pool
+        if self._client is None or self._client_generation != pool.generation:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key or os.getenv("OPENAI_API_KEY"),
+                                  base_url=self.base_url, max_retries=0,
+                                  http_client=pool.http_client)
+            self._client_generation = pool.generation
+        return self._client
     
     def generate_response(self, model, system_prompt, user_prompt, product, 
                          temperature=0.7, max_tokens=150, presence_penalty=0.0, 
-                         frequency_penalty=0.0, stop_sequence=None):
+                         frequency_penalty=0.0, stop_sequence=None, n=1, stream=False):
         """
         Generate a response from the OpenAI API.
         
@@ -36,43 +687,457 @@ class OpenAIWrapper:
             presence_penalty (float): Penalty for token presence (0.0 to 2.0)
             frequency_penalty (float): Penalty for token frequency (0.0 to 2.0)
             stop_sequence (str): Optional sequence where the API will stop generating
+            n (int): Number of samples to generate in the same API call
+            stream (bool): Return a ResponseStream of text deltas instead of
+                waiting for the full completion
             
         Returns:
             tuple: (response_content, error_message)
-                - response_content (str): The generated text if successful, None otherwise
+                - response_content (str): The generated text if successful, None otherwise;
+                  a list of the samples' texts when n is greater than 1
                 - error_message (str): Error message if an error occurred, None otherwise
+            When stream is True, a ResponseStream is returned instead.
+        """
+        request = dict(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                       product=product, temperature=temperature, max_tokens=max_tokens,
+                       presence_penalty=presence_penalty, frequency_penalty=frequency_penalty,
+                       stop_sequence=stop_sequence, n=n)
+        if stream:
+            return self._stream_response(**request)
+        
+        response_content, error, _ = self._generate(**request)
+        return response_content, error
+    
+    def generate_with_metrics(self, **kwargs):
         """
+        Like generate_response (without streaming), but also report the call's metrics.
+        
+        Returns:
+            tuple: (response_content, error_message, metrics), where metrics
+                holds the call's queue wait, time to first byte, token usage,
+                cost estimate and finish reason (see call_fields)
+        """
+        response_content, error, call = self._generate(**kwargs)
+        return response_content, error, call_fields(call)
+    
+    def _generate(self, queued_at=None, cancel=None, **kwargs):
+        """
+        Run one non-streaming request and record its metrics.
+        
+        Args:
+            queued_at (float): time.perf_counter() value when the request was queued
+            cancel (threading.Event): Give up (between attempts) once set
+            **kwargs: Arguments for build_request
+            
+        Returns:
+            tuple: (response_content, error_message, call), where call is the
+                request's call record (see metrics.start_call)
+        """
+        call = start_call(kwargs.get("model"), queued_at)
         try:
-            # Prepare messages
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-                
-            # Add product to user prompt
-            full_user_prompt = f"{user_prompt} Product: {product}"
-            messages.append({"role": "user", "content": full_user_prompt})
+            # Prepare request
+            request = build_request(**kwargs)
+            
+            # Serve repeated requests from the cache
+            cache_key = None
+            if self.cache is not None and self.cache.is_cacheable(kwargs.get("temperature", 0.7)):
+                cache_key = self.cache.make_key(request)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    call["cache_hit"] = True
+                    return cached, None, call
+            
+            # Then reuse the answer to a similar prompt, if enabled
+            similar = self._similar_answer(request, kwargs)
+            if similar is not None:
+                content, call["similar_prompt"] = similar
+                call["cache_hit"] = True
+                return content, None, call
             
             # Call OpenAI API with new syntax
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                presence_penalty=presence_penalty,
-                frequency_penalty=frequency_penalty,
-                stop=stop_sequence
-            )
+            response = self._create_completion(call, cancel=cancel, **request)
             
             # Extract and return the response content
-            return response.choices[0].message.content, None
+            content = choice_contents(response, kwargs.get("n", 1))
+            if cache_key is not None:
+                self.cache.put(cache_key, content)
+            if self.similar_prompts is not None:
+                self.similar_prompts.put(request, kwargs.get("product"), content)
+            return content, None, call
             
         except Exception as e:
             # Return error message
-            return None, str(e)
+            call["error"] = True
+            return None, str(e), call
+            
+        finally:
+            self._record(call)
+    
+    def _stream_response(self, queued_at=None, cancel=None, **kwargs):
+        """Create the ResponseStream for a streaming generate_response call."""
+        request = build_request(**kwargs)
+        call = start_call(kwargs.get("model"), queued_at)
+        options = dict(call=call, on_finish=self._record, cancel=cancel, deadline=self.deadline)
+        
+        def create(**stream_request):
+            return self._create_completion(call, cancel=cancel, **stream_request)
+        
+        stream = self._cached_stream(create, request, kwargs, options)
+        if stream.cached_content is not None or self.similar_prompts is None:
+            return stream
+        
+        # Reuse the answer to a similar prompt, if enabled, or remember this
+        # stream's answer once it completes
+        similar = self._similar_answer(request, kwargs)
+        if similar is not None:
+            stream.cached_content, call["similar_prompt"] = similar
+            return stream
+            
+        def on_finish(call):
+            if stream.content is not None and stream.error is None:
+                self.similar_prompts.put(request, kwargs.get("product"), stream.content)
+            self._record(call)
+        stream.on_finish = on_finish
+        return stream
+    
+    def _cached_stream(self, create, request, kwargs, options):
+        """Create a ResponseStream that replays (or fills in) the response cache entry, if any."""
+        if self.cache is None or not self.cache.is_cacheable(kwargs.get("temperature", 0.7)):
+            return ResponseStream(create, request, **options)
+            
+        cache_key = self.cache.make_key(request)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return ResponseStream(create, request, cached_content=cached, **options)
+        return ResponseStream(create, request, cache=self.cache, cache_key=cache_key, **options)
+    
+    def _similar_answer(self, request, kwargs):
+        """Return (answer, similarity) from the similar-prompt cache, or None."""
+        if self.similar_prompts is None or not self.similar_prompts.is_cacheable(request["temperature"]):
+            return None
+        return self.similar_prompts.get(request, kwargs.get("product"))
+    
+    def _record(self, call):
+        """Add a finished call to the metrics registry, if there is one."""
+        if self.metrics is not None:
+            self.metrics.record(call)
+    
+    def _create_completion(self, call, cancel=None, **request):
+        """
+        Call the chat completions API under the rate limiter, with retries.
+        
+        Rate limits and server errors are retried according to the retry
+        policy; a 429 also pauses every other caller sharing the limiter.
+        Other errors, or running out of retries, raise the API error. With a
+        deadline, each attempt only gets the time left and a call that runs
+        out raises DeadlineExceeded; a set cancel event raises CallCancelled
+        before the next attempt. Non-streaming attempts may be hedged (see
+        _send_hedged).
+        
+        The call record is updated with the time spent waiting for the rate
+        limiter (as queue wait), the number of retries, and the successful
+        attempt's time to first byte, latency, token usage and finish reason.
+        Streaming requests return as soon as the response headers arrive, so
+        their latency and usage are filled in by the ResponseStream.
+        """
+        estimated_tokens = estimate_tokens(request)
+        deadline_at = time.perf_counter() + self.deadline if self.deadline else None
+        # Backends this call has been sent to, so retries go elsewhere if they can
+        tried = set()
+        
+        for attempt in itertools.count():
+            if cancel is not None and cancel.is_set():
+                raise CallCancelled("Cancelled")
+                
+            if self.rate_limiter is not None:
+                waited = time.perf_counter()
+                self.rate_limiter.acquire(estimated_tokens)
+                call["queue_wait"] += time.perf_counter() - waited
+                
+            backend = self._acquire_backend(call, estimated_tokens, tried, cancel, deadline_at)
+            if backend is not None:
+                call["backend"] = backend.name
+            sent = time.perf_counter()
+            try:
+                if request.get("stream"):
+                    response = self._open_stream(request, deadline_at, backend)
+                    call["time_to_first_byte"] = time.perf_counter() - sent
+                    return response
+                
+                if self.hedge_percentile:
+                    response, call["time_to_first_byte"] = self._send_hedged(
+                        call, request, deadline_at, estimated_tokens, backend, tried, cancel)
+                else:
+                    response, call["time_to_first_byte"] = self._send(request, deadline_at, backend)
+                call["latency"] = time.perf_counter() - sent
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if deadline_at is not None and time.perf_counter() >= deadline_at:
+                    raise DeadlineExceeded(f"Deadline of {self.deadline:g}s exceeded") from e
+                delay = self.retry_policy.delay_for(attempt, e)
+                if delay is None:
+                    raise
+                if deadline_at is not None and time.perf_counter() + delay >= deadline_at:
+                    raise DeadlineExceeded(f"Deadline of {self.deadline:g}s exceeded ({e})") from e
+                    
+                if self.backends is not None and self.backends.available(estimated_tokens, exclude=tried):
+                    # Another backend can take the retry straight away
+                    delay = 0.0
+                elif self.rate_limiter is not None and RetryPolicy.is_rate_limit(e):
+                    self.rate_limiter.pause(delay)
+                call["retries"] += 1
+                if cancel is not None:
+                    cancel.wait(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            
+            self._observe_latency(call["model"], call["latency"])
+            
+            # Give back the part of the token estimate the call didn't use
+            usage = getattr(response, "usage", None)
+            if self.rate_limiter is not None and usage is not None:
+                self.rate_limiter.refund(estimated_tokens - usage.total_tokens)
+            finish_call(call, usage, response.choices[0].finish_reason if response.choices else None)
+            return response
+    
+    def _attempt_options(self, deadline_at):
+        """Return the per-attempt request options: the time left before the deadline, if any."""
+        if deadline_at is None:
+            return {}
+        remaining = deadline_at - time.perf_counter()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline of {self.deadline:g}s exceeded")
+        return {"timeout": remaining}
+    
+    def _acquire_backend(self, call, estimated_tokens, tried, cancel=None, deadline_at=None):
+        """
+        Wait for the backend to send an attempt to, when routing across a BackendPool.
+        
+        Returns:
+            Backend: The backend (added to tried), or None without a backend pool
+        """
+        if self.backends is None:
+            return None
+        waited = time.perf_counter()
+        backend = self.backends.acquire(estimated_tokens, exclude=tried, cancel=cancel, deadline_at=deadline_at)
+        call["queue_wait"] += time.perf_counter() - waited
+        if backend is None:
+            if cancel is not None and cancel.is_set():
+                raise CallCancelled("Cancelled")
+            raise DeadlineExceeded(f"Deadline of {self.deadline:g}s exceeded (no backend available)")
+        tried.add(backend)
+        return backend
+    
+    def _client_for(self, backend):
+        """Return the client to send an attempt with: the backend's, or this wrapper's."""
+        return self.client if backend is None else backend.client(self.connection_pool)
+    
+    def _open_stream(self, request, deadline_at, backend=None):
+        """
+        Send one streaming attempt and return the chunk stream once the
+        response headers arrive. With a backend, the backend is released
+        when the stream is closed (see _BackendStream).
+        """
+        sent = time.perf_counter()
+        try:
+            client = self._client_for(backend)
+            # Aborted before the request went out (see _abort)
+            if self._was_aborted():
+                raise CallCancelled("Cancelled")
+            response = client.chat.completions.create(**request, **self._attempt_options(deadline_at))
+        except Exception as e:
+            if backend is not None:
+                aborted = self._was_aborted()
+                self.backends.release(backend, error=None if aborted else e, aborted=aborted)
+            raise
+        if backend is not None:
+            return _BackendStream(response, self.backends, backend, sent, self._was_aborted)
+        return response
+    
+    def _send(self, request, deadline_at=None, backend=None):
+        """
+        Send one non-streaming attempt (to backend, if given, reporting the
+        outcome to the backend pool).
+        
+        Returns:
+            tuple: (response, time to first byte in seconds)
+        """
+        sent = time.perf_counter()
+        
+        # Open the response without reading the body, so the time to
+        # first byte can be told apart from the full latency
+        try:
+            client = self._client_for(backend)
+            # Aborted before the request went out (see _abort)
+            if self._was_aborted():
+                raise CallCancelled("Cancelled")
+            with client.chat.completions.with_streaming_response.create(
+                    **request, **self._attempt_options(deadline_at)) as raw:
+                time_to_first_byte = time.perf_counter() - sent
+                response = raw.parse()
+        except Exception as e:
+            if backend is not None:
+                aborted = self._was_aborted()
+                self.backends.release(backend, error=None if aborted else e, aborted=aborted)
+            raise
+        if backend is not None:
+            self.backends.release(backend, latency=time.perf_counter() - sent, headers=raw.headers)
+        return response, time_to_first_byte
+    
+    def _send_hedged(self, call, request, deadline_at, estimated_tokens, backend=None, tried=None,
+                     cancel=None):
+        """
+        Send one attempt, hedged against a slow reply.
+        
+        If the attempt hasn't answered within the model's hedge delay (see
+        hedge_delay), the same request is sent again and whichever attempt
+        succeeds first is used; the other is aborted. The duplicate goes
+        through the rate limiter like any other request (and, with a backend
+        pool, preferably to another backend), and the call record is marked
+        as hedged. While the duplicate waits for the rate limiter the first
+        attempt keeps being watched: if it finishes first, or the wait would
+        outlast the deadline, the duplicate is never sent and its
+        reservation is given back. Setting cancel aborts both attempts.
+        
+        Returns:
+            tuple: (response, time to first byte in seconds)
+        """
+        delay = self.hedge_delay(request.get("model"))
+        if delay is None:
+            return self._send(request, deadline_at, backend)
+            
+        if self._hedge_executor is None:
+            with self._latencies_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS,
+                                                              thread_name_prefix="hedge")
+        
+        race = object()
+        
+        def send(attempt_backend):
+            with self._abortable_by(race, cancel):
+                return self._send(request, deadline_at, attempt_backend)
+        
+        # Attempt -> the backend it was sent to
+        first = self._hedge_executor.submit(send, backend)
+        backends = {first: backend}
+        done, _ = wait(backends, timeout=delay)
+        if not done:
+            needed, hedge_backend = self._reserve_hedge(call, first, estimated_tokens, tried, cancel,
+                                                        deadline_at, race)
+            if needed:
+                call["hedged"] = True
+                backends[self._hedge_executor.submit(send, hedge_backend)] = hedge_backend
+        
+        # The first success wins; fail only once every attempt has failed
+        error = None
+        attempts = set(backends)
+        while attempts:
+            done, attempts = wait(attempts, return_when=FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    if backends[attempt] is not None:
+                        call["backend"] = backends[attempt].name
+                    # The race is decided, so the slower attempt is dropped
+                    self._abort(race)
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+    
+    def _reserve_hedge(self, call, first, estimated_tokens, tried, cancel, deadline_at, race):
+        """
+        Get the rate limiter's and the backend pool's go-ahead for a hedge
+        of the attempt first.
+        
+        The rate limiter wait is spent waiting on the first attempt, which
+        also ends if cancel aborts it. If acquiring a backend fails, the first
+        attempt is aborted too so it doesn't keep holding its backend.
+        
+        Returns:
+            tuple: (whether the hedge is still needed, the backend to send it
+                to or None without a backend pool)
+        """
+        if self.rate_limiter is not None:
+            delay = self.rate_limiter.reserve(estimated_tokens)
+            if deadline_at is not None and time.perf_counter() + delay >= deadline_at:
+                # The hedge would only go out once the call has run out of time
+                self.rate_limiter.refund(estimated_tokens, requests=1)
+                return False, None
+            done, _ = wait([first], timeout=delay)
+            if done or (cancel is not None and cancel.is_set()):
+                self.rate_limiter.refund(estimated_tokens, requests=1)
+                return False, None
+        try:
+            return True, self._acquire_backend(call, estimated_tokens, tried, cancel, deadline_at)
+        except Exception:
+            if self.rate_limiter is not None:
+                self.rate_limiter.refund(estimated_tokens, requests=1)
+            self._abort(race)
+            raise
+    
+    @contextlib.contextmanager
+    def _abortable_by(self, *keys):
+        """Let _abort(key) drop the request this thread has in flight while the block runs."""
+        thread = threading.get_ident()
+        keys = [key for key in keys if key is not None]
+        with self._abort_lock:
+            for key in keys:
+                self._abortable.setdefault(key, set()).add(thread)
+        try:
+            yield
+        finally:
+            with self._abort_lock:
+                for key in keys:
+                    threads = self._abortable[key]
+                    threads.discard(thread)
+                    if not threads:
+                        del self._abortable[key]
+                aborted = thread in self._aborted
+                self._aborted.discard(thread)
+            if aborted:
+                self.connection_pool.resume(thread)
+    
+    def _abort(self, key):
+        """Abort the requests in flight on behalf of key (see ConnectionPool.abort)."""
+        with self._abort_lock:
+            threads = list(self._abortable.get(key, ()))
+            self._aborted.update(threads)
+        for thread in threads:
+            self.connection_pool.abort(thread)
+    
+    def _was_aborted(self):
+        """Whether this thread's request was aborted by _abort rather than failing on its own."""
+        with self._abort_lock:
+            return threading.get_ident() in self._aborted
+    
+    def hedge_delay(self, model):
+        """
+        Return how long to wait before hedging a request to the given model.
+        
+        Returns:
+            float: The hedge_percentile of the model's recent latencies, or
+                None while hedging is off or too few latencies have been seen
+        """
+        if not self.hedge_percentile:
+            return None
+        with self._latencies_lock:
+            latencies = list(self._latencies.get(model, ()))
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return percentile(latencies, self.hedge_percentile)
+    
+    def _observe_latency(self, model, latency):
+        """Remember a successful attempt's latency for picking hedge delays."""
+        if latency is not None:
+            with self._latencies_lock:
+                self._latencies[model].append(latency)
     
     def batch_generate(self, model, system_prompt, user_prompt, product,
                       temperatures, max_tokens_values, presence_penalties,
-                      frequency_penalties, stop_sequence=None):
+                      frequency_penalties, stop_sequence=None, n=1,
+                      max_workers=DEFAULT_MAX_WORKERS, share_prefixes=False):
         """
         Generate responses for multiple parameter combinations.
         
@@ -86,52 +1151,834 @@ class OpenAIWrapper:
             presence_penalties (list): List of presence_penalty values to test
             frequency_penalties (list): List of frequency_penalty values to test
             stop_sequence (str): Optional stop sequence
+            n (int): Number of samples per cell, generated in one API call each
+            max_workers (int): Maximum number of API calls running at once
+            share_prefixes (bool): Derive temperature 0 cells with smaller
+                max_tokens from the largest one instead of calling the API
+                (see iter_generate)
             
         Returns:
-            list: List of result dictionaries with parameters and responses
-        """
-        results = []
-        
-        # Generate all combinations
-        for temp in temperatures:
-            for max_tok in max_tokens_values:
-                for pres_pen in presence_penalties:
-                    for freq_pen in frequency_penalties:
-                        # Generate response
-                        response_content, error = self.generate_response(
-                            model=model,
-                            system_prompt=system_prompt,
-                            user_prompt=user_prompt,
-                            product=product,
-                            temperature=temp,
-                            max_tokens=max_tok,
-                            presence_penalty=pres_pen,
-                            frequency_penalty=freq_pen,
-                            stop_sequence=stop_sequence
-                        )
+            list: List of result dictionaries with parameters and responses, in grid order
+        """
+        results = list(self.iter_batch_generate(
+            model, system_prompt, user_prompt, product,
+            temperatures, max_tokens_values, presence_penalties,
+            frequency_penalties, stop_sequence=stop_sequence, n=n,
+            max_workers=max_workers, share_prefixes=share_prefixes
+        ))
+        
+        # Restore grid order (results arrive in completion order)
+        results.sort(key=lambda result: result["index"])
+        return results
+    
+    def iter_batch_generate(self, model, system_prompt, user_prompt, product,
+                            temperatures, max_tokens_values, presence_penalties,
+                            frequency_penalties, stop_sequence=None, n=1,
+                            max_workers=DEFAULT_MAX_WORKERS, on_delta=None,
+                            share_prefixes=False):
+        """
+        Generate responses for multiple parameter combinations concurrently.
+        
+        Takes the same arguments as batch_generate, but yields each result as
+        soon as its API call completes instead of waiting for the whole grid.
+        Pass on_delta to stream each cell's text as it arrives (see
+        iter_generate).
+        
+        Yields:
+            dict: Result dictionary with the cell's grid "index", its parameters
+                and either a "response" or an "error"
+        """
+        requests = (
+            dict(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                 product=product, stop_sequence=stop_sequence, n=n, **params)
+            for params in iter_param_grid(temperatures, max_tokens_values,
+                                          presence_penalties, frequency_penalties)
+        )
+        yield from self.iter_generate(requests, max_workers=max_workers, on_delta=on_delta,
+                                      share_prefixes=share_prefixes)
+    
+    def iter_generate(self, requests, max_workers=DEFAULT_MAX_WORKERS, on_delta=None,
+                      share_prefixes=False, group_prefixes=False, cancel=None, skip=None):
+        """
+        Run generate_response for many requests on a bounded thread pool.
+        
+        Only a small window of requests is submitted ahead of the workers, so
+        very large (or lazily generated) request streams use constant memory.
+        
+        Args:
+            requests (iterable): Keyword-argument dictionaries for generate_response
+            max_workers (int): Maximum number of API calls running at once
+            on_delta (callable): If given, requests are streamed and
+                on_delta(index, request, delta) is called from the worker
+                thread for every text delta as it arrives
+            share_prefixes (bool): Send only the largest max_tokens request of
+                each group of otherwise identical temperature 0 requests and
+                derive the others by truncating its tokens. Derived results
+                carry a "derived_from" entry. This needs the whole request
+                list up front, and the shared requests are not streamed.
+            group_prefixes (bool): Send requests grouped by prompt (see
+                order_by_prefix), so the provider's prompt cache gets hits.
+                For prompts long enough to be cached, the first request of
+                each prompt runs alone and the rest follow once it has
+                warmed the cache. This also needs the whole request list up front.
+            cancel (threading.Event): Set it to cancel the batch: requests
+                not yet started are dropped, and requests still running
+                have their connections aborted and are reported with a
+                "Cancelled" error. Iteration ends promptly once it is set.
+            skip (collection): Indexes of requests not to send, e.g. the
+                cells a resumed sweep already completed; the other requests
+                keep their positions as indexes
+            
+        Yields:
+            dict: Result dictionary for each request, in completion order; "index"
+                is the request's position in the input
+        """
+        max_workers = max(1, int(max_workers))
+        
+        # One connection per worker, so no request queues for the pool
+        self.connection_pool.ensure_capacity(max_workers)
+        
+        followers = {}
+        requests = enumerate(requests)
+        if skip:
+            requests = ((index, request) for index, request in requests if index not in skip)
+        if share_prefixes:
+            requests, followers = plan_prefix_sharing(requests)
+        if group_prefixes:
+            requests = order_by_prefix(requests)
+        requests = iter(requests)
+        
+        # Followers whose leader could not be used are sent on their own
+        fallback = collections.deque()
+        
+        # Requests waiting for the first request of their prompt to warm the
+        # prompt cache: prefix key -> (index of that first request, held requests)
+        priming = {}
+        primed = set()
+        ready = collections.deque()
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = {}
+        cancelled = False
+        
+        def run(function, *args):
+            # Cancelling the batch aborts the requests the worker has in flight
+            with self._abortable_by(cancel):
+                return function(*args)
+        
+        def next_request():
+            if fallback:
+                return fallback.popleft()
+            if ready:
+                return ready.popleft()
+                
+            for index, request in requests:
+                if not group_prefixes or not is_prompt_cacheable(request):
+                    return index, request
+                    
+                key = prefix_key(request)
+                if key in priming:
+                    priming[key][1].append((index, request))
+                    continue
+                if key not in primed:
+                    priming[key] = (index, [])
+                return index, request
+            return None, None
+        
+        def submit_next(count):
+            for _ in range(count):
+                index, request = next_request()
+                if request is None:
+                    return
+                
+                # Time spent waiting for a worker counts as queue wait
+                queued_at = time.perf_counter()
+                if index in followers:
+                    future = executor.submit(run, self._run_prefix_leader, request, queued_at, cancel)
+                else:
+                    future = executor.submit(run, self._run_request, index, request, on_delta, queued_at, cancel)
+                pending[future] = (index, request)
+        
+        try:
+            # Keep the pool busy with a small backlog of queued requests
+            submit_next(max_workers * 2)
+            
+            while pending:
+                # A cancellable batch wakes up regularly to check for cancellation
+                done, _ = wait(pending, timeout=CANCEL_POLL_INTERVAL if cancel is not None else None,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, request = pending.pop(future)
+                    
+                    # The prompt cache is warm: release the rest of the prompt's requests
+                    key = prefix_key(request)
+                    if key in priming and priming[key][0] == index:
+                        ready.extend(priming.pop(key)[1])
+                        primed.add(key)
+                        
+                    if index in followers:
+                        yield from self._prefix_results(index, request, future,
+                                                        followers.pop(index), fallback)
+                        continue
                         
-                        # Store result
-                        if error:
-                            result = {
-                                "parameters": {
-                                    "temperature": temp,
-                                    "max_tokens": max_tok,
-                                    "presence_penalty": pres_pen,
-                                    "frequency_penalty": freq_pen
-                                },
-                                "error": error
-                            }
-                        else:
-                            result = {
-                                "parameters": {
-                                    "temperature": temp,
-                                    "max_tokens": max_tok,
-                                    "presence_penalty": pres_pen,
-                                    "frequency_penalty": freq_pen
-                                },
-                                "response": response_content
-                            }
-                            
-                        results.append(result)
+                    try:
+                        response_content, error, timing = future.result()
+                    except Exception as e:
+                        response_content, error, timing = None, str(e), None
+                    
+                    yield make_result(index, request, response_content, error, timing)
+                
+                if cancel is not None and cancel.is_set():
+                    cancelled = True
+                    break
+                    
+                submit_next(max_workers * 2 - len(pending))
+            
+            if cancelled:
+                # Drop the queued requests first, so workers freed by the
+                # abort don't start them. Then abort the requests already
+                # running and report them as cancelled; their workers wind
+                # down in the background
+                running = [pending[future] for future in list(pending) if not future.cancel()]
+                self._abort(cancel)
+                for index, request in running:
+                    yield make_result(index, request, None, "Cancelled", None)
+        finally:
+            executor.shutdown(wait=not cancelled, cancel_futures=cancelled)
+    
+    def batch_generate_job(self, model, system_prompt, user_prompt, product,
+                           temperatures, max_tokens_values, presence_penalties,
+                           frequency_penalties, stop_sequence=None, n=1,
+                           poll_interval=DEFAULT_POLL_INTERVAL, on_status=None):
+        """
+        Generate responses for multiple parameter combinations as a Batch API job.
+        
+        Takes the same grid as batch_generate, but submits it to the OpenAI
+        Batch API and waits for the job instead of calling the API live (see
+        iter_batch_job).
+        
+        Args:
+            poll_interval (float): Seconds between job status checks
+            on_status (callable): Called with the job's Batch object on every check
+            
+        Returns:
+            list: List of result dictionaries with parameters and responses, in grid order
+        """
+        requests = (
+            dict(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                 product=product, stop_sequence=stop_sequence, n=n, **params)
+            for params in iter_param_grid(temperatures, max_tokens_values,
+                                          presence_penalties, frequency_penalties)
+        )
+        results = list(self.iter_batch_job(requests, poll_interval=poll_interval,
+                                           on_status=on_status))
+        results.sort(key=lambda result: result["index"])
+        return results
+    
+    def iter_batch_job(self, requests, poll_interval=DEFAULT_POLL_INTERVAL, on_status=None, skip=None):
+        """
+        Run requests through the OpenAI Batch API instead of live calls.
+        
+        The requests are written to a JSONL input file, uploaded and run as
+        one job per MAX_BATCH_REQUESTS requests. Jobs are polled every
+        poll_interval seconds and each job's output is streamed back into
+        result dictionaries once it finishes. Batch jobs cost half as much
+        and don't use the per-minute rate limits, but can take up to 24 hours.
+        Cached responses are served without being submitted, and new ones
+        are cached.
+        
+        Args:
+            requests (iterable): Keyword-argument dictionaries for generate_response
+            poll_interval (float): Seconds between job status checks
+            on_status (callable): Called with each job's Batch object every
+                time it is checked, e.g. to report progress
+            skip (collection): Indexes of requests not to submit (see iter_generate)
+                
+        Yields:
+            dict: Result dictionary for each request, in completion order;
+                results carry usage, cost and finish reason but no latency
+        """
+        jobs = []
+        requests = enumerate(requests)
+        if skip:
+            requests = ((index, request) for index, request in requests if index not in skip)
+        while True:
+            chunk = list(itertools.islice(requests, MAX_BATCH_REQUESTS))
+            if not chunk:
+                break
+                
+            submitted = {}
+            for index, kwargs in chunk:
+                request = build_request(**kwargs)
+                cache_key = None
+                if self.cache is not None and self.cache.is_cacheable(kwargs.get("temperature", 0.7)):
+                    cache_key = self.cache.make_key(request)
+                    cached = self.cache.get(cache_key)
+                    if cached is not None:
+                        call = start_call(kwargs.get("model"))
+                        call["cache_hit"] = True
+                        self._record(call)
+                        yield make_result(index, kwargs, cached, None, call_fields(call))
+                        continue
+                submitted[index] = (kwargs, request, cache_key)
+            
+            if submitted:
+                jobs.append([self._submit_batch_job(submitted), submitted])
+        
+        while jobs:
+            for job in list(jobs):
+                batch, submitted = job
+                job[0] = batch = self._call_with_retries(self.client.batches.retrieve, batch.id)
+                if on_status is not None:
+                    on_status(batch)
+                if batch.status in FINAL_STATUSES:
+                    jobs.remove(job)
+                    yield from self._batch_job_results(batch, submitted)
+                    
+            if jobs:
+                time.sleep(poll_interval)
+    
+    def _submit_batch_job(self, submitted):
+        """Upload the input file for the submitted requests and create their job."""
+        input_file, _ = write_batch_input(
+            (index, request) for index, (_, request, _) in submitted.items()
+        )
+        
+        def upload():
+            # Retries must send the whole file again
+            input_file.seek(0)
+            return self.client.files.create(file=("batch_input.jsonl", input_file), purpose="batch")
+        
+        with input_file:
+            uploaded = self._call_with_retries(upload)
+        return self._call_with_retries(
+            self.client.batches.create, input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+            completion_window=COMPLETION_WINDOW, metadata={"source": "prompt-playground"}
+        )
+    
+    def _batch_job_results(self, batch, submitted):
+        """Stream a finished job's output and error files back as results."""
+        from openai.types.chat import ChatCompletion
+        
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            with self.client.files.with_streaming_response.content(file_id) as response:
+                for line in response.iter_lines():
+                    if not line.strip():
+                        continue
+                    index, body, error = parse_batch_line(line)
+                    if index not in submitted:
+                        continue
+                        
+                    kwargs, _, cache_key = submitted.pop(index)
+                    call = start_call(kwargs.get("model"))
+                    content = None
+                    if error:
+                        call["error"] = True
+                    else:
+                        completion = ChatCompletion.model_validate(body)
+                        finish_call(call, completion.usage,
+                                    completion.choices[0].finish_reason if completion.choices else None)
+                        if call["cost"] is not None:
+                            call["cost"] *= BATCH_PRICE_FACTOR
+                        content = choice_contents(completion, kwargs.get("n", 1))
+                        if cache_key is not None:
+                            self.cache.put(cache_key, content)
+                    self._record(call)
+                    yield make_result(index, kwargs, content, error, call_fields(call))
+        
+        # Whatever the job didn't get to (expired, cancelled or failed)
+        failure = job_failure(batch)
+        for index, (kwargs, _, _) in sorted(submitted.items()):
+            call = start_call(kwargs.get("model"))
+            call["error"] = True
+            self._record(call)
+            yield make_result(index, kwargs, None, failure, call_fields(call))
+    
+    def _call_with_retries(self, function, *args, **kwargs):
+        """Call an API method, retrying rate limits and server errors per the retry policy."""
+        for attempt in itertools.count():
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                delay = self.retry_policy.delay_for(attempt, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+    
+    def _run_prefix_leader(self, request, queued_at=None, cancel=None):
+        """
+        Run a shared-prefix leader request, asking for its tokens as well.
+        
+        Returns:
+            tuple: (response_content, error_message, timing, token_ends), where
+                token_ends holds the cumulative UTF-8 byte offset at the end of
+                each generated token, or None if the tokens are unavailable
+        """
+        start = time.perf_counter()
+        call = start_call(request.get("model"), queued_at)
+        try:
+            api_request = build_request(**request)
+            api_request["logprobs"] = True
+            
+            # Cached leaders keep their token boundaries alongside the text
+            cache_key = None
+            if self.cache is not None and self.cache.is_cacheable(request.get("temperature", 0.7)):
+                cache_key = self.cache.make_key(api_request)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    call["cache_hit"] = True
+                    timing = {"latency": time.perf_counter() - start, **call_fields(call)}
+                    return cached["content"], None, timing, cached["token_ends"]
+            
+            response = self._create_completion(call, cancel=cancel, **api_request)
+            timing = {"latency": time.perf_counter() - start, **call_fields(call)}
+            
+            choice = response.choices[0]
+            content = choice.message.content
+            token_ends = None
+            if choice.logprobs is not None and choice.logprobs.content:
+                token_ends = list(itertools.accumulate(
+                    len(token.bytes) if token.bytes is not None else len(token.token.encode("utf-8"))
+                    for token in choice.logprobs.content
+                ))
+                # Only trust the token boundaries if they cover the text exactly
+                if token_ends[-1] != len(content.encode("utf-8")):
+                    token_ends = None
+            
+            if cache_key is not None and token_ends is not None:
+                self.cache.put(cache_key, {"content": content, "token_ends": token_ends})
+            return content, None, timing, token_ends
+            
+        except Exception as e:
+            call["error"] = True
+            return None, str(e), {"latency": time.perf_counter() - start, **call_fields(call)}, None
+            
+        finally:
+            self._record(call)
+    
+    @staticmethod
+    def _prefix_results(index, request, future, members, fallback):
+        """Yield a leader's result and the results derived from it."""
+        try:
+            response_content, error, timing, token_ends = future.result()
+        except Exception as e:
+            response_content, error, timing, token_ends = None, str(e), None, None
+            
+        yield make_result(index, request, response_content, error, timing)
+        
+        # Without usable tokens, the followers are sent as ordinary requests
+        if error or token_ends is None:
+            fallback.extend(members)
+            return
+        
+        for member_index, member in members:
+            truncated = truncate_to_tokens(response_content, token_ends, member.get("max_tokens", 150))
+            result = make_result(member_index, member, truncated, None)
+            result["derived_from"] = {"index": index, "max_tokens": request.get("max_tokens", 150)}
+            yield result
+    
+    def _run_request(self, index, request, on_delta=None, queued_at=None, cancel=None):
+        """
+        Run one batch request on a worker thread.
+        
+        Returns:
+            tuple: (response_content, error_message, timing), where timing
+                also carries the call's metrics (see call_fields)
+        """
+        if on_delta is None:
+            start = time.perf_counter()
+            response_content, error, call = self._generate(queued_at=queued_at, cancel=cancel, **request)
+            return response_content, error, {"latency": time.perf_counter() - start, **call_fields(call)}
+        
+        stream = self._stream_response(queued_at=queued_at, cancel=cancel, **request)
+        for delta in stream:
+            on_delta(index, request, delta)
+        return stream.content, stream.error, stream.timing()
+
+
+class AsyncOpenAIWrapper:
+    """
+    An asyncio counterpart of OpenAIWrapper built on AsyncOpenAI.
+    
+    Many requests can be in flight on one event loop instead of one OS thread
+    each. An instance owns its own AsyncOpenAI client, so create and use it
+    from a single event loop (see EventLoopThread for driving it from
+    synchronous code such as the Tk UI).
+    """
+    
+    def __init__(self, cache=None, rate_limiter=None, retry_policy=None, metrics=None,
+                 base_url=None, api_key=None, pool=None):
+        """
+        Initialize the asynchronous OpenAI wrapper.
+        
+        Args:
+            cache (ResponseCache): Optional cache consulted before calling the API
+            rate_limiter (RateLimiter): Optional limiter shared by all callers
+                of the same account, including synchronous wrappers
+            retry_policy (RetryPolicy): Retry behaviour for rate limits and
+                server errors (defaults to RetryPolicy())
+            metrics (MetricsRegistry): Optional registry every call is recorded in
+            base_url (str): Send requests to this OpenAI-compatible endpoint
+            api_key (str): API key for base_url (defaults to OPENAI_API_KEY)
+            pool (ConnectionPool): Pool whose limits, timeouts and stats the
+                wrapper's own async connections use (defaults to get_pool())
+        """
+        from openai import AsyncOpenAI
+        load_env()
+        
+        # Verify API key is set
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OpenAI API key is not set. Please check your .env file.")
+        
+        self.pool = pool if pool is not None else get_pool()
+        self._pool_generation = self.pool.generation
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                  http_client=self.pool.create_async_client())
+        
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics
+    
+    async def agenerate_response(self, model, system_prompt, user_prompt, product,
+                                 temperature=0.7, max_tokens=150, presence_penalty=0.0,
+                                 frequency_penalty=0.0, stop_sequence=None, n=1):
+        """
+        Generate a response from the OpenAI API without blocking the event loop.
         
+        Takes the same arguments and returns the same (response_content,
+        error_message) tuple as OpenAIWrapper.generate_response.
+        """
+        response_content, error, _ = await self._agenerate(
+            model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+            product=product, temperature=temperature, max_tokens=max_tokens,
+            presence_penalty=presence_penalty, frequency_penalty=frequency_penalty,
+            stop_sequence=stop_sequence, n=n
+        )
+        return response_content, error
+    
+    async def astream_response(self, model, system_prompt, user_prompt, product,
+                               temperature=0.7, max_tokens=150, presence_penalty=0.0,
+                               frequency_penalty=0.0, stop_sequence=None, on_delta=None):
+        """
+        Stream a single response from the OpenAI API without blocking the event loop.
+        
+        Unlike a ResponseStream, which only notices a cancel event between
+        chunks, cancelling the task running this coroutine (e.g. through the
+        Future returned by EventLoopThread.submit) drops the connection at
+        once, even while the request is still waiting for its first token.
+        A cancelled call is not recorded in the metrics.
+        
+        Args:
+            on_delta (callable): Called with each piece of text as it arrives
+                (a cache hit arrives as a single piece)
+            Other arguments are those of agenerate_response.
+            
+        Returns:
+            tuple: (response_content, error_message, metrics), where metrics
+                holds the call's latency, time to first token and the fields
+                of call_fields
+        """
+        kwargs = dict(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                      product=product, temperature=temperature, max_tokens=max_tokens,
+                      presence_penalty=presence_penalty, frequency_penalty=frequency_penalty,
+                      stop_sequence=stop_sequence)
+        start = time.perf_counter()
+        call = start_call(model)
+        cancelled = False
+        try:
+            request = build_request(**kwargs)
+            
+            cache_key = None
+            if self.cache is not None and self.cache.is_cacheable(temperature):
+                cache_key = self.cache.make_key(request)
+                content = self.cache.get(cache_key)
+                if content is not None:
+                    call["cache_hit"] = True
+                    if on_delta is not None:
+                        on_delta(content)
+                    return content, None, self._stream_metrics(call, start)
+            
+            content = await self._astream_completion(call, request, start, on_delta)
+            if cache_key is not None:
+                self.cache.put(cache_key, content)
+            return content, None, self._stream_metrics(call, start)
+            
+        except asyncio.CancelledError:
+            # Abandoned rather than failed (e.g. a superseded preview), so
+            # it is left out of the metrics
+            cancelled = True
+            raise
+            
+        except Exception as e:
+            call["error"] = True
+            return None, str(e), self._stream_metrics(call, start)
+            
+        finally:
+            if self.metrics is not None and not cancelled:
+                self.metrics.record(call)
+    
+    async def _astream_completion(self, call, request, start, on_delta=None):
+        """Send a streaming request (retrying until the first chunk arrives) and return its text."""
+        estimated_tokens = estimate_tokens(request)
+        
+        for attempt in itertools.count():
+            if self.rate_limiter is not None:
+                waited = time.perf_counter()
+                await self.rate_limiter.aacquire(estimated_tokens)
+                call["queue_wait"] += time.perf_counter() - waited
+                
+            sent = time.perf_counter()
+            try:
+                # The final chunk carries the token usage
+                stream = await self.client.chat.completions.create(
+                    stream=True, stream_options={"include_usage": True}, **request)
+            except Exception as e:
+                delay = self.retry_policy.delay_for(attempt, e)
+                if delay is None:
+                    raise
+                    
+                if self.rate_limiter is not None and RetryPolicy.is_rate_limit(e):
+                    self.rate_limiter.pause(delay)
+                call["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            break
+        
+        call["time_to_first_byte"] = time.perf_counter() - sent
+        parts = []
+        usage = finish_reason = None
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                for choice in chunk.choices:
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+                    if not choice.delta.content:
+                        continue
+                    if call["time_to_first_token"] is None:
+                        call["time_to_first_token"] = time.perf_counter() - start
+                    parts.append(choice.delta.content)
+                    if on_delta is not None:
+                        on_delta(choice.delta.content)
+        finally:
+            # Closing early (cancelled or failed) drops the connection
+            # instead of reading the rest
+            await stream.close()
+            call["latency"] = time.perf_counter() - sent
+        
+        if self.rate_limiter is not None and usage is not None:
+            self.rate_limiter.refund(estimated_tokens - usage.total_tokens)
+        finish_call(call, usage, finish_reason)
+        return "".join(parts)
+    
+    @staticmethod
+    def _stream_metrics(call, start):
+        """Report a streamed call's total latency, time to first token and call_fields."""
+        metrics = {"latency": time.perf_counter() - start}
+        if call["time_to_first_token"] is not None:
+            metrics["time_to_first_token"] = call["time_to_first_token"]
+        metrics.update(call_fields(call))
+        return metrics
+    
+    async def _agenerate(self, **kwargs):
+        """Asynchronous counterpart of OpenAIWrapper._generate."""
+        call = start_call(kwargs.get("model"))
+        try:
+            request = build_request(**kwargs)
+            
+            cache_key = None
+            if self.cache is not None and self.cache.is_cacheable(kwargs.get("temperature", 0.7)):
+                cache_key = self.cache.make_key(request)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    call["cache_hit"] = True
+                    return cached, None, call
+            
+            response = await self._acreate_completion(call, **request)
+            
+            content = choice_contents(response, kwargs.get("n", 1))
+            if cache_key is not None:
+                self.cache.put(cache_key, content)
+            return content, None, call
+            
+        except Exception as e:
+            # Return error message
+            call["error"] = True
+            return None, str(e), call
+            
+        finally:
+            if self.metrics is not None:
+                self.metrics.record(call)
+    
+    async def _acreate_completion(self, call, **request):
+        """Asynchronous counterpart of OpenAIWrapper._create_completion."""
+        estimated_tokens = estimate_tokens(request)
+        
+        for attempt in itertools.count():
+            if self.rate_limiter is not None:
+                waited = time.perf_counter()
+                await self.rate_limiter.aacquire(estimated_tokens)
+                call["queue_wait"] += time.perf_counter() - waited
+                
+            sent = time.perf_counter()
+            try:
+                async with self.client.chat.completions.with_streaming_response.create(**request) as raw:
+                    call["time_to_first_byte"] = time.perf_counter() - sent
+                    response = await raw.parse()
+                call["latency"] = time.perf_counter() - sent
+            except Exception as e:
+                delay = self.retry_policy.delay_for(attempt, e)
+                if delay is None:
+                    raise
+                    
+                if self.rate_limiter is not None and RetryPolicy.is_rate_limit(e):
+                    self.rate_limiter.pause(delay)
+                call["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            
+            usage = getattr(response, "usage", None)
+            if self.rate_limiter is not None and usage is not None:
+                self.rate_limiter.refund(estimated_tokens - usage.total_tokens)
+            finish_call(call, usage, response.choices[0].finish_reason if response.choices else None)
+            return response
+    
+    async def abatch_generate(self, model, system_prompt, user_prompt, product,
+                              temperatures, max_tokens_values, presence_penalties,
+                              frequency_penalties, stop_sequence=None, n=1,
+                              max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        Generate responses for multiple parameter combinations concurrently.
+        
+        Takes the same arguments as OpenAIWrapper.batch_generate, with
+        max_concurrency bounding the number of requests in flight.
+        
+        Returns:
+            list: List of result dictionaries with parameters and responses, in grid order
+        """
+        results = [result async for result in self.aiter_batch_generate(
+            model, system_prompt, user_prompt, product,
+            temperatures, max_tokens_values, presence_penalties,
+            frequency_penalties, stop_sequence=stop_sequence, n=n,
+            max_concurrency=max_concurrency
+        )]
+        
+        # Restore grid order (results arrive in completion order)
+        results.sort(key=lambda result: result["index"])
         return results
+    
+    async def aiter_batch_generate(self, model, system_prompt, user_prompt, product,
+                                   temperatures, max_tokens_values, presence_penalties,
+                                   frequency_penalties, stop_sequence=None, n=1,
+                                   max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        Async iterator over batch results, yielding each one as it completes.
+        
+        Yields:
+            dict: Result dictionary with the cell's grid "index", its parameters
+                and either a "response" or an "error"
+        """
+        requests = (
+            dict(model=model, system_prompt=system_prompt, user_prompt=user_prompt,
+                 product=product, stop_sequence=stop_sequence, n=n, **params)
+            for params in iter_param_grid(temperatures, max_tokens_values,
+                                          presence_penalties, frequency_penalties)
+        )
+        async for result in self.aiter_generate(requests, max_concurrency=max_concurrency):
+            yield result
+    
+    async def aiter_generate(self, requests, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        Fan requests out over the event loop, limited by a semaphore.
+        
+        A task is only created once the semaphore admits it, so large (or
+        lazily generated) request streams use memory proportional to
+        max_concurrency rather than to the number of requests.
+        
+        Args:
+            requests (iterable): Keyword-argument dictionaries for agenerate_response
+            max_concurrency (int): Maximum number of requests in flight
+            
+        Yields:
+            dict: Result dictionary for each request, in completion order
+        """
+        max_concurrency = max(1, int(max_concurrency))
+        
+        # Connections are sized to the fan-out, as for the thread pool
+        self.pool.ensure_capacity(max_concurrency)
+        if self._pool_generation != self.pool.generation:
+            self.client = self.client.with_options(http_client=self.pool.create_async_client())
+            self._pool_generation = self.pool.generation
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        pending = set()
+        
+        async def run(index, request):
+            start = time.perf_counter()
+            try:
+                response_content, error, call = await self._agenerate(**request)
+            finally:
+                semaphore.release()
+            timing = {"latency": time.perf_counter() - start, **call_fields(call)}
+            return make_result(index, request, response_content, error, timing)
+        
+        try:
+            for index, request in enumerate(requests):
+                await semaphore.acquire()
+                pending.add(asyncio.ensure_future(run(index, request)))
+                
+                # Hand back anything that finished while we were waiting
+                for task in [task for task in pending if task.done()]:
+                    pending.discard(task)
+                    yield task.result()
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # Abandoned iteration cancels whatever is still running
+            for task in pending:
+                task.cancel()
+
+
+class EventLoopThread:
+    """
+    An asyncio event loop running in a background daemon thread.
+    
+    Lets synchronous code, such as Tk callbacks, drive AsyncOpenAIWrapper:
+    submit coroutines with submit() and receive concurrent.futures.Future
+    objects that can be waited on or cancelled from any thread.
+    """
+    
+    def __init__(self):
+        """Start the event loop thread."""
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+    
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the background loop.
+        
+        Args:
+            coro (coroutine): The coroutine to run
+            
+        Returns:
+            concurrent.futures.Future: Future for the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def stop(self):
+        """Stop the event loop and wait for its thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
@@ -0,0 +1,286 @@
+"""
+Vectorised analytics over batch outputs.
+
+OutputAnalytics keeps one row of features per output, filled in as results
+arrive, and computes metrics for every output at once with NumPy:
+
+    words        Word count
+    tokens       Completion tokens (from the API's usage when known, else
+                 estimated at ~4 characters per token)
+    diversity    Lexical diversity: distinct words / words
+    repetition   Share of word bigrams that repeat an earlier bigram
+    similarity   Mean cosine similarity of the output's word counts to every
+                 other output (high = generic, low = stands out)
+    overlap      Mean share of the output's distinct bigrams that also occur
+                 in each other output
+
+Words are hashed with a stable 64-bit hash, bigrams are hashed from the
+full hashes of their two words, and both are folded into a sparse space of
+HASH_DIMENSIONS features. Collisions are rare at that width: hashing
+unrelated outputs yields an overlap and similarity close to 0. Features are
+built for all new outputs at once and running column sums are kept, so the
+cross-output metrics cost one pass over the features instead of comparing
+every pair. Full pairwise matrices are available for a selection of outputs.
+"""
+import functools
+import hashlib
+import re
+
+import numpy as np
+
+# Number of hashed word and bigram features; wide enough that collisions
+# between unrelated words or bigrams are negligible
+HASH_DIMENSIONS = 1 << 20
+
+# Odd 64-bit constant mixing the first word's hash into a bigram's
+BIGRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# Rows allocated up front; storage doubles whenever it fills up
+INITIAL_CAPACITY = 256
+
+# Metrics reported for every output, in display order
+METRICS = ("words", "tokens", "diversity", "repetition", "similarity", "overlap")
+
+WORD_PATTERN = re.compile(r"\w+(?:'\w+)?")
+
+
+def tokenize(text):
+    """Split text into lower-case words."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def word_hash(word):
+    """Stable 64-bit hash of a word (the built-in hash() changes between runs)."""
+    return int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+
+
+def _distinct(keys):
+    """Sorted distinct keys and how often each occurs (faster than np.unique here)."""
+    keys = np.sort(keys)
+    starts = np.flatnonzero(np.concatenate((keys[:1] == keys[:1], keys[1:] != keys[:-1])))
+    return keys[starts], np.diff(np.append(starts, len(keys)))
+
+
+def _split_by_owner(owners, features, values, count):
+    """Split features sorted by owner into one array per owner."""
+    bounds = np.searchsorted(owners, np.arange(1, count))
+    return np.split(features, bounds), np.split(values, bounds)
+
+
+class OutputAnalytics:
+    """
+    Incrementally computed metrics for a set of outputs.
+
+    Outputs are identified by their result index; adding an index again
+    replaces its output. Adding only tokenizes the text; the features of
+    everything added since the last metrics() call are built together.
+    Not thread-safe: the playground only touches it from the UI thread.
+    """
+
+    def __init__(self, dimensions=HASH_DIMENSIONS):
+        """
+        Args:
+            dimensions (int): Number of hashed word and bigram features
+        """
+        self.dimensions = dimensions
+        self.indices = []
+        self.rows = {}
+
+        # Per row: words, tokens, distinct words, repeated bigram share
+        self._counts = np.zeros((INITIAL_CAPACITY, 4))
+        # Per row: sorted word features with their L2-normalised counts,
+        # and sorted distinct bigram features
+        self._words = []
+        self._weights = []
+        self._bigrams = []
+        # Column sums over all rows
+        self._word_totals = np.zeros(dimensions)
+        self._bigram_counts = np.zeros(dimensions, dtype=np.int32)
+        self._pending = {}
+        self._metrics = None
+
+    def __len__(self):
+        return len(self.indices)
+
+    def _grow(self):
+        counts = np.zeros((len(self._counts) * 2, 4))
+        counts[:len(self._counts)] = self._counts
+        self._counts = counts
+
+    def add(self, index, text, tokens=None):
+        """
+        Add (or replace) the output of one result.
+
+        Args:
+            index (int): The result's index
+            text (str): The generated text
+            tokens (int): Completion tokens, if known
+        """
+        words = tokenize(text)
+        repeated = 1.0 - len(set(zip(words, words[1:]))) / (len(words) - 1) if len(words) > 1 else 0.0
+
+        row = self.rows.get(index)
+        if row is None:
+            if len(self.indices) == len(self._counts):
+                self._grow()
+            row = self.rows[index] = len(self.indices)
+            self.indices.append(index)
+            self._words.append(np.zeros(0, dtype=np.int64))
+            self._weights.append(np.zeros(0))
+            self._bigrams.append(np.zeros(0, dtype=np.int64))
+
+        self._counts[row] = (len(words), tokens if tokens is not None else len(text) / 4,
+                             len(set(words)), repeated)
+        self._pending[row] = np.fromiter(map(word_hash, words), dtype=np.uint64, count=len(words))
+        self._metrics = None
+
+    def add_result(self, result):
+        """Add a result dictionary's main response (failed results are skipped)."""
+        if "error" in result or result.get("response") is None:
+            return
+        usage = result.get("usage") or {}
+        # Usage covers every sample, so it only measures the main response on its own
+        tokens = usage.get("completion_tokens") if not result.get("responses") else None
+        self.add(result["index"], result["response"], tokens)
+
+    def _flush(self):
+        """Build the word and bigram features of every output added since the last call."""
+        if not self._pending:
+            return
+        rows = list(self._pending.keys())
+        lengths = np.fromiter(map(len, self._pending.values()), dtype=np.int64, count=len(rows))
+        hashes = np.concatenate(list(self._pending.values()))
+        owners = np.repeat(np.arange(len(rows)), lengths)
+        self._pending = {}
+        dimensions = np.uint64(self.dimensions)
+
+        # Replaced outputs leave the column sums before their new features enter
+        for row in rows:
+            self._word_totals[self._words[row]] -= self._weights[row]
+            self._bigram_counts[self._bigrams[row]] -= 1
+
+        # Word counts of all pending outputs in one pass, then L2-normalised
+        keys, counts = _distinct(owners * self.dimensions + (hashes % dimensions).astype(np.int64))
+        key_owners = keys // self.dimensions
+        norms = np.sqrt(np.bincount(key_owners, counts.astype(float) ** 2, minlength=len(rows)))
+        weights = counts / norms[key_owners]
+        words, weights = _split_by_owner(key_owners, keys % self.dimensions, weights, len(rows))
+
+        # Bigrams are adjacent words of the same output, hashed from both full hashes
+        same_output = owners[:-1] == owners[1:]
+        bigram_hashes = (hashes[:-1] * BIGRAM_MULTIPLIER + hashes[1:]) % dimensions
+        keys, _ = _distinct(owners[:-1][same_output] * self.dimensions
+                            + bigram_hashes[same_output].astype(np.int64))
+        key_owners = keys // self.dimensions
+        bigrams, _ = _split_by_owner(key_owners, keys % self.dimensions, key_owners, len(rows))
+
+        for row, row_words, row_weights, row_bigrams in zip(rows, words, weights, bigrams):
+            self._words[row] = row_words
+            self._weights[row] = row_weights
+            self._bigrams[row] = row_bigrams
+            self._word_totals[row_words] += row_weights
+            self._bigram_counts[row_bigrams] += 1
+
+    def metrics(self):
+        """
+        Compute every metric for every output.
+
+        Returns:
+            dict: Metric name (see METRICS) -> array aligned with self.indices
+        """
+        if self._metrics is not None:
+            return self._metrics
+        self._flush()
+
+        count = len(self.indices)
+        counts = self._counts[:count]
+        words = counts[:, 0]
+        others = max(1, count - 1)
+
+        # Each output against the column sums of all outputs, minus itself
+        owners = np.repeat(np.arange(count), [len(row) for row in self._words])
+        features = np.concatenate(self._words) if count else np.zeros(0, dtype=np.int64)
+        weights = np.concatenate(self._weights) if count else np.zeros(0)
+        similarity = (np.bincount(owners, weights * self._word_totals[features], minlength=count)
+                      - np.bincount(owners, weights ** 2, minlength=count)) / others
+
+        present = np.array([len(row) for row in self._bigrams], dtype=float)
+        owners = np.repeat(np.arange(count), present.astype(np.int64))
+        features = np.concatenate(self._bigrams) if count else np.zeros(0, dtype=np.int64)
+        shared = np.bincount(owners, self._bigram_counts[features], minlength=count) - present
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._metrics = {
+                "words": words,
+                "tokens": counts[:, 1],
+                "diversity": np.where(words > 0, counts[:, 2] / words, 0.0),
+                "repetition": counts[:, 3],
+                "similarity": similarity if count > 1 else np.zeros(count),
+                "overlap": np.where(present > 0, shared / (present * others), 0.0) if count > 1 else np.zeros(count)
+            }
+        return self._metrics
+
+    def metrics_for(self, index):
+        """Return one output's metrics as a dict, or None if it isn't tracked."""
+        row = self.rows.get(index)
+        if row is None:
+            return None
+        return {name: float(values[row]) for name, values in self.metrics().items()}
+
+    def _dense(self, indices, features, values=None):
+        """Dense matrix of the selected rows over the features they use."""
+        self._flush()
+        rows = range(len(self.indices)) if indices is None else [self.rows[index] for index in indices]
+        selected = [features[row] for row in rows]
+        columns, inverse = np.unique(np.concatenate(selected) if selected else np.zeros(0, dtype=np.int64),
+                                     return_inverse=True)
+        matrix = np.zeros((len(selected), len(columns)))
+        owners = np.repeat(np.arange(len(selected)), [len(row) for row in selected])
+        matrix[owners, inverse] = np.concatenate([values[row] for row in rows]) if values and selected else 1.0
+        return matrix
+
+    def similarity_matrix(self, indices=None):
+        """
+        Pairwise cosine similarity of outputs' word counts.
+
+        This is quadratic in the number of outputs, so pass the indices of
+        a selection for large sweeps.
+
+        Args:
+            indices (list): Result indexes to compare (default: all)
+
+        Returns:
+            numpy.ndarray: Square matrix in the order of indices
+        """
+        vectors = self._dense(indices, self._words, self._weights)
+        return vectors @ vectors.T
+
+    def overlap_matrix(self, indices=None):
+        """
+        Pairwise bigram overlap: entry (i, j) is the share of output i's
+        distinct bigrams that also occur in output j (see similarity_matrix).
+        """
+        bigrams = self._dense(indices, self._bigrams)
+        present = bigrams.sum(axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(present > 0, (bigrams @ bigrams.T) / present, 0.0)
+
+    def sort_indices(self, metric, indices, descending=False):
+        """
+        Order result indexes by a metric; indexes without metrics go last.
+
+        Args:
+            metric (str): One of METRICS
+            indices (list): Result indexes to order
+            descending (bool): Largest first
+
+        Returns:
+            list: The indexes in sorted order
+        """
+        values = self.metrics()[metric]
+        tracked = [index for index in indices if index in self.rows]
+        untracked = [index for index in indices if index not in self.rows]
+        keys = values[[self.rows[index] for index in tracked]] if tracked else np.zeros(0)
+        order = np.argsort(-keys if descending else keys, kind="stable")
+        return [tracked[i] for i in order] + untracked
@@ -0,0 +1,384 @@
+"""
+Adaptive parameter search.
+
+A full grid sweep pays for every combination of temperature, max_tokens and
+penalties. ParameterSearch instead spends a fixed budget of completions and
+steers it towards the parameters a scorer rates highest:
+
+    random   Random configurations from the search space
+    halving  Successive halving: many configurations get one sample each,
+             then the best third get three times the samples, and so on
+    tpe      Bayesian-style search (a tree-structured Parzen estimator):
+             after a few random configurations, new ones are drawn near the
+             best so far and away from the rest
+
+A scorer rates a single output text from 0 (worst) to 1 (best); see
+length_scorer, keyword_scorer and load_scorer. A configuration's score is
+the mean over its samples and the prompts it is tried on.
+"""
+import math
+import random
+import importlib
+
+from openai_wrapper import DEFAULT_MAX_WORKERS
+
+SEARCH_STRATEGIES = ("random", "halving", "tpe")
+
+# Default search space: (low, high) ranges for continuous parameters, lists
+# of choices for discrete ones
+DEFAULT_SPACE = {
+    "temperature": (0.0, 1.5),
+    "max_tokens": [50, 150, 300],
+    "presence_penalty": (0.0, 2.0),
+    "frequency_penalty": (0.0, 2.0),
+}
+
+# Continuous parameters are searched on this grid, so repeated configurations
+# hit the response cache and the values read like the grid sweep's
+PARAMETER_STEP = 0.1
+
+# Successive halving keeps the best 1/HALVING_ETA of the configurations at each
+# rung and gives the survivors HALVING_ETA times as many samples
+HALVING_ETA = 3
+
+# TPE: fraction of the observations counted as good, candidates drawn per
+# proposal, and share of the budget spent on random configurations first
+TPE_GAMMA = 0.25
+TPE_CANDIDATES = 24
+TPE_STARTUP_FRACTION = 0.3
+
+
+def length_scorer(target_words):
+    """Score outputs by how close their word count is to target_words."""
+    def score(text):
+        words = len(text.split())
+        return max(0.0, 1.0 - abs(words - target_words) / target_words)
+    return score
+
+
+def keyword_scorer(keywords):
+    """Score outputs by the fraction of the keywords they mention (case-insensitive)."""
+    keywords = [keyword.lower() for keyword in keywords]
+
+    def score(text):
+        text = text.lower()
+        return sum(keyword in text for keyword in keywords) / len(keywords)
+    return score
+
+
+def load_scorer(spec):
+    """
+    Build a scorer from a short description.
+
+    Args:
+        spec (str): "length:<words>", "keywords:<word>,<word>,..." or
+            "<module>:<function>" for a custom function that takes an
+            output text and returns a score from 0 to 1
+
+    Returns:
+        callable: Takes an output text and returns its score
+    """
+    kind, _, value = spec.partition(":")
+    if not value:
+        raise ValueError(f"Invalid scorer '{spec}'")
+    if kind == "length":
+        if int(value) <= 0:
+            raise ValueError(f"Invalid scorer '{spec}': the target length must be positive")
+        return length_scorer(int(value))
+    if kind == "keywords":
+        keywords = [keyword.strip() for keyword in value.split(",") if keyword.strip()]
+        if not keywords:
+            raise ValueError(f"Invalid scorer '{spec}': no keywords given")
+        return keyword_scorer(keywords)
+    return getattr(importlib.import_module(kind), value)
+
+
+def make_space(temperatures, max_tokens_values, presence_penalties, frequency_penalties):
+    """
+    Build a search space that covers the values of a grid sweep.
+
+    Continuous parameters range between the smallest and largest value given
+    (a single value stays fixed); max_tokens chooses between the values given.
+    """
+    space = {}
+    for name, values in (("temperature", temperatures), ("presence_penalty", presence_penalties),
+                         ("frequency_penalty", frequency_penalties)):
+        space[name] = (min(values), max(values)) if len(set(values)) > 1 else [values[0]]
+    space["max_tokens"] = sorted(set(max_tokens_values))
+    return space
+
+
+def _snap(value, low, high):
+    """Round a continuous value to the search grid, inside [low, high]."""
+    return round(min(high, max(low, round(value / PARAMETER_STEP) * PARAMETER_STEP)), 6)
+
+
+def sample_config(space, rng):
+    """Draw a random configuration from the search space."""
+    config = {}
+    for name, domain in space.items():
+        if isinstance(domain, tuple):
+            config[name] = _snap(rng.uniform(*domain), *domain)
+        else:
+            config[name] = rng.choice(domain)
+    return config
+
+
+def config_key(config):
+    """Return a hashable key identifying a configuration."""
+    return tuple(sorted(config.items()))
+
+
+def score_result(scorer, result):
+    """
+    Score one result: the mean score of its samples.
+
+    A failed or cancelled request says nothing about its parameters, so it
+    isn't scored.
+
+    Returns:
+        tuple: (score, number of samples), or (None, 0) if the request failed
+    """
+    if "error" in result:
+        return None, 0
+    texts = result.get("responses") or [result["response"]]
+    return sum(scorer(text) for text in texts) / len(texts), len(texts)
+
+
+class ParameterSearch:
+    """
+    Search generation parameters for the best-scoring outputs.
+
+    Every configuration is tried on each of the given prompts, through the
+    wrapper's iter_generate (so requests run concurrently and go through the
+    response cache, rate limiter and metrics as usual). The budget counts
+    completions: one request with n samples uses n.
+    """
+
+    def __init__(self, wrapper, prompts, scorer, space=None, strategy="tpe", budget=60,
+                 max_workers=DEFAULT_MAX_WORKERS, seed=None, cancel=None):
+        """
+        Args:
+            wrapper (OpenAIWrapper): Wrapper used to call the API
+            prompts (list): Dictionaries with the model, system_prompt,
+                user_prompt and product (and optionally stop_sequence) to
+                try every configuration on
+            scorer (callable): Takes an output text and returns a score from
+                0 (worst) to 1 (best)
+            space (dict): Parameter name -> (low, high) range or list of
+                choices (defaults to DEFAULT_SPACE)
+            strategy (str): One of SEARCH_STRATEGIES
+            budget (int): Maximum number of completions to generate
+            max_workers (int): Maximum number of API calls running at once
+            seed (int): Seed for the search's random choices
+            cancel (threading.Event): Stops the search early when set
+        """
+        if strategy not in SEARCH_STRATEGIES:
+            raise ValueError(f"Unknown search strategy '{strategy}'")
+        if budget < len(prompts):
+            raise ValueError(f"A budget of {budget} can't try even one configuration on {len(prompts)} prompts")
+
+        self.wrapper = wrapper
+        self.prompts = list(prompts)
+        self.scorer = scorer
+        self.space = space or DEFAULT_SPACE
+        self.strategy = strategy
+        self.budget = budget
+        self.max_workers = max_workers
+        self.cancel = cancel
+        self.rng = random.Random(seed)
+
+        # Completions and requests spent so far
+        self.used = 0
+        self.requests_sent = 0
+        # Configuration key -> [config, total score, samples scored]
+        self._scores = {}
+
+    def best(self):
+        """
+        Return the best configuration found so far.
+
+        Returns:
+            tuple: (config, mean score), or (None, None) before any results
+        """
+        if not self._scores:
+            return None, None
+        config, total, samples = max(self._scores.values(), key=lambda entry: entry[1] / entry[2])
+        return config, total / samples
+
+    def ranking(self):
+        """Return every configuration tried as (config, mean score, samples), best first."""
+        entries = [(config, total / samples, samples) for config, total, samples in self._scores.values()]
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)
+
+    def _cancelled(self):
+        return self.cancel is not None and self.cancel.is_set()
+
+    def _evaluate(self, configs, samples=1):
+        """
+        Try each configuration on every prompt and record the scores.
+
+        Yields:
+            dict: Result dictionary for each request, with its "score"
+                unless it failed
+        """
+        requests = [dict(prompt, n=samples, **config) for config in configs for prompt in self.prompts]
+        offset = self.requests_sent
+        self.requests_sent += len(requests)
+        self.used += len(requests) * samples
+
+        for result in self.wrapper.iter_generate(requests, max_workers=self.max_workers, cancel=self.cancel):
+            request = requests[result["index"]]
+            config = {name: request[name] for name in self.space}
+            score, scored = score_result(self.scorer, result)
+            if score is not None:
+                entry = self._scores.setdefault(config_key(config), [config, 0.0, 0])
+                entry[1] += score * scored
+                entry[2] += scored
+                result["score"] = score
+
+            result["index"] += offset
+            yield result
+
+    def _configs_affordable(self, samples=1):
+        """Number of new configurations the remaining budget can try."""
+        return (self.budget - self.used) // (len(self.prompts) * samples)
+
+    def _distinct_configs(self, count, propose):
+        """Draw up to count configurations not tried yet (fewer if the space runs out)."""
+        configs = {}
+        for _ in range(count * 20):
+            if len(configs) == count:
+                break
+            config = propose()
+            key = config_key(config)
+            if key not in self._scores and key not in configs:
+                configs[key] = config
+        return list(configs.values())
+
+    def iter_results(self):
+        """
+        Run the search.
+
+        Yields:
+            dict: Result dictionary for each request as it completes, with
+                its "score" unless it failed; "index" counts requests across
+                the whole search
+        """
+        if self.strategy == "random":
+            return self._random_search()
+        if self.strategy == "halving":
+            return self._successive_halving()
+        return self._tpe_search()
+
+    def _random_search(self):
+        configs = self._distinct_configs(self._configs_affordable(),
+                                         lambda: sample_config(self.space, self.rng))
+        yield from self._evaluate(configs)
+
+    def _halving_cost(self, configs):
+        """Completions a successive halving run starting from configs configurations uses."""
+        cost = 0
+        samples = 1
+        previous = 0
+        while True:
+            cost += configs * (samples - previous) * len(self.prompts)
+            if configs <= 1:
+                return cost
+            configs, previous, samples = max(1, configs // HALVING_ETA), samples, samples * HALVING_ETA
+
+    def _successive_halving(self):
+        # Start with as many configurations as the budget allows for every rung
+        configs = max(1, self._configs_affordable())
+        while configs > 1 and self._halving_cost(configs) > self.budget:
+            configs -= 1
+
+        survivors = self._distinct_configs(configs, lambda: sample_config(self.space, self.rng))
+        samples = 1
+        previous = 0
+        while survivors and not self._cancelled():
+            # Survivors only need the samples they don't have yet
+            yield from self._evaluate(survivors, samples - previous)
+            if len(survivors) <= 1:
+                return
+
+            ranked = sorted(survivors, key=lambda config: self._mean_score(config), reverse=True)
+            survivors = ranked[:max(1, len(survivors) // HALVING_ETA)]
+            previous, samples = samples, samples * HALVING_ETA
+            if self._configs_affordable(samples - previous) < len(survivors):
+                return
+
+    def _mean_score(self, config):
+        # A configuration whose requests all failed ranks below every scored one
+        entry = self._scores.get(config_key(config))
+        if entry is None:
+            return -1.0
+        _, total, samples = entry
+        return total / samples
+
+    def _tpe_search(self):
+        total = self._configs_affordable()
+        startup = max(2, math.ceil(total * TPE_STARTUP_FRACTION))
+        yield from self._evaluate(self._distinct_configs(min(startup, total),
+                                                         lambda: sample_config(self.space, self.rng)))
+
+        # Propose a round of configurations at a time, so requests still run concurrently
+        round_size = max(1, self.max_workers // len(self.prompts))
+        while not self._cancelled():
+            count = min(round_size, self._configs_affordable())
+            if count <= 0:
+                return
+            configs = self._distinct_configs(count, self._tpe_propose)
+            if not configs:
+                return
+            yield from self._evaluate(configs)
+
+    def _tpe_propose(self):
+        """Draw candidates near the good configurations and keep the one most likely to be good."""
+        ranked = [config for config, _, _ in self.ranking()]
+        if not ranked:
+            # Nothing scored yet (every request failed): keep exploring
+            return sample_config(self.space, self.rng)
+        split = max(1, int(math.ceil(len(ranked) * TPE_GAMMA)))
+        good, bad = ranked[:split], ranked[split:]
+
+        best = None
+        best_ratio = -1.0
+        for _ in range(TPE_CANDIDATES):
+            candidate = self._perturb(self.rng.choice(good), len(good))
+            ratio = self._density(candidate, good) / self._density(candidate, bad)
+            if ratio > best_ratio:
+                best, best_ratio = candidate, ratio
+        return best
+
+    def _bandwidth(self, low, high, count):
+        return max(PARAMETER_STEP, (high - low) / math.sqrt(count + 1))
+
+    def _perturb(self, config, count):
+        """Draw a configuration from the kernel centred on config."""
+        candidate = {}
+        for name, domain in self.space.items():
+            if isinstance(domain, tuple):
+                value = self.rng.gauss(config[name], self._bandwidth(*domain, count))
+                candidate[name] = _snap(value, *domain)
+            elif self.rng.random() < 0.75:
+                candidate[name] = config[name]
+            else:
+                candidate[name] = self.rng.choice(domain)
+        return candidate
+
+    def _density(self, candidate, configs):
+        """Parzen estimate of how likely candidate is under configs, mixed with a uniform prior."""
+        total = 1.0
+        for config in configs:
+            likelihood = 1.0
+            for name, domain in self.space.items():
+                if isinstance(domain, tuple):
+                    width = self._bandwidth(*domain, len(configs))
+                    likelihood *= math.exp(-0.5 * ((candidate[name] - config[name]) / width) ** 2)
+                elif candidate[name] == config[name]:
+                    likelihood *= 0.75
+                else:
+                    likelihood *= 0.25 / max(1, len(domain) - 1)
+            total += likelihood
+        return total / (len(configs) + 1)
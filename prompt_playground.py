@@ -1,15 +1,82 @@
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 import json
 import threading
+import queue
+import time
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Import the OpenAI API wrapper (the SDK itself is only imported on first use)
+from openai_wrapper import (
+    OpenAIWrapper, AsyncOpenAIWrapper, EventLoopThread, make_result, load_env, warm_up, get_pool,
+    DEFAULT_MAX_WORKERS, DEFAULT_TEMPERATURES,
+    DEFAULT_MAX_TOKENS_VALUES, DEFAULT_PRESENCE_PENALTIES, DEFAULT_FREQUENCY_PENALTIES
+)
+from response_cache import ResponseCache
+from rate_limiter import RateLimiter
+from backends import BackendPool
+from experiment_store import ExperimentStore
+from metrics import MetricsRegistry, percentile
+from sweep_runner import iter_requests, make_spec_search
+from param_search import load_scorer
+from sharding import iter_result_files, merge_results, format_merge_summary
 
-# Import the OpenAI API wrapper
-from openai_wrapper import OpenAIWrapper
+# How often the UI drains results queued by worker threads, and how many
+# queued updates it applies per drain, so large sweeps can't flood the Tk loop
+UI_DRAIN_INTERVAL_MS = 50
+UI_DRAIN_BATCH_SIZE = 500
+
+# Characters of each output shown in the results table (full text opens on demand)
+PREVIEW_LENGTH = 200
+
+# Height of a results table row in pixels
+TABLE_ROW_HEIGHT = 60
+
+# Live preview: how long the inputs must stay unchanged before a preview is
+# generated, and the most tokens a preview asks for (so it stays quick)
+LIVE_PREVIEW_DEBOUNCE_MS = 600
+LIVE_PREVIEW_MAX_TOKENS = 100
+
+# How often an open stats window refreshes
+STATS_REFRESH_MS = 1000
+
+# Set PLAYGROUND_WARM_UP=0 to skip opening the API connection at startup
+WARM_UP_ENV = "PLAYGROUND_WARM_UP"
+
+# Batch sweeps cover every product (separated by PRODUCT_SEPARATOR) and every
+# prompt variant (separated by a line holding only PROMPT_VARIANT_SEPARATOR)
+PRODUCT_SEPARATOR = ";"
+PROMPT_VARIANT_SEPARATOR = "---"
+
+# Table columns showing output analytics (see output_analytics.py) -> metric
+ANALYTICS_COLUMNS = {
+    "words": "words",
+    "out_tokens": "tokens",
+    "diversity": "diversity",
+    "repetition": "repetition",
+    "similarity": "similarity",
+    "overlap": "overlap",
+}
+
+# Batch Generate modes: the full grid or an adaptive search (see param_search.py)
+SEARCH_MODES = (("Full grid", None), ("Random search", "random"),
+                ("Successive halving", "halving"), ("Bayesian (TPE)", "tpe"))
+
+
+def split_products(text):
+    """Split the product entry into its products."""
+    return [product.strip() for product in text.split(PRODUCT_SEPARATOR) if product.strip()]
+
+
+def split_prompt_variants(text):
+    """Split a prompt text box into its variants."""
+    variants = [[]]
+    for line in text.splitlines():
+        if line.strip() == PROMPT_VARIANT_SEPARATOR:
+            variants.append([])
+        else:
+            variants[-1].append(line)
+    return [variant for variant in ("\n".join(lines).strip() for lines in variants) if variant]
 
 class PromptPlayground(tk.Tk):
     def __init__(self):
@@ -49,14 +116,85 @@ class PromptPlayground(tk.Tk):
         self.main_frame.columnconfigure(1, weight=1)
         self.main_frame.rowconfigure(1, weight=1)
         
+        # Batch results data: full results live here, stored as columns
+        # (created once results arrive, so NumPy isn't imported at startup),
+        # and the table only renders previews of the rows currently in view.
+        # Cells still streaming are kept as partial result dictionaries
+        self.batch_results = None
+        self.streaming_results = {}
+        self.table_order = []
+        self.table_rows = []
+        self.table_start = 0
+        self.table_visible = 0
+        self.table_rows_dirty = False
+        self.table_selection = None
+        
+        # Prompt variant numbers shown in the table's Prompt column
+        self.prompt_labels = {"system": {}, "user": {}}
+        
+        # Metrics across all outputs (created once results arrive) and the
+        # table's sort column and direction, if any
+        self.analytics = None
+        self.table_sort = None
+        
+        # Near-duplicate outputs, clustered as results arrive
+        self.duplicates = None
+        
+        # Updates from worker threads, applied by the UI thread in batches,
+        # and the streamed text of a single generation not yet shown
+        self.ui_queue = queue.Queue()
+        self.single_deltas = []
+        self.single_deltas_lock = threading.Lock()
+        
+        # Live preview: the pending debounce timer, the preview in flight (a
+        # Future on the preview event loop, which is started on first use)
+        # and a counter that lets late deltas of superseded previews be dropped
+        self.preview_timer = None
+        self.preview_future = None
+        self.preview_generation = 0
+        self.preview_loop = None
+        self.preview_api = None
+        
         # Set up configuration frame
         self.setup_config_frame()
         
         # Set up results frame
         self.setup_results_frame()
         
-        # Batch results data
-        self.batch_results = []
+        self.after(UI_DRAIN_INTERVAL_MS, self._drain_ui_queue)
+        
+        # Persistent cache of API responses, shared by all generations
+        self.response_cache = ResponseCache()
+        
+        # Answered prompts, for reusing answers to similar prompts (created
+        # when first enabled)
+        self.similar_prompts = None
+        
+        # Client-side RPM/TPM limits (from OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT),
+        # shared by every generation so sweeps stay under the account quota
+        load_env()
+        self.rate_limiter = RateLimiter.from_env()
+        
+        # Several API keys / endpoints (from OPENAI_API_KEYS / OPENAI_BASE_URLS)
+        # to spread calls across, if configured
+        self.backends = BackendPool.from_env()
+        
+        # Persistent record of every generation and reflection; history is
+        # only read when the user opens it
+        self.experiment_store = ExperimentStore()
+        self.current_sweep_id = None
+        
+        # Rolling per-model latency, token and cost statistics for every call
+        self.metrics = MetricsRegistry()
+        self.batch_started_at = None
+        
+        # Set by the Cancel button to stop the running batch
+        self.cancel_event = None
+        
+        # Once the window has painted, import the SDK and connect in the
+        # background so the first Generate click doesn't wait for it
+        if os.getenv(WARM_UP_ENV, "1") != "0":
+            self.after_idle(lambda: threading.Thread(target=warm_up, daemon=True).start())
 
     def setup_config_frame(self):
         # Configuration header
@@ -71,7 +209,7 @@ class PromptPlayground(tk.Tk):
         model_combo.grid(row=1, column=1, sticky="ew", pady=5)
         
         # Product input
-        ttk.Label(self.left_frame, text="Product:").grid(row=2, column=0, sticky="w", pady=5)
+        ttk.Label(self.left_frame, text="Product(s):").grid(row=2, column=0, sticky="w", pady=5)
         self.product_var = tk.StringVar()
         product_entry = ttk.Entry(self.left_frame, textvariable=self.product_var)
         product_entry.grid(row=2, column=1, sticky="ew", pady=5)
@@ -142,15 +280,117 @@ class PromptPlayground(tk.Tk):
         stop_entry = ttk.Entry(self.left_frame, textvariable=self.stop_var)
         stop_entry.grid(row=10, column=1, sticky="ew", pady=5)
         
+        # Batch concurrency
+        ttk.Label(self.left_frame, text="Batch Workers:").grid(row=11, column=0, sticky="w", pady=5)
+        self.workers_var = tk.IntVar(value=DEFAULT_MAX_WORKERS)
+        workers_spin = ttk.Spinbox(self.left_frame, from_=1, to=64, textvariable=self.workers_var, width=5)
+        workers_spin.grid(row=11, column=1, sticky="w", pady=5)
+        
+        # Response cache
+        ttk.Label(self.left_frame, text="Response Cache:").grid(row=12, column=0, sticky="w", pady=5)
+        self.cache_frame = ttk.Frame(self.left_frame)
+        self.cache_frame.grid(row=12, column=1, sticky="ew", pady=5)
+        self.cache_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.cache_frame, text="Enabled, up to temperature",
+                        variable=self.cache_var).pack(side=tk.LEFT)
+        self.cache_temp_var = tk.DoubleVar(value=0.0)
+        ttk.Spinbox(self.cache_frame, from_=0.0, to=2.0, increment=0.1, format="%.1f",
+                    textvariable=self.cache_temp_var, width=5).pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Streaming output
+        ttk.Label(self.left_frame, text="Streaming:").grid(row=13, column=0, sticky="w", pady=5)
+        self.stream_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.left_frame, text="Show output as it is generated",
+                        variable=self.stream_var).grid(row=13, column=1, sticky="w", pady=5)
+        
+        # Samples per cell
+        ttk.Label(self.left_frame, text="Samples:").grid(row=14, column=0, sticky="w", pady=5)
+        self.samples_var = tk.IntVar(value=1)
+        samples_spin = ttk.Spinbox(self.left_frame, from_=1, to=10, textvariable=self.samples_var, width=5)
+        samples_spin.grid(row=14, column=1, sticky="w", pady=5)
+        
+        # Prefix sharing for deterministic max_tokens variants
+        ttk.Label(self.left_frame, text="Batch Options:").grid(row=15, column=0, sticky="w", pady=5)
+        self.share_prefixes_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.left_frame, text="Derive shorter max tokens at temperature 0.0",
+                        variable=self.share_prefixes_var).grid(row=15, column=1, sticky="w", pady=5)
+        
+        # Per-call deadline and hedging of slow requests
+        ttk.Label(self.left_frame, text="Tail Latency:").grid(row=16, column=0, sticky="w", pady=5)
+        self.tail_frame = ttk.Frame(self.left_frame)
+        self.tail_frame.grid(row=16, column=1, sticky="ew", pady=5)
+        ttk.Label(self.tail_frame, text="Deadline (s, 0 = none)").pack(side=tk.LEFT)
+        self.deadline_var = tk.DoubleVar(value=0.0)
+        ttk.Spinbox(self.tail_frame, from_=0, to=600, increment=5, textvariable=self.deadline_var,
+                    width=5).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(self.tail_frame, text="Hedge at p (0 = off)").pack(side=tk.LEFT)
+        self.hedge_var = tk.IntVar(value=0)
+        ttk.Spinbox(self.tail_frame, from_=0, to=99, increment=5, textvariable=self.hedge_var,
+                    width=5).pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Adaptive search instead of the full grid
+        ttk.Label(self.left_frame, text="Batch Search:").grid(row=17, column=0, sticky="w", pady=5)
+        self.search_frame = ttk.Frame(self.left_frame)
+        self.search_frame.grid(row=17, column=1, sticky="ew", pady=5)
+        self.search_var = tk.StringVar(value=SEARCH_MODES[0][0])
+        ttk.Combobox(self.search_frame, textvariable=self.search_var, values=[name for name, _ in SEARCH_MODES],
+                     state="readonly", width=18).pack(side=tk.LEFT)
+        ttk.Label(self.search_frame, text="Budget").pack(side=tk.LEFT, padx=(10, 0))
+        self.budget_var = tk.IntVar(value=60)
+        ttk.Spinbox(self.search_frame, from_=1, to=10000, increment=10, textvariable=self.budget_var,
+                    width=6).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(self.search_frame, text="Scorer").pack(side=tk.LEFT)
+        self.scorer_var = tk.StringVar(value="length:80")
+        ttk.Entry(self.search_frame, textvariable=self.scorer_var, width=16).pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Reuse answers to nearly identical prompts
+        ttk.Label(self.left_frame, text="Similar Prompts:").grid(row=18, column=0, sticky="w", pady=5)
+        self.similar_frame = ttk.Frame(self.left_frame)
+        self.similar_frame.grid(row=18, column=1, sticky="ew", pady=5)
+        self.similar_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.similar_frame, text="Reuse answers at similarity",
+                        variable=self.similar_var).pack(side=tk.LEFT)
+        self.similar_threshold_var = tk.DoubleVar(value=0.9)
+        ttk.Spinbox(self.similar_frame, from_=0.5, to=1.0, increment=0.05, format="%.2f",
+                    textvariable=self.similar_threshold_var, width=5).pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Regenerate a short preview whenever the prompts or parameters change
+        ttk.Label(self.left_frame, text="Live Preview:").grid(row=19, column=0, sticky="w", pady=5)
+        self.live_preview_frame = ttk.Frame(self.left_frame)
+        self.live_preview_frame.grid(row=19, column=1, sticky="ew", pady=5)
+        self.live_preview_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.live_preview_frame, text="Preview edits after a pause of (ms)",
+                        variable=self.live_preview_var, command=self._schedule_preview).pack(side=tk.LEFT)
+        self.preview_delay_var = tk.IntVar(value=LIVE_PREVIEW_DEBOUNCE_MS)
+        ttk.Spinbox(self.live_preview_frame, from_=100, to=5000, increment=100,
+                    textvariable=self.preview_delay_var, width=6).pack(side=tk.LEFT, padx=(5, 0))
+        
+        for var in (self.model_var, self.product_var, self.temp_var, self.tokens_var,
+                    self.presence_var, self.frequency_var, self.stop_var):
+            var.trace_add("write", self._schedule_preview)
+        for text in (self.system_prompt, self.user_prompt):
+            text.edit_modified(False)
+            text.bind("<<Modified>>", self._on_prompt_modified)
+        
         # Buttons
         self.buttons_frame = ttk.Frame(self.left_frame)
-        self.buttons_frame.grid(row=11, column=0, columnspan=2, sticky="ew", pady=(20, 0))
+        self.buttons_frame.grid(row=20, column=0, columnspan=2, sticky="ew", pady=(20, 0))
         
         self.generate_btn = ttk.Button(self.buttons_frame, text="Generate", command=self.generate_single)
         self.generate_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
         
         self.batch_btn = ttk.Button(self.buttons_frame, text="Batch Generate", command=self.generate_batch)
-        self.batch_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        self.batch_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        self.cancel_btn = ttk.Button(self.buttons_frame, text="Cancel", command=self.cancel_batch,
+                                     state="disabled")
+        self.cancel_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        self.history_btn = ttk.Button(self.buttons_frame, text="History", command=self.open_history)
+        self.history_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        self.stats_btn = ttk.Button(self.buttons_frame, text="Stats", command=self.open_stats)
+        self.stats_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
         
         # Configure grid weights for left frame
         self.left_frame.columnconfigure(1, weight=1)
@@ -175,44 +415,80 @@ class PromptPlayground(tk.Tk):
         # Batch results header
         batch_header = ttk.Label(self.right_frame, text="Batch Results", style="Subheader.TLabel")
         batch_header.grid(row=3, column=0, sticky="w", pady=(0, 10))
+        ttk.Button(self.right_frame, text="Export Results", command=self.export_results).grid(
+            row=3, column=0, sticky="e", pady=(0, 10))
         
         # Batch results table
         self.batch_frame = ttk.Frame(self.right_frame)
         self.batch_frame.grid(row=4, column=0, sticky="nsew")
         
         # Create Treeview for results
-        self.tree_columns = ("temp", "tokens", "presence", "frequency", "output")
-        self.results_tree = ttk.Treeview(self.batch_frame, columns=self.tree_columns, show="headings", height=10)
-        
-        # Define headings
+        self.tree_columns = ("product", "prompt", "temp", "tokens", "presence", "frequency", "score",
+                             "words", "out_tokens", "diversity", "repetition", "similarity", "overlap",
+                             "duplicates", "output")
+        self.results_tree = ttk.Treeview(self.batch_frame, columns=self.tree_columns, show="tree headings", height=10)
+        
+        # Define headings (the tree column lists each cell's sibling samples)
+        self.results_tree.heading("#0", text="Sample")
+        self.results_tree.heading("product", text="Product")
+        self.results_tree.heading("prompt", text="Prompt")
         self.results_tree.heading("temp", text="Temperature")
         self.results_tree.heading("tokens", text="Max Tokens")
         self.results_tree.heading("presence", text="Presence Penalty")
         self.results_tree.heading("frequency", text="Frequency Penalty")
+        self.results_tree.heading("score", text="Score")
+        self.results_tree.heading("words", text="Words")
+        self.results_tree.heading("out_tokens", text="Tokens Out")
+        self.results_tree.heading("diversity", text="Diversity")
+        self.results_tree.heading("repetition", text="Repetition")
+        self.results_tree.heading("similarity", text="Similarity")
+        self.results_tree.heading("overlap", text="Overlap")
+        self.results_tree.heading("duplicates", text="Near Dupes")
         self.results_tree.heading("output", text="Output")
         
+        # Clicking a heading sorts the table by that column (again to reverse)
+        self.tree_headings = {}
+        for column in self.tree_columns:
+            self.tree_headings[column] = self.results_tree.heading(column, "text")
+            self.results_tree.heading(column, command=lambda column=column: self._sort_table(column))
+        
         # Define columns
+        self.results_tree.column("#0", width=90, stretch=False)
+        self.results_tree.column("product", width=100)
+        self.results_tree.column("prompt", width=70, anchor=tk.CENTER)
         self.results_tree.column("temp", width=100, anchor=tk.CENTER)
         self.results_tree.column("tokens", width=100, anchor=tk.CENTER)
         self.results_tree.column("presence", width=100, anchor=tk.CENTER)
         self.results_tree.column("frequency", width=100, anchor=tk.CENTER)
+        self.results_tree.column("score", width=60, anchor=tk.CENTER)
+        for column in ANALYTICS_COLUMNS:
+            self.results_tree.column(column, width=75, anchor=tk.CENTER)
+        self.results_tree.column("duplicates", width=75, anchor=tk.CENTER)
         self.results_tree.column("output", width=400)
         
         # Configure row height for better readability
         style = ttk.Style()
-        style.configure('Treeview', rowheight=60)
+        style.configure('Treeview', rowheight=TABLE_ROW_HEIGHT)
         
-        # Add scrollbar
-        tree_scroll = ttk.Scrollbar(self.batch_frame, orient=tk.VERTICAL, command=self.results_tree.yview)
-        self.results_tree.configure(yscrollcommand=tree_scroll.set)
+        # Add scrollbar (the table is virtual: scrolling re-renders the visible rows)
+        self.tree_scroll = ttk.Scrollbar(self.batch_frame, orient=tk.VERTICAL, command=self._scroll_table)
         
         # Pack tree and scrollbar
         self.results_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Bind double-click event to view full output
         self.results_tree.bind("<Double-1>", self.view_full_output)
         
+        # Scrolling and selection for the virtual table
+        self.results_tree.bind("<MouseWheel>", self._on_table_wheel)
+        self.results_tree.bind("<Button-4>", lambda event: self._scroll_table("scroll", -1, "units"))
+        self.results_tree.bind("<Button-5>", lambda event: self._scroll_table("scroll", 1, "units"))
+        self.results_tree.bind("<Prior>", lambda event: self._scroll_table("scroll", -1, "pages"))
+        self.results_tree.bind("<Next>", lambda event: self._scroll_table("scroll", 1, "pages"))
+        self.results_tree.bind("<<TreeviewSelect>>", self._on_table_select)
+        self.results_tree.bind("<Configure>", self._on_table_configure)
+        
         # Reflection section
         reflection_header = ttk.Label(self.right_frame, text="Reflection", style="Subheader.TLabel")
         reflection_header.grid(row=5, column=0, sticky="w", pady=(20, 10))
@@ -241,83 +517,168 @@ class PromptPlayground(tk.Tk):
     def update_frequency_label(self, value):
         self.frequency_label.config(text=f"{float(value):.1f}")
         
+    def _create_wrapper(self):
+        """Create an OpenAI wrapper using the response cache, similar prompt and tail latency settings."""
+        options = dict(rate_limiter=self.rate_limiter, metrics=self.metrics, backends=self.backends,
+                       deadline=self.deadline_var.get() or None,
+                       hedge_percentile=self.hedge_var.get() or None)
+        if self.similar_var.get():
+            if self.similar_prompts is None:
+                from near_duplicates import SimilarPromptCache
+                self.similar_prompts = SimilarPromptCache()
+            self.similar_prompts.threshold = self.similar_threshold_var.get()
+            options["similar_prompts"] = self.similar_prompts
+        if not self.cache_var.get():
+            return OpenAIWrapper(**options)
+        
+        self.response_cache.max_temperature = self.cache_temp_var.get()
+        return OpenAIWrapper(cache=self.response_cache, **options)
+        
     def generate_single(self):
         # Validate inputs
-        if not self.product_var.get():
+        if not split_products(self.product_var.get()):
             messagebox.showerror("Error", "Please enter a product")
             return
             
-        if not self.user_prompt.get("1.0", tk.END).strip():
+        if not split_prompt_variants(self.user_prompt.get("1.0", tk.END)):
             messagebox.showerror("Error", "Please enter a user prompt")
             return
             
+        # Tk variables may only be read on the UI thread, so the settings
+        # are taken here and handed to the worker.
+        # A single generation uses the first product and prompt variants
+        try:
+            request = dict(
+                model=self.model_var.get(),
+                system_prompt=(split_prompt_variants(self.system_prompt.get("1.0", tk.END)) or [""])[0],
+                user_prompt=split_prompt_variants(self.user_prompt.get("1.0", tk.END))[0],
+                product=split_products(self.product_var.get())[0],
+                temperature=self.temp_var.get(),
+                max_tokens=self.tokens_var.get(),
+                presence_penalty=self.presence_var.get(),
+                frequency_penalty=self.frequency_var.get(),
+                stop_sequence=self.stop_var.get() or None,
+                n=self.samples_var.get()
+            )
+            stream = self.stream_var.get()
+            openai_api = self._create_wrapper()
+        except (ValueError, tk.TclError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+            
+        # A full generation replaces the live preview in flight, if any
+        self._cancel_preview()
+        
         # Disable button during generation
         self.generate_btn.config(state="disabled")
         self.generate_btn["text"] = "Generating..."
         self.result_text.delete("1.0", tk.END)
-        self.result_text.insert(tk.END, "Generating...")
+        if not stream:
+            self.result_text.insert(tk.END, "Generating...")
         self.update_idletasks()
         
         # Start generation in a separate thread
-        threading.Thread(target=self._generate_single_thread, daemon=True).start()
+        threading.Thread(target=self._generate_single_thread, args=(openai_api, request, stream),
+                         daemon=True).start()
         
-    def _generate_single_thread(self):
+    def _generate_single_thread(self, openai_api, request, stream):
+        # Updates go through the UI queue, in order, like a batch's
         try:
-            # Get parameters
-            model = self.model_var.get()
-            system_prompt = self.system_prompt.get("1.0", tk.END).strip()
-            user_prompt = self.user_prompt.get("1.0", tk.END).strip()
-            product = self.product_var.get()
-            temperature = self.temp_var.get()
-            max_tokens = self.tokens_var.get()
-            presence_penalty = self.presence_var.get()
-            frequency_penalty = self.frequency_var.get()
-            stop_sequence = self.stop_var.get() if self.stop_var.get() else None
-            
-            # Create OpenAI wrapper instance
-            openai_api = OpenAIWrapper()
-            
-            # Generate response
-            response_content, error = openai_api.generate_response(
-                model=model,
-                system_prompt=system_prompt,
-                user_prompt=user_prompt,
-                product=product,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                presence_penalty=presence_penalty,
-                frequency_penalty=frequency_penalty,
-                stop_sequence=stop_sequence
-            )
+            # Generate response, showing text as it arrives when streaming
+            if stream:
+                response = openai_api.generate_response(stream=True, **request)
+                for delta in response:
+                    self._on_single_delta(delta)
+                response_content, error = response.content, response.error
+                timing = response.timing()
+            else:
+                start = time.perf_counter()
+                response_content, error, call_metrics = openai_api.generate_with_metrics(**request)
+                timing = {"latency": time.perf_counter() - start, **call_metrics}
+            
+            # Record the generation (errors included)
+            sweep_id = self.experiment_store.create_sweep("single", f"{request['model']} / {request['product']}")
+            self.experiment_store.add_run(sweep_id, make_result(0, request, response_content, error, timing))
+            self.current_sweep_id = sweep_id
             
             if error:
                 raise Exception(error)
             
             # Update UI with result
-            self.after(0, self._update_single_result, response_content, {
-                "model": model,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "presence_penalty": presence_penalty,
-                "frequency_penalty": frequency_penalty
-            })
+            params = {key: request[key] for key in
+                      ("model", "temperature", "max_tokens", "presence_penalty", "frequency_penalty")}
+            self.ui_queue.put((self._update_single_result, (response_content, {**params, **timing})))
             
         except Exception as e:
-            self.after(0, self._update_single_error, str(e))
+            self.ui_queue.put((self._update_single_error, (str(e),)))
             
+    def _on_single_delta(self, delta):
+        # Called from the worker thread. Deltas arriving between two drains
+        # of the UI queue are inserted into the result box together
+        with self.single_deltas_lock:
+            self.single_deltas.append(delta)
+            first = len(self.single_deltas) == 1
+        if first:
+            self.ui_queue.put((self._flush_single_deltas, ()))
+            
+    def _flush_single_deltas(self):
+        with self.single_deltas_lock:
+            text = "".join(self.single_deltas)
+            self.single_deltas = []
+        self._append_single_delta(text)
+        
+    def _append_single_delta(self, delta):
+        self.result_text.insert(tk.END, delta)
+        self.result_text.see(tk.END)
+        
     def _update_single_result(self, content, params):
         self.result_text.delete("1.0", tk.END)
-        self.result_text.insert(tk.END, content)
+        self.result_text.insert(tk.END, self._format_samples(content))
         
         # Update parameter summary
         summary = f"Model: {params['model']}, Temperature: {params['temperature']:.1f}, Max Tokens: {params['max_tokens']}, "
         summary += f"Presence Penalty: {params['presence_penalty']:.1f}, Frequency Penalty: {params['frequency_penalty']:.1f}"
+        if "time_to_first_token" in params:
+            summary += f"\nTime to first token: {params['time_to_first_token']:.2f}s, "
+            summary += f"Total latency: {params['latency']:.2f}s"
+        elif "latency" in params:
+            summary += f"\nLatency: {params['latency']:.2f}s"
+        usage_summary = self._format_usage(params)
+        if usage_summary:
+            summary += f"\n{usage_summary}"
         self.param_summary.config(text=summary)
         
         # Reset button
         self.generate_btn.config(state="normal")
         self.generate_btn["text"] = "Generate"
         
+    @staticmethod
+    def _format_usage(result):
+        """Summarise a result's token usage, cost and finish reason (empty if unknown)."""
+        parts = []
+        usage = result.get("usage")
+        if usage:
+            tokens = f"Tokens: {usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion"
+            if usage.get("cached_tokens"):
+                tokens += f" ({usage['cached_tokens']} prompt tokens cached)"
+            parts.append(tokens)
+        if result.get("cost") is not None:
+            parts.append(f"Cost: ${result['cost']:.5f}")
+        if result.get("finish_reason"):
+            parts.append(f"Finish reason: {result['finish_reason']}")
+        if result.get("similar_prompt") is not None:
+            parts.append(f"Reused the answer to a similar prompt ({result['similar_prompt']:.0%} similar)")
+        elif result.get("cache_hit"):
+            parts.append("Cached")
+        return ", ".join(parts)
+        
+    @staticmethod
+    def _format_samples(content):
+        """Format one response, or several samples one after another."""
+        if not isinstance(content, list):
+            return content
+        return "\n\n".join(f"--- Sample {i} ---\n{text}" for i, text in enumerate(content, 1))
+        
     def _update_single_error(self, error_msg):
         self.result_text.delete("1.0", tk.END)
         self.result_text.insert(tk.END, f"Error: {error_msg}")
@@ -326,13 +687,119 @@ class PromptPlayground(tk.Tk):
         self.generate_btn.config(state="normal")
         self.generate_btn["text"] = "Generate"
         
+    def _on_prompt_modified(self, event):
+        # <<Modified>> only fires again once the flag is reset
+        if event.widget.edit_modified():
+            event.widget.edit_modified(False)
+            self._schedule_preview()
+        
+    def _schedule_preview(self, *args):
+        """
+        Restart the live preview's debounce timer after an edit.
+        
+        The preview in flight, if any, is cancelled straight away: its output
+        no longer matches the inputs, so there is no point paying for the
+        rest of it.
+        """
+        self._cancel_preview()
+        if self.preview_timer is not None:
+            self.after_cancel(self.preview_timer)
+            self.preview_timer = None
+        if not self.live_preview_var.get():
+            return
+        try:
+            delay = max(0, self.preview_delay_var.get())
+        except tk.TclError:
+            delay = LIVE_PREVIEW_DEBOUNCE_MS
+        self.preview_timer = self.after(delay, self._start_preview)
+        
+    def _cancel_preview(self):
+        """Cancel the preview in flight (dropping its connection) and ignore its late deltas."""
+        self.preview_generation += 1
+        if self.preview_future is not None:
+            self.preview_future.cancel()
+            self.preview_future = None
+        
+    def _start_preview(self):
+        """Stream a short generation for the current inputs into the result box."""
+        self.preview_timer = None
+        products = split_products(self.product_var.get())
+        user_prompts = split_prompt_variants(self.user_prompt.get("1.0", tk.END))
+        # Leave the result box alone while a full generation is writing to it
+        if not products or not user_prompts or str(self.generate_btn["state"]) == "disabled":
+            return
+        
+        try:
+            if self.preview_loop is None:
+                self.preview_loop = EventLoopThread()
+            if self.preview_api is None:
+                self.preview_api = AsyncOpenAIWrapper(rate_limiter=self.rate_limiter, metrics=self.metrics)
+            self.preview_api.cache = None
+            if self.cache_var.get():
+                self.response_cache.max_temperature = self.cache_temp_var.get()
+                self.preview_api.cache = self.response_cache
+            request = dict(
+                model=self.model_var.get(),
+                system_prompt=(split_prompt_variants(self.system_prompt.get("1.0", tk.END)) or [""])[0],
+                user_prompt=user_prompts[0],
+                product=products[0],
+                temperature=self.temp_var.get(),
+                max_tokens=min(self.tokens_var.get(), LIVE_PREVIEW_MAX_TOKENS),
+                presence_penalty=self.presence_var.get(),
+                frequency_penalty=self.frequency_var.get(),
+                stop_sequence=self.stop_var.get() or None
+            )
+        except (ValueError, tk.TclError) as e:
+            self._update_single_error(str(e))
+            return
+        
+        self._cancel_preview()
+        generation = self.preview_generation
+        self.result_text.delete("1.0", tk.END)
+        self.param_summary.config(text="Live preview...")
+        
+        def on_delta(delta):
+            self.ui_queue.put((self._append_preview_delta, (generation, delta)))
+        
+        def on_done(future):
+            if not future.cancelled():
+                self.ui_queue.put((self._preview_finished, (generation, request, *future.result())))
+        
+        self.preview_future = self.preview_loop.submit(
+            self.preview_api.astream_response(on_delta=on_delta, **request))
+        self.preview_future.add_done_callback(on_done)
+        
+    def _append_preview_delta(self, generation, delta):
+        if generation == self.preview_generation:
+            self._append_single_delta(delta)
+        
+    def _preview_finished(self, generation, request, content, error, timing):
+        if generation != self.preview_generation:
+            return
+        self.preview_future = None
+        if error:
+            self.result_text.delete("1.0", tk.END)
+            self.result_text.insert(tk.END, f"Error: {error}")
+            self.param_summary.config(text="Live preview")
+            return
+        
+        summary = (f"Live preview ({request['model']}, Temperature: {request['temperature']:.1f},"
+                   f" Max Tokens: {request['max_tokens']})")
+        if "time_to_first_token" in timing:
+            summary += f"\nTime to first token: {timing['time_to_first_token']:.2f}s, "
+            summary += f"Total latency: {timing['latency']:.2f}s"
+        usage_summary = self._format_usage(timing)
+        if usage_summary:
+            summary += f"\n{usage_summary}"
+        self.param_summary.config(text=summary)
+        
     def generate_batch(self):
         # Validate inputs
-        if not self.product_var.get():
+        if not split_products(self.product_var.get()):
             messagebox.showerror("Error", "Please enter a product")
             return
             
-        if not self.user_prompt.get("1.0", tk.END).strip():
+        if not split_prompt_variants(self.user_prompt.get("1.0", tk.END)):
             messagebox.showerror("Error", "Please enter a user prompt")
             return
             
@@ -340,158 +807,539 @@ class PromptPlayground(tk.Tk):
         if not messagebox.askyesno("Confirm", "This will generate multiple API calls and may take some time. Continue?"):
             return
             
+        self._start_batch()
+        
+    def resume_sweep(self, sweep_id):
+        """
+        Resume a batch sweep that was interrupted or had errors.
+        
+        Cells with a successful stored run are loaded back into the table;
+        only the missing and failed cells are sent again.
+        """
+        sweep = self.experiment_store.get_sweep(sweep_id)
+        if sweep is None or sweep["spec"] is None:
+            messagebox.showerror("Error", "This sweep can't be resumed")
+            return
+        self._start_batch(sweep)
+        
+    def _start_batch(self, resume=None):
+        # Tk variables may only be read on the UI thread, so the batch is
+        # configured here and handed to the worker
+        try:
+            openai_api = self._create_wrapper()
+            settings = self._batch_settings(resume)
+        except (ValueError, tk.TclError) as e:
+            messagebox.showerror("Error", str(e))
+            return
+            
         # Disable button during generation
         self.batch_btn.config(state="disabled")
         self.batch_btn["text"] = "Generating..."
+        self.cancel_event = threading.Event()
+        self.cancel_btn.config(state="normal")
         
         # Clear previous results
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
+        self._clear_batch_results()
+        self.batch_started_at = time.perf_counter()
             
         self.result_text.delete("1.0", tk.END)
-        self.result_text.insert(tk.END, "Generating batch results...")
+        self.result_text.insert(tk.END, "Resuming sweep..." if resume else "Generating batch results...")
         self.update_idletasks()
         
         # Start generation in a separate thread
-        threading.Thread(target=self._generate_batch_thread, daemon=True).start()
-        
-    def _generate_batch_thread(self):
+        threading.Thread(target=self._generate_batch_thread, args=(openai_api, settings, resume),
+                         daemon=True).start()
+        
+    def _batch_settings(self, resume=None):
+        """Read the batch options from the UI (a resumed sweep keeps its stored spec)."""
+        settings = {
+            "max_workers": self.workers_var.get(),
+            "share_prefixes": self.share_prefixes_var.get(),
+            "on_delta": self._on_batch_delta if self.stream_var.get() else None,
+            "spec": self._batch_spec() if resume is None else None,
+            "strategy": dict(SEARCH_MODES).get(self.search_var.get()) if resume is None else None
+        }
+        if settings["strategy"] is not None:
+            settings["scorer"] = load_scorer(self.scorer_var.get())
+            settings["budget"] = self.budget_var.get()
+        return settings
+        
+    def _batch_spec(self):
+        """Describe the batch sweep configured in the UI as a sweep spec (see sweep_runner.py)."""
+        # Every product is combined with every prompt variant
+        return {
+            "models": [self.model_var.get()],
+            "system_prompts": split_prompt_variants(self.system_prompt.get("1.0", tk.END)) or [""],
+            "user_prompts": split_prompt_variants(self.user_prompt.get("1.0", tk.END)),
+            "products": split_products(self.product_var.get()),
+            # Parameter variations to test
+            "temperatures": DEFAULT_TEMPERATURES,
+            "max_tokens": DEFAULT_MAX_TOKENS_VALUES,
+            "presence_penalties": DEFAULT_PRESENCE_PENALTIES,
+            "frequency_penalties": DEFAULT_FREQUENCY_PENALTIES,
+            "stop_sequence": self.stop_var.get() if self.stop_var.get() else None,
+            "n": self.samples_var.get()
+        }
+        
+    def _generate_batch_thread(self, openai_api, settings, resume=None):
         try:
-            # Get base parameters
-            model = self.model_var.get()
-            system_prompt = self.system_prompt.get("1.0", tk.END).strip()
-            user_prompt = self.user_prompt.get("1.0", tk.END).strip()
-            product = self.product_var.get()
-            stop_sequence = self.stop_var.get() if self.stop_var.get() else None
+            cache_before = self.response_cache.stats()
             
-            # Parameter variations to test
-            temperatures = [0.0, 0.7, 1.2]
-            max_tokens_values = [50, 150, 300]
-            presence_penalties = [0.0, 1.5]
-            frequency_penalties = [0.0, 1.5]
-            
-            # Store results
-            self.batch_results = []
-            
-            # Create OpenAI wrapper instance
-            openai_api = OpenAIWrapper()
-            
-            # Generate all combinations
-            for temp in temperatures:
-                for max_tok in max_tokens_values:
-                    for pres_pen in presence_penalties:
-                        for freq_pen in frequency_penalties:
-                            try:
-                                # Generate response using the wrapper
-                                response_content, error = openai_api.generate_response(
-                                    model=model,
-                                    system_prompt=system_prompt,
-                                    user_prompt=user_prompt,
-                                    product=product,
-                                    temperature=temp,
-                                    max_tokens=max_tok,
-                                    presence_penalty=pres_pen,
-                                    frequency_penalty=freq_pen,
-                                    stop_sequence=stop_sequence
-                                )
-                                
-                                # Store result
-                                if error:
-                                    result = {
-                                        "parameters": {
-                                            "temperature": temp,
-                                            "max_tokens": max_tok,
-                                            "presence_penalty": pres_pen,
-                                            "frequency_penalty": freq_pen
-                                        },
-                                        "error": error
-                                    }
-                                else:
-                                    result = {
-                                        "parameters": {
-                                            "temperature": temp,
-                                            "max_tokens": max_tok,
-                                            "presence_penalty": pres_pen,
-                                            "frequency_penalty": freq_pen
-                                        },
-                                        "response": response_content
-                                    }
-                                
-                            except Exception as e:
-                                # Store error
-                                result = {
-                                    "parameters": {
-                                        "temperature": temp,
-                                        "max_tokens": max_tok,
-                                        "presence_penalty": pres_pen,
-                                        "frequency_penalty": freq_pen
-                                    },
-                                    "error": str(e)
-                                }
-                                
-                            self.batch_results.append(result)
-                            
-                            # Update UI with current result
-                            self.after(0, self._add_batch_result, result)
-            
-            # Update UI when complete
-            self.after(0, self._batch_generation_complete)
+            # Every result is committed to the store as soon as it arrives,
+            # so an interrupted sweep can be resumed from what was recorded
+            done = {}
+            if settings["strategy"] is not None:
+                self._run_search(openai_api, settings, cache_before)
+                return
+            if resume is None:
+                spec = settings["spec"]
+                description = f"{spec['models'][0]} / {', '.join(spec['products'])}"
+                sweep_id = self.experiment_store.create_sweep("batch", description, spec=[spec])
+                specs = [spec]
+            else:
+                sweep_id = resume["id"]
+                specs = resume["spec"]
+                for index, result in self.experiment_store.latest_runs(sweep_id).items():
+                    if "error" not in result:
+                        done[index] = result
+                        self.ui_queue.put((self._add_batch_result, (result,)))
+            self.current_sweep_id = sweep_id
+            
+            # Run all remaining cells concurrently, grouped by prompt so the
+            # provider's prompt cache gets hits; results arrive as they complete
+            for result in openai_api.iter_generate(
+                iter_requests(specs),
+                max_workers=settings["max_workers"],
+                on_delta=settings["on_delta"],
+                share_prefixes=settings["share_prefixes"],
+                group_prefixes=True,
+                cancel=self.cancel_event,
+                skip=done
+            ):
+                self.experiment_store.add_run(sweep_id, result)
+                
+                # Update UI with current result
+                self.ui_queue.put((self._add_batch_result, (result,)))
+            
+            if not self.cancel_event.is_set():
+                self.experiment_store.finish_sweep(sweep_id)
+            
+            # Report how many cells the cache saved
+            cache_after = self.response_cache.stats()
+            hits = cache_after["hits"] - cache_before["hits"]
+            misses = cache_after["misses"] - cache_before["misses"]
+            
+            # Update UI when complete (queued behind the last results)
+            self.ui_queue.put((self._batch_generation_complete, (hits, misses, len(done))))
             
         except Exception as e:
-            self.after(0, self._batch_generation_error, str(e))
+            self.ui_queue.put((self._batch_generation_error, (str(e),)))
+            
+    def _run_search(self, openai_api, settings, cache_before):
+        """Run an adaptive parameter search over the batch settings (on the batch thread)."""
+        spec = settings["spec"]
+        search = make_spec_search(openai_api, spec, settings["scorer"], settings["strategy"], settings["budget"],
+                                  max_workers=settings["max_workers"], cancel=self.cancel_event)
+        
+        # A search's requests depend on its scores, so it isn't stored as resumable
+        description = f"{settings['strategy']} search: {spec['models'][0]} / {', '.join(spec['products'])}"
+        sweep_id = self.experiment_store.create_sweep("search", description)
+        self.current_sweep_id = sweep_id
+        
+        for result in search.iter_results():
+            self.experiment_store.add_run(sweep_id, result)
+            self.ui_queue.put((self._add_batch_result, (result,)))
+        if not self.cancel_event.is_set():
+            self.experiment_store.finish_sweep(sweep_id)
+        
+        cache_after = self.response_cache.stats()
+        self.ui_queue.put((self._batch_generation_complete, (
+            cache_after["hits"] - cache_before["hits"], cache_after["misses"] - cache_before["misses"],
+            0, search.best()
+        )))
+        
+    def cancel_batch(self):
+        """Stop the running batch; the results so far are kept."""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.cancel_btn.config(state="disabled")
+        self.batch_btn["text"] = "Cancelling..."
+        
+    def _on_batch_delta(self, index, request, delta):
+        # Called from worker threads; hand the delta to the UI thread
+        self.ui_queue.put((self._append_batch_delta, (index, request, delta)))
+        
+    def _drain_ui_queue(self):
+        """Apply queued worker updates in one batch, then redraw the table once."""
+        updated = False
+        try:
+            for _ in range(UI_DRAIN_BATCH_SIZE):
+                handler, args = self.ui_queue.get_nowait()
+                handler(*args)
+                updated = True
+        except queue.Empty:
+            pass
+            
+        if updated:
+            self._render_table()
+        self.after(UI_DRAIN_INTERVAL_MS, self._drain_ui_queue)
+        
+    def _append_batch_delta(self, index, request, delta):
+        # Show a streaming cell as a partial result until its final result arrives
+        if self.batch_results is not None and index in self.batch_results:
+            return
+        partial = self.streaming_results.get(index)
+        if partial is None:
+            partial = {
+                "index": index,
+                "system_prompt": request["system_prompt"],
+                "user_prompt": request["user_prompt"],
+                "product": request["product"],
+                "parameters": {key: request[key] for key in
+                               ("temperature", "max_tokens", "presence_penalty", "frequency_penalty")},
+                "response": ""
+            }
+            self.streaming_results[index] = partial
+            self.table_order.append(index)
+            self.table_rows_dirty = True
             
+        partial["response"] += delta
+        
     def _add_batch_result(self, result):
-        # Add result to treeview
+        # Rows are keyed by grid index so they keep their coordinates;
+        # a streamed row already exists and just gets its final result
+        index = result["index"]
+        if self.streaming_results.pop(index, None) is None and (
+                self.batch_results is None or index not in self.batch_results):
+            self.table_order.append(index)
+            
+        if self.batch_results is None:
+            from result_table import ResultTable
+            self.batch_results = ResultTable()
+        self.batch_results.append(result)
+        self.table_rows_dirty = True
+        
+        if self.analytics is None:
+            from output_analytics import OutputAnalytics
+            from near_duplicates import MinHashIndex
+            self.analytics = OutputAnalytics()
+            self.duplicates = MinHashIndex()
+        self.analytics.add_result(result)
+        if "error" not in result and result.get("response") is not None:
+            self.duplicates.add(index, result["response"])
+        
+    def _cell_result(self, index):
+        """Return a cell's result dictionary (partial while it is streaming)."""
+        partial = self.streaming_results.get(index)
+        if partial is not None or self.batch_results is None:
+            return partial
+        return self.batch_results.result_for(index)
+        
+    def _clear_batch_results(self):
+        self.batch_results = None
+        self.streaming_results = {}
+        self.table_order = []
+        self.table_rows = []
+        self.table_start = 0
+        self.table_selection = None
+        self.prompt_labels = {"system": {}, "user": {}}
+        self.analytics = None
+        self.duplicates = None
+        self._render_table()
+        
+    @staticmethod
+    def _preview(text):
+        """Shorten an output to a single-line preview for the results table."""
+        text = " ".join(text.split())
+        if len(text) > PREVIEW_LENGTH:
+            text = text[:PREVIEW_LENGTH - 3] + "..."
+        return text
+        
+    def _prompt_label(self, result):
+        """Label a result's prompt variants as e.g. "S1 U2", numbered in order of appearance."""
+        parts = []
+        for kind, letter in (("system", "S"), ("user", "U")):
+            labels = self.prompt_labels[kind]
+            prompt = result.get(f"{kind}_prompt") or ""
+            if prompt not in labels:
+                labels[prompt] = len(labels) + 1
+            parts.append(f"{letter}{labels[prompt]}")
+        return " ".join(parts)
+        
+    def _table_row_values(self, index, sample):
+        """Build the (text, values) of one table row from its stored result."""
+        result = self._cell_result(index)
         params = result["parameters"]
+        samples = result.get("responses", [])
         
         if "error" in result:
             output = f"Error: {result['error']}"
+        elif sample:
+            output = samples[sample - 1]
         else:
             output = result["response"]
             
-        self.results_tree.insert("", tk.END, values=(
+        if sample:
+            text = f"#{sample}"
+        elif "derived_from" in result:
+            text = "derived"
+        elif samples:
+            text = f"{len(samples)} samples"
+        else:
+            text = ""
+            
+        # Analytics cover each cell's main response
+        metrics = self.analytics.metrics_for(index) if self.analytics is not None and not sample else None
+        if metrics is None:
+            analytics = ("",) * len(ANALYTICS_COLUMNS)
+        else:
+            analytics = (int(metrics["words"]), int(metrics["tokens"]), f"{metrics['diversity']:.2f}",
+                         f"{metrics['repetition']:.2f}", f"{metrics['similarity']:.2f}",
+                         f"{metrics['overlap']:.2f}")
+            
+        # Number of other outputs in the cell's near-duplicate cluster
+        duplicates = ""
+        if self.duplicates is not None and not sample:
+            _, size = self.duplicates.cluster_of(index)
+            duplicates = size - 1 if size > 1 else ""
+            
+        return text, (
+            result.get("product") or "",
+            self._prompt_label(result),
             f"{params['temperature']:.1f}",
             params['max_tokens'],
             f"{params['presence_penalty']:.1f}",
             f"{params['frequency_penalty']:.1f}",
-            output
-        ))
+            f"{result['score']:.2f}" if "score" in result and not sample else "",
+            *analytics,
+            duplicates,
+            self._preview(output)
+        )
+        
+    def _render_table(self):
+        """Render only the rows currently in view."""
+        if self.table_rows_dirty:
+            # Each cell's sibling samples follow directly underneath it
+            self.table_rows = []
+            for index in self._sorted_table_order():
+                self.table_rows.append((index, 0))
+                row = self.batch_results.row_of(index) if self.batch_results is not None else None
+                samples = self.batch_results.sample_count(row) if row is not None else 0
+                self.table_rows.extend((index, number) for number in range(1, samples + 1))
+            self.table_rows_dirty = False
+            
+        visible = self.table_visible = self._visible_rows()
+        total = len(self.table_rows)
+        self.table_start = max(0, min(self.table_start, total - visible))
+        
+        # Replace the rendered rows, keeping the selected row selected if in view
+        self.results_tree.delete(*self.results_tree.get_children())
+        for index, sample in self.table_rows[self.table_start:self.table_start + visible]:
+            iid = f"{index}:{sample}" if sample else str(index)
+            text, values = self._table_row_values(index, sample)
+            self.results_tree.insert("", tk.END, iid=iid, text=text, values=values)
+            
+        if self.table_selection and self.results_tree.exists(self.table_selection):
+            self.results_tree.selection_set(self.table_selection)
         
-    def _batch_generation_complete(self):
+        if total > visible:
+            self.tree_scroll.set(self.table_start / total, (self.table_start + visible) / total)
+        else:
+            self.tree_scroll.set(0.0, 1.0)
+        
+    def _sort_table(self, column):
+        """Sort the table by a column; sorting by the same column again reverses the order."""
+        descending = self.table_sort == (column, False)
+        self.table_sort = (column, descending)
+        for name, heading in self.tree_headings.items():
+            arrow = (" \u25bc" if descending else " \u25b2") if name == column else ""
+            self.results_tree.heading(name, text=heading + arrow)
+            
+        self.table_start = 0
+        self.table_rows_dirty = True
+        self._render_table()
+        
+    def _sorted_table_order(self):
+        """Return the table's cell indexes in the current sort order (arrival order if unsorted)."""
+        if self.table_sort is None:
+            return self.table_order
+        column, descending = self.table_sort
+        
+        if column in ANALYTICS_COLUMNS:
+            if self.analytics is None:
+                return self.table_order
+            return self.analytics.sort_indices(ANALYTICS_COLUMNS[column], self.table_order, descending)
+            
+        # Parameters, scores and products are sorted on the stored columns
+        stored = {"temp": "temperature", "tokens": "max_tokens", "presence": "presence_penalty",
+                  "frequency": "frequency_penalty", "score": "score", "product": "product"}.get(column)
+        if stored:
+            if self.batch_results is None:
+                return self.table_order
+            return self.batch_results.sort_indices(stored, self.table_order, descending)
+        
+        def key(index):
+            result = self._cell_result(index)
+            if column == "prompt":
+                return self._prompt_label(result)
+            if column == "duplicates":
+                # Largest clusters first when descending, each cluster's rows together
+                root, size = self.duplicates.cluster_of(index) if self.duplicates is not None else (None, 0)
+                return size, -1 if root is None else root
+            if column == "output":
+                return result.get("response") or result.get("error") or ""
+            return result.get(column) or ""
+        
+        return sorted(self.table_order, key=key, reverse=descending)
+        
+    def _scroll_table(self, action, amount, unit=None):
+        """Scrollbar command for the virtual table."""
+        visible = self._visible_rows()
+        if action == "moveto":
+            self.table_start = int(float(amount) * len(self.table_rows))
+        elif action == "scroll":
+            step = visible if unit == "pages" else 1
+            self.table_start += int(amount) * step
+        self._render_table()
+        
+    def _visible_rows(self):
+        """Return how many table rows fit in the table's current height."""
+        height = self.results_tree.winfo_height()
+        if height <= 1:
+            # Not laid out yet
+            return int(self.results_tree.cget("height"))
+            
+        # Rows start below the headings; a rendered row shows where
+        children = self.results_tree.get_children()
+        bbox = self.results_tree.bbox(children[0]) if children else ""
+        top = bbox[1] if bbox else 0
+        return max(1, (height - top) // TABLE_ROW_HEIGHT)
+        
+    def _on_table_configure(self, event):
+        # Resizing the window changes how many rows fit
+        if self._visible_rows() != self.table_visible:
+            self._render_table()
+        
+    def _on_table_wheel(self, event):
+        self._scroll_table("scroll", -1 if event.delta > 0 else 1, "units")
+        
+    def _on_table_select(self, event):
+        selection = self.results_tree.selection()
+        if selection:
+            self.table_selection = selection[0]
+        elif self.table_selection and self.results_tree.exists(self.table_selection):
+            # Deselected by the user (rows scrolled out of view keep their selection)
+            self.table_selection = None
+        
+    def _batch_generation_complete(self, cache_hits=0, cache_misses=0, restored=0, best=None):
         # Update UI
         self.result_text.delete("1.0", tk.END)
-        self.result_text.insert(tk.END, "Batch generation complete. See results in the table below.")
-        
-        # Reset button
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self.result_text.insert(tk.END, "Batch generation cancelled. Results so far are in the table below.")
+        else:
+            self.result_text.insert(tk.END, "Batch generation complete. See results in the table below.")
+        if restored:
+            self.result_text.insert(tk.END, f"\nResumed sweep: {restored} cells restored from earlier runs.")
+        if best and best[0] is not None:
+            config, score = best
+            settings = ", ".join(f"{name} {value}" for name, value in config.items())
+            self.result_text.insert(tk.END, f"\nBest configuration (score {score:.2f}): {settings}.")
+        if cache_hits or cache_misses:
+            self.result_text.insert(tk.END, f"\nResponse cache: {cache_hits} hits, {cache_misses} misses.")
+        self.result_text.insert(tk.END, f"\n{self._sweep_summary()}")
+        
+        # Reset buttons
         self.batch_btn.config(state="normal")
         self.batch_btn["text"] = "Batch Generate"
+        self.cancel_btn.config(state="disabled")
         
         # Focus on results
         self.results_tree.focus_set()
         
+    def _sweep_summary(self):
+        """Summarise the latency, throughput and cost of the last batch."""
+        import numpy as np
+        from result_table import ResultTable
+        
+        # A re-run cell appends a new row; only its latest result counts
+        results = self.batch_results if self.batch_results is not None else ResultTable()
+        latest = results.latest()
+        latencies = [latency for latency in results.column("latency")[latest] if latency == latency]
+        elapsed = time.perf_counter() - self.batch_started_at
+        cost = float(np.nansum(results.column("cost")[latest]))
+        prompt_tokens = results.column("prompt_tokens")[latest]
+        completion_tokens = results.column("completion_tokens")[latest]
+        tokens = int(prompt_tokens[prompt_tokens > 0].sum() + completion_tokens[completion_tokens > 0].sum())
+        cached_tokens = results.column("cached_tokens")[latest]
+        cached = int(cached_tokens[cached_tokens > 0].sum())
+        cells = int(latest.sum())
+        
+        summary = f"{cells} cells in {elapsed:.1f}s ({cells / elapsed:.1f}/s)"
+        if latencies:
+            summary += f", latency p50 {percentile(latencies, 50):.2f}s, p95 {percentile(latencies, 95):.2f}s"
+        summary += f", {tokens} tokens"
+        if cached:
+            summary += f" ({cached} prompt tokens cached)"
+        hedged = int(results.column("hedged")[latest].sum())
+        if hedged:
+            summary += f", {hedged} hedged"
+        return summary + f", estimated cost ${cost:.4f}."
+        
     def _batch_generation_error(self, error_msg):
         # Update UI
         self.result_text.delete("1.0", tk.END)
         self.result_text.insert(tk.END, f"Error in batch generation: {error_msg}")
         
-        # Reset button
+        # Reset buttons
         self.batch_btn.config(state="normal")
         self.batch_btn["text"] = "Batch Generate"
+        self.cancel_btn.config(state="disabled")
+        
+    def export_results(self):
+        """Save the batch results as Parquet, an Arrow (Feather) file or JSON Lines."""
+        if self.batch_results is None or not len(self.batch_results):
+            messagebox.showerror("Error", "There are no batch results to export")
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=".parquet",
+            filetypes=[("Parquet", "*.parquet"), ("Arrow", "*.arrow"), ("JSON Lines", "*.jsonl")]
+        )
+        if not path:
+            return
+        try:
+            if path.endswith(".jsonl"):
+                with open(path, "w") as f:
+                    for result in self.batch_results:
+                        f.write(json.dumps(result) + "\n")
+            elif path.endswith((".arrow", ".feather")):
+                self.batch_results.to_feather(path)
+            else:
+                self.batch_results.to_parquet(path)
+        except (OSError, ImportError) as e:
+            messagebox.showerror("Error", f"Failed to export results: {str(e)}")
         
     def view_full_output(self, event):
         """Display the full output text when a row is double-clicked."""
         # Get the selected item
-        item = self.results_tree.selection()[0]
-        if not item:
+        selection = self.results_tree.selection()
+        if not selection:
             return
-            
-        # Get the values from the selected item
-        values = self.results_tree.item(item, 'values')
-        if not values or len(values) < 5:
+        item = selection[0]
+        
+        # Rows are "<grid index>" for a cell and "<grid index>:<n>" for its samples
+        index, _, sample = item.partition(":")
+        result = self._cell_result(int(index))
+        if result is None:
             return
+        params = result["parameters"]
             
-        # Get the output text
-        output_text = values[4]
+        # Get the output text: one sample, or every sample of the cell
+        if "error" in result:
+            output_text = f"Error: {result['error']}"
+        elif sample:
+            output_text = result["responses"][int(sample) - 1]
+        else:
+            output_text = self._format_samples(result.get("responses", result["response"]))
         
         # Create a new window to display the full output
         output_window = tk.Toplevel(self)
@@ -502,10 +1350,23 @@ class PromptPlayground(tk.Tk):
         params_frame = ttk.Frame(output_window)
         params_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        ttk.Label(params_frame, text=f"Temperature: {values[0]}").pack(side=tk.LEFT, padx=5)
-        ttk.Label(params_frame, text=f"Max Tokens: {values[1]}").pack(side=tk.LEFT, padx=5)
-        ttk.Label(params_frame, text=f"Presence Penalty: {values[2]}").pack(side=tk.LEFT, padx=5)
-        ttk.Label(params_frame, text=f"Frequency Penalty: {values[3]}").pack(side=tk.LEFT, padx=5)
+        if result.get("product"):
+            ttk.Label(params_frame, text=f"Product: {result['product']}").pack(side=tk.LEFT, padx=5)
+            ttk.Label(params_frame, text=f"Prompt: {self._prompt_label(result)}").pack(side=tk.LEFT, padx=5)
+        ttk.Label(params_frame, text=f"Temperature: {params['temperature']:.1f}").pack(side=tk.LEFT, padx=5)
+        ttk.Label(params_frame, text=f"Max Tokens: {params['max_tokens']}").pack(side=tk.LEFT, padx=5)
+        ttk.Label(params_frame, text=f"Presence Penalty: {params['presence_penalty']:.1f}").pack(side=tk.LEFT, padx=5)
+        ttk.Label(params_frame, text=f"Frequency Penalty: {params['frequency_penalty']:.1f}").pack(side=tk.LEFT, padx=5)
+        if sample:
+            ttk.Label(params_frame, text=f"Sample: {sample}").pack(side=tk.LEFT, padx=5)
+        if "derived_from" in result:
+            derived_text = f"Derived from Max Tokens {result['derived_from']['max_tokens']} (not generated separately)"
+            ttk.Label(output_window, text=derived_text).pack(fill=tk.X, padx=15)
+        usage_summary = self._format_usage(result)
+        if "latency" in result:
+            usage_summary = f"Latency: {result['latency']:.2f}s" + (f", {usage_summary}" if usage_summary else "")
+        if usage_summary:
+            ttk.Label(output_window, text=usage_summary).pack(fill=tk.X, padx=15)
         
         # Add text area for output
         output_text_area = scrolledtext.ScrolledText(output_window, wrap=tk.WORD)
@@ -516,6 +1377,233 @@ class PromptPlayground(tk.Tk):
         # Add close button
         ttk.Button(output_window, text="Close", command=output_window.destroy).pack(pady=10)
     
+    def open_history(self):
+        """Open a window for browsing and loading past runs."""
+        history_window = tk.Toplevel(self)
+        history_window.title("History")
+        history_window.geometry("780x450")
+        
+        # Past sweeps, fetched a page at a time
+        sweeps_tree = ttk.Treeview(history_window,
+                                   columns=("id", "created", "kind", "description", "status", "runs", "errors"),
+                                   show="headings", height=10)
+        for column, heading, width in (("id", "Sweep", 60), ("created", "Created", 140), ("kind", "Kind", 60),
+                                       ("description", "Description", 250), ("status", "Status", 80),
+                                       ("runs", "Runs", 60), ("errors", "Errors", 60)):
+            sweeps_tree.heading(column, text=heading)
+            sweeps_tree.column(column, width=width, anchor=tk.W if column == "description" else tk.CENTER)
+        sweeps_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        
+        def load_more_sweeps():
+            offset = len(sweeps_tree.get_children())
+            for sweep in self.experiment_store.list_sweeps(limit=50, offset=offset):
+                created = time.strftime("%Y-%m-%d %H:%M", time.localtime(sweep["created_at"]))
+                status = "finished" if sweep["finished_at"] else "unfinished" if sweep["resumable"] else ""
+                sweeps_tree.insert("", tk.END, iid=str(sweep["id"]), values=(
+                    sweep["id"], created, sweep["kind"], sweep["description"] or "", status,
+                    sweep["runs"], sweep["errors"]
+                ))
+        
+        def load_selected_sweep(event=None):
+            selection = sweeps_tree.selection()
+            if selection:
+                self.current_sweep_id = int(selection[0])
+                self._load_history({"sweep_id": self.current_sweep_id})
+                history_window.destroy()
+        
+        def resume_selected_sweep():
+            selection = sweeps_tree.selection()
+            if not selection:
+                return
+            if str(self.batch_btn["state"]) == "disabled":
+                messagebox.showerror("Error", "Wait for the running batch to finish", parent=history_window)
+                return
+            history_window.destroy()
+            self.resume_sweep(int(selection[0]))
+        
+        sweeps_tree.bind("<Double-1>", load_selected_sweep)
+        load_more_sweeps()
+        
+        # Filtered search across all runs
+        filter_frame = ttk.Frame(history_window)
+        filter_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        model_var = tk.StringVar()
+        product_var = tk.StringVar()
+        presence_var = tk.StringVar()
+        ttk.Label(filter_frame, text="Model:").pack(side=tk.LEFT)
+        ttk.Combobox(filter_frame, textvariable=model_var, values=("", "gpt-3.5-turbo", "gpt-4"),
+                     width=14).pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(filter_frame, text="Product:").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=product_var, width=14).pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(filter_frame, text="Presence Penalty \u2265").pack(side=tk.LEFT)
+        ttk.Entry(filter_frame, textvariable=presence_var, width=5).pack(side=tk.LEFT, padx=(2, 8))
+        
+        def load_filtered_runs():
+            filters = {}
+            if model_var.get():
+                filters["model"] = model_var.get()
+            if product_var.get():
+                filters["product"] = product_var.get()
+            if presence_var.get():
+                try:
+                    filters["presence_penalty"] = (">=", float(presence_var.get()))
+                except ValueError:
+                    messagebox.showerror("Error", "Presence penalty must be a number", parent=history_window)
+                    return
+            self.current_sweep_id = None
+            self._load_history(filters)
+            history_window.destroy()
+        
+        ttk.Button(filter_frame, text="Show Runs", command=load_filtered_runs).pack(side=tk.LEFT)
+        
+        def import_results():
+            paths = filedialog.askopenfilenames(
+                parent=history_window,
+                filetypes=[("JSON Lines", "*.jsonl"), ("All files", "*")]
+            )
+            if paths:
+                history_window.destroy()
+                self._import_results(paths)
+        
+        # Buttons
+        buttons_frame = ttk.Frame(history_window)
+        buttons_frame.pack(fill=tk.X, padx=10, pady=(5, 10))
+        ttk.Button(buttons_frame, text="Load Sweep", command=load_selected_sweep).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Resume Sweep", command=resume_selected_sweep).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(buttons_frame, text="More", command=load_more_sweeps).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Import Results", command=import_results).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Close", command=history_window.destroy).pack(side=tk.RIGHT)
+    
+    def _load_history(self, filters):
+        """Load stored runs into the results table in the background."""
+        self._clear_batch_results()
+        self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, "Loading runs from history...")
+        
+        def load():
+            try:
+                # Runs from different sweeps can share grid indexes, so
+                # loaded rows are numbered in load order instead
+                for position, result in enumerate(self.experiment_store.iter_runs(filters)):
+                    result["index"] = position
+                    self.ui_queue.put((self._add_batch_result, (result,)))
+                self.ui_queue.put((self._history_loaded, ()))
+            except Exception as e:
+                self.ui_queue.put((self._batch_generation_error, (str(e),)))
+        
+        threading.Thread(target=load, daemon=True).start()
+    
+    def _history_loaded(self):
+        self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, f"Loaded {len(self.table_order)} runs from history.")
+    
+    def _import_results(self, paths):
+        """
+        Merge result files written by sharded headless sweeps (see sharding.py)
+        into a new sweep in the experiment store and show it in the table.
+        """
+        self._clear_batch_results()
+        self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, f"Importing {len(paths)} result files...")
+        
+        def load():
+            try:
+                results, stats = merge_results(iter_result_files(paths))
+                description = ", ".join(os.path.basename(path) for path in paths)
+                sweep_id = self.experiment_store.create_sweep("import", description)
+                self.experiment_store.add_runs(sweep_id, results)
+                self.experiment_store.finish_sweep(sweep_id)
+                self.current_sweep_id = sweep_id
+                for result in results:
+                    self.ui_queue.put((self._add_batch_result, (result,)))
+                self.ui_queue.put((self._results_imported, (format_merge_summary(stats, len(results)),)))
+            except Exception as e:
+                self.ui_queue.put((self._batch_generation_error, (str(e),)))
+        
+        threading.Thread(target=load, daemon=True).start()
+    
+    def _results_imported(self, summary):
+        self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, f"Imported sweep {self.current_sweep_id}: {summary}.")
+    
+    def open_stats(self):
+        """Open a window with per-model call statistics, refreshed while it is open."""
+        stats_window = tk.Toplevel(self)
+        stats_window.title("Stats")
+        stats_window.geometry("1000x300")
+        
+        columns = (("model", "Model", 140), ("calls", "Calls", 60), ("errors", "Errors", 60),
+                   ("cached", "Cached", 60), ("p50", "p50 Latency", 90), ("p95", "p95 Latency", 90),
+                   ("ttfb", "p95 TTFB", 80), ("queue", "p95 Queue", 80), ("throughput", "Calls/s", 70),
+                   ("tokens", "Tokens", 80), ("cached_tokens", "Cached Tokens", 90), ("cost", "Cost", 80))
+        stats_tree = ttk.Treeview(stats_window, columns=[column[0] for column in columns],
+                                  show="headings", height=8)
+        for column, heading, width in columns:
+            stats_tree.heading(column, text=heading)
+            stats_tree.column(column, width=width, anchor=tk.W if column == "model" else tk.CENTER)
+        stats_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        
+        connections_var = tk.StringVar()
+        ttk.Label(stats_window, textvariable=connections_var).pack(anchor=tk.W, padx=10)
+        backends_var = tk.StringVar()
+        ttk.Label(stats_window, textvariable=backends_var, justify=tk.LEFT).pack(anchor=tk.W, padx=10)
+        
+        def seconds(summary, key):
+            return f"{summary[key]:.2f}s" if summary[key] is not None else "-"
+        
+        def refresh():
+            if not stats_window.winfo_exists():
+                return
+            stats_tree.delete(*stats_tree.get_children())
+            for model, stats in sorted(self.metrics.snapshot().items()):
+                stats_tree.insert("", tk.END, values=(
+                    model, stats["calls"], stats["errors"], stats["cache_hits"],
+                    seconds(stats["latency"], "p50"), seconds(stats["latency"], "p95"),
+                    seconds(stats["time_to_first_byte"], "p95"), seconds(stats["queue_wait"], "p95"),
+                    f"{stats['throughput']:.1f}", stats["prompt_tokens"] + stats["completion_tokens"],
+                    stats["cached_tokens"], f"${stats['cost']:.4f}"
+                ))
+            
+            pool = get_pool().stats()
+            connections_var.set(
+                f"Connections: {pool['open'] if pool['open'] is not None else '-'} open"
+                f" (max {pool['max_connections']}), {pool['opened']} opened, {pool['reused']} reused,"
+                f" {pool['waited']} requests waited {pool['wait_time']:.2f}s"
+            )
+            if self.backends is not None:
+                backends_var.set("\n".join(
+                    f"{backend['name']}: {backend['state']}, {backend['calls']} calls, {backend['errors']} errors,"
+                    f" {backend['in_flight']} in flight"
+                    + (f", latency {backend['latency']:.2f}s" if backend["latency"] is not None else "")
+                    for backend in self.backends.stats()
+                ))
+            stats_window.after(STATS_REFRESH_MS, refresh)
+        
+        def export(prometheus):
+            path = filedialog.asksaveasfilename(
+                parent=stats_window,
+                defaultextension=".prom" if prometheus else ".json",
+                filetypes=[("Prometheus text", "*.prom")] if prometheus else [("JSON", "*.json")]
+            )
+            if not path:
+                return
+            try:
+                with open(path, "w") as f:
+                    f.write(self.metrics.to_prometheus() if prometheus else self.metrics.to_json())
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to export stats: {str(e)}", parent=stats_window)
+        
+        # Buttons
+        buttons_frame = ttk.Frame(stats_window)
+        buttons_frame.pack(fill=tk.X, padx=10, pady=(5, 10))
+        ttk.Button(buttons_frame, text="Export JSON", command=lambda: export(False)).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Export Prometheus", command=lambda: export(True)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Reset", command=self.metrics.reset).pack(side=tk.LEFT)
+        ttk.Button(buttons_frame, text="Close", command=stats_window.destroy).pack(side=tk.RIGHT)
+        
+        refresh()
+    
     def save_reflection(self):
         reflection = self.reflection_text.get("1.0", tk.END).strip()
         
@@ -523,11 +1611,13 @@ class PromptPlayground(tk.Tk):
             messagebox.showerror("Error", "Please enter your reflection")
             return
             
-        # Here you could save the reflection to a file
+        # Save the reflection, linked to the sweep currently shown
         try:
-            with open("reflection.txt", "w") as f:
-                f.write(reflection)
-            messagebox.showinfo("Success", "Reflection saved to reflection.txt")
+            self.experiment_store.add_reflection(reflection, sweep_id=self.current_sweep_id)
+            if self.current_sweep_id is not None:
+                messagebox.showinfo("Success", f"Reflection saved for sweep {self.current_sweep_id}")
+            else:
+                messagebox.showinfo("Success", "Reflection saved")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save reflection: {str(e)}")
 
@@ -0,0 +1,241 @@
+import os
+import time
+import random
+import asyncio
+import threading
+
+
+def estimate_tokens(request):
+    """
+    Roughly estimate the tokens a chat completions request will consume.
+
+    Uses the common ~4 characters per token heuristic for the prompt and
+    assumes the completion may use all of max_tokens for every choice.
+
+    Args:
+        request (dict): Keyword arguments for client.chat.completions.create
+
+    Returns:
+        int: Estimated prompt plus completion tokens
+    """
+    prompt_chars = sum(len(message["content"]) for message in request.get("messages", []))
+    completion_tokens = (request.get("max_tokens") or 0) * request.get("n", 1)
+    return prompt_chars // 4 + completion_tokens
+
+
+class TokenBucket:
+    """
+    A token bucket refilled continuously at a per-minute rate.
+
+    Reservations are granted immediately and may drive the bucket into debt;
+    the caller is told how long to wait before its reservation is covered.
+    This keeps callers in FIFO order without holding a lock while sleeping.
+    """
+
+    def __init__(self, per_minute):
+        """
+        Args:
+            per_minute (float): Sustained rate, which is also the burst capacity
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount, now):
+        """
+        Take amount from the bucket.
+
+        Args:
+            amount (float): Units to reserve (clamped to the bucket capacity)
+            now (float): Current time.monotonic() value
+
+        Returns:
+            float: Seconds to wait before the reservation is covered
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+    def delay(self, amount, now):
+        """Return the seconds a reservation of amount would wait, without making it."""
+        tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        return max(0.0, (min(amount, self.capacity) - tokens) / self.rate)
+
+    def refund(self, amount):
+        """Return unused units to the bucket."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """
+    Client-side requests-per-minute and tokens-per-minute limiter.
+
+    One instance is meant to be shared by every thread and task issuing
+    requests against the same account, so that together they stay under the
+    quota. A 429 response can pause all callers via pause().
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        """
+        Args:
+            requests_per_minute (float): RPM limit, or None for no limit
+            tokens_per_minute (float): TPM limit, or None for no limit
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create a limiter from OPENAI_RPM_LIMIT / OPENAI_TPM_LIMIT.
+
+        Returns:
+            RateLimiter: The limiter, or None if neither variable is set
+        """
+        rpm = os.getenv("OPENAI_RPM_LIMIT")
+        tpm = os.getenv("OPENAI_TPM_LIMIT")
+        if not rpm and not tpm:
+            return None
+        return cls(float(rpm) if rpm else None, float(tpm) if tpm else None)
+
+    def reserve(self, tokens=0):
+        """
+        Reserve capacity for one request.
+
+        Args:
+            tokens (int): Estimated tokens the request will consume
+
+        Returns:
+            float: Seconds the caller must wait before sending the request
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            return wait
+
+    def delay(self, tokens=0):
+        """Return the seconds a request would wait if reserved now, without reserving it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.delay(1, now))
+            if self.tokens is not None and tokens:
+                wait = max(wait, self.tokens.delay(tokens, now))
+            return wait
+
+    def acquire(self, tokens=0):
+        """Block the calling thread until a request may be sent."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=0):
+        """Wait, without blocking the event loop, until a request may be sent."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def refund(self, tokens, requests=0):
+        """Give back tokens (and requests, for one that was never sent) reserved but not used."""
+        with self._lock:
+            if self.tokens is not None and tokens > 0:
+                self.tokens.refund(tokens)
+            if self.requests is not None and requests > 0:
+                self.requests.refund(requests)
+
+    def pause(self, seconds):
+        """Hold back every caller for the given number of seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RetryPolicy:
+    """
+    Decides whether and when to retry a failed API call.
+
+    Rate limits (429), server errors (5xx), timeouts and connection errors are
+    retried with jittered exponential backoff. A Retry-After header on the
+    response takes precedence over the computed backoff.
+    """
+
+    def __init__(self, max_retries=5, base_delay=1.0, max_delay=60.0):
+        """
+        Args:
+            max_retries (int): Maximum number of retries per call
+            base_delay (float): Backoff for the first retry in seconds
+            max_delay (float): Upper bound for any single backoff
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def is_retryable(error):
+        """Return True if the error is worth retrying."""
+        # Imported here so importing this module doesn't pull in the SDK
+        import openai
+
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code >= 500
+        return False
+
+    @staticmethod
+    def is_rate_limit(error):
+        """Return True if the error is a rate limit (429) response."""
+        return getattr(error, "status_code", None) == 429
+
+    @staticmethod
+    def retry_after(error):
+        """
+        Read the server's requested delay from an error response.
+
+        Returns:
+            float: Seconds to wait, or None if the server did not say
+        """
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+
+        headers = response.headers
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000.0
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except ValueError:
+            # HTTP-date values are rare for this API; fall back to backoff
+            return None
+        return None
+
+    def delay_for(self, attempt, error):
+        """
+        Compute the delay before retrying.
+
+        Args:
+            attempt (int): Zero-based number of the attempt that just failed
+            error (Exception): The error it failed with
+
+        Returns:
+            float: Seconds to wait before retrying, or None to give up
+        """
+        if attempt >= self.max_retries or not self.is_retryable(error):
+            return None
+
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            # Small jitter so callers paused together don't retry in lockstep
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay / 4)
+
+        # Full jitter: uniform between zero and the exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
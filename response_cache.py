@@ -0,0 +1,198 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+# Default location of the on-disk cache
+DEFAULT_CACHE_PATH = "response_cache.sqlite3"
+
+
+class ResponseCache:
+    """
+    A persistent, size-bounded cache of API responses stored in SQLite.
+
+    Entries are keyed on a hash of the full request (model, messages and
+    sampling parameters). The cache evicts expired entries (TTL) and the least
+    recently used entries once it grows past its entry or byte limit. It is
+    safe to share one instance between threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=10000,
+                 max_bytes=50 * 1024 * 1024, ttl=7 * 24 * 3600, max_temperature=0.0):
+        """
+        Open (or create) the cache.
+
+        Args:
+            path (str): SQLite database file (":memory:" for a throwaway cache)
+            max_entries (int): Maximum number of cached responses
+            max_bytes (int): Maximum total size of cached responses in bytes
+            ttl (float): Seconds before an entry expires (None to never expire)
+            max_temperature (float): Only requests at or below this temperature
+                are cached; None caches every temperature
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        # The TTL sweep on every put looks entries up by age
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)"
+        )
+        self._conn.commit()
+
+        # Running totals so eviction checks don't need a table scan
+        self._entries, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+    @staticmethod
+    def make_key(request):
+        """
+        Hash a request into a cache key.
+
+        Args:
+            request (dict): The complete request sent to the API
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        encoded = json.dumps(request, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, temperature):
+        """Return True if requests at this temperature may use the cache."""
+        return self.max_temperature is None or temperature <= self.max_temperature
+
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Args:
+            key (str): Cache key from make_key()
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            # Expired entries count as misses and are dropped
+            if row and self.ttl is not None and now - row[2] > self.ttl:
+                self._delete(key, row[1])
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """
+        Store a value, evicting old entries if the cache is over its limits.
+
+        Args:
+            key (str): Cache key from make_key()
+            value: JSON-serialisable value to cache
+        """
+        encoded = json.dumps(value)
+        size = len(encoded.encode("utf-8"))
+        now = time.time()
+
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if existing:
+                self._delete(key, existing[0])
+
+            self._conn.execute(
+                "INSERT INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, size, now, now)
+            )
+            self._entries += 1
+            self._bytes += size
+
+            self._evict(now)
+            self._conn.commit()
+
+    def _delete(self, key, size):
+        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._entries -= 1
+        self._bytes -= size
+
+    def _evict(self, now):
+        # Drop expired entries first
+        if self.ttl is not None:
+            expired = self._conn.execute(
+                "SELECT key, size FROM responses WHERE created_at < ?", (now - self.ttl,)
+            ).fetchall()
+            for key, size in expired:
+                self._delete(key, size)
+
+        # Then least recently used entries until we are back under the limits
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            oldest = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                self._delete(key, size)
+                if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """
+        Report cache usage.
+
+        Returns:
+            dict: "hits", "misses", "entries" and "bytes"
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": self._entries,
+                "bytes": self._bytes
+            }
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._entries = 0
+            self._bytes = 0
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
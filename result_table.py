@@ -0,0 +1,496 @@
+"""
+Compact columnar storage for sweep results.
+
+A result dictionary (see openai_wrapper.make_result) repeats its keys, its
+"parameters" dictionary and its prompt strings for every cell, which adds
+up for sweeps of tens of thousands of cells. ResultTable keeps the same
+information column by column instead:
+
+    numbers    One NumPy array per parameter and metric (NaN, or -1 for
+               counts, where a value is unknown)
+    strings    Models, prompts, products, finish reasons, backends and
+               error messages are interned: the column holds int32 codes
+               into a list of the distinct values
+    text       Every response is appended to one UTF-8 buffer addressed by
+               offsets, and extra samples to a second one
+
+That is the memory layout of an Arrow table (strings become dictionary
+arrays), so to_arrow() wraps the buffers without copying them and the
+result loads straight into pandas or polars; to_parquet() writes it out.
+pyarrow is only needed for the export. Rows are turned back into result
+dictionaries on demand (result()), e.g. for the few rows the playground's
+table shows at a time.
+"""
+import numpy as np
+
+# Rows allocated up front; storage doubles whenever it fills up
+INITIAL_CAPACITY = 256
+
+# Bytes of text allocated up front per text buffer (also doubling)
+INITIAL_TEXT_CAPACITY = 64 * 1024
+
+# Columns in export order, by storage type. Parameters and token usage are
+# flattened out of their nested dictionaries; "derived_from" is split into
+# the index and max tokens of the cell a result was derived from.
+FLOAT_COLUMNS = ("temperature", "presence_penalty", "frequency_penalty", "latency",
+                 "time_to_first_token", "time_to_first_byte", "queue_wait", "cost",
+                 "similar_prompt", "score")
+INT_COLUMNS = ("index", "max_tokens", "prompt_tokens", "completion_tokens", "cached_tokens",
+               "derived_from_index", "derived_from_max_tokens")
+BOOL_COLUMNS = ("cache_hit", "hedged")
+STRING_COLUMNS = ("model", "system_prompt", "user_prompt", "product", "error",
+                  "finish_reason", "backend")
+COLUMNS = ("index", "model", "system_prompt", "user_prompt", "product", "temperature",
+           "max_tokens", "presence_penalty", "frequency_penalty", "response", "responses",
+           "error", "derived_from_index", "derived_from_max_tokens", "latency",
+           "time_to_first_token", "time_to_first_byte", "queue_wait", "prompt_tokens",
+           "completion_tokens", "cached_tokens", "cost", "finish_reason", "cache_hit",
+           "similar_prompt", "hedged", "backend", "score")
+
+PARAMETERS = ("temperature", "max_tokens", "presence_penalty", "frequency_penalty")
+TIMINGS = ("latency", "time_to_first_token", "time_to_first_byte", "queue_wait", "cost",
+           "similar_prompt", "score")
+TOKENS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+# Comparison operators accepted by rows() and filter(), as in
+# ExperimentStore.query_runs filters
+OPERATORS = {
+    "=": np.equal, "!=": np.not_equal, "<": np.less, "<=": np.less_equal,
+    ">": np.greater, ">=": np.greater_equal
+}
+
+# Fill value (meaning "unknown") and dtype of each column's array
+_MISSING = {
+    **{name: (np.nan, np.float64) for name in FLOAT_COLUMNS},
+    **{name: (-1, np.int64) for name in INT_COLUMNS},
+    **{name: (False, bool) for name in BOOL_COLUMNS},
+    **{name: (-1, np.int32) for name in STRING_COLUMNS}
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Arrow and Parquet export requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _validity(pa, valid):
+    """Arrow validity bitmap for a boolean mask (None when every value is valid)."""
+    if valid.all():
+        return None, 0
+    return pa.py_buffer(np.packbits(valid, bitorder="little")), int(len(valid) - valid.sum())
+
+
+class _TextColumn:
+    """Strings stored back to back in one UTF-8 buffer, Arrow large_string style."""
+
+    def __init__(self, capacity=INITIAL_CAPACITY, text_capacity=INITIAL_TEXT_CAPACITY):
+        self.offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.data = np.zeros(text_capacity, dtype=np.uint8)
+        self.size = 0
+
+    def append(self, text):
+        encoded = text.encode("utf-8")
+        start = self.offsets[self.size]
+        end = start + len(encoded)
+        if self.size + 1 == len(self.offsets):
+            self.offsets = np.concatenate([self.offsets, np.zeros(len(self.offsets), dtype=np.int64)])
+        if end > len(self.data):
+            # A fresh array, so buffers already exported keep their contents
+            data = np.zeros(max(2 * len(self.data), end), dtype=np.uint8)
+            data[:start] = self.data[:start]
+            self.data = data
+        self.data[start:end] = np.frombuffer(encoded, dtype=np.uint8)
+        self.size += 1
+        self.offsets[self.size] = end
+
+    def get(self, item):
+        return self.data[self.offsets[item]:self.offsets[item + 1]].tobytes().decode("utf-8")
+
+    def take(self, items):
+        """Copy the given strings, in order, into a new column."""
+        items = np.asarray(items, dtype=np.int64)
+        starts = self.offsets[items]
+        lengths = self.offsets[items + 1] - starts
+        column = _TextColumn(capacity=max(len(items), 1), text_capacity=max(int(lengths.sum()), 1))
+        column.offsets[1:len(items) + 1] = np.cumsum(lengths)
+        # Every byte's source position, without a Python loop over the strings
+        total = int(lengths.sum())
+        sources = np.repeat(starts - column.offsets[:len(items)], lengths) + np.arange(total)
+        column.data[:total] = self.data[sources]
+        column.size = len(items)
+        return column
+
+    def to_arrow(self, pa, valid=None):
+        offsets = self.offsets[:self.size + 1]
+        bitmap, nulls = _validity(pa, valid) if valid is not None else (None, 0)
+        return pa.Array.from_buffers(pa.large_string(), self.size,
+                                     [bitmap, pa.py_buffer(offsets), pa.py_buffer(self.data[:offsets[-1]])],
+                                     null_count=nulls)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes
+
+
+class ResultTable:
+    """
+    Sweep results stored as columns.
+
+    Rows are appended in arrival order and never change; appending a result
+    for an index that is already in the table adds a row, and lookups by
+    index (row_of, result_for) return the latest one. Keys outside COLUMNS
+    (such as a streaming row's "streaming" flag) are not stored. Not
+    thread-safe: the playground only touches it from the UI thread.
+    """
+
+    def __init__(self):
+        self._size = 0
+        self._capacity = INITIAL_CAPACITY
+        self._columns = {name: np.full(INITIAL_CAPACITY, *_MISSING[name]) for name in _MISSING}
+        self._values = {name: [] for name in STRING_COLUMNS}
+        self._codes = {name: {} for name in STRING_COLUMNS}
+
+        self._responses = _TextColumn()
+        self._has_response = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        # Row i's extra samples are entries sample_offsets[i]:sample_offsets[i + 1]
+        self._samples = _TextColumn()
+        self._sample_offsets = np.zeros(INITIAL_CAPACITY + 1, dtype=np.int64)
+
+        self._rows = {}
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, index):
+        return index in self._rows
+
+    def __iter__(self):
+        for row in range(self._size):
+            yield self.result(row)
+
+    def __getitem__(self, rows):
+        """A slice (or array of row numbers) of the table, as a new ResultTable."""
+        if isinstance(rows, slice):
+            rows = np.arange(self._size)[rows]
+        return self.take(rows)
+
+    def _grow(self):
+        self._capacity = max(2 * self._capacity, INITIAL_CAPACITY)
+        for name, old in self._columns.items():
+            new = np.full(self._capacity, *_MISSING[name])
+            new[:len(old)] = old
+            self._columns[name] = new
+        has_response = np.zeros(self._capacity, dtype=bool)
+        has_response[:len(self._has_response)] = self._has_response
+        self._has_response = has_response
+        sample_offsets = np.zeros(self._capacity + 1, dtype=np.int64)
+        sample_offsets[:len(self._sample_offsets)] = self._sample_offsets
+        self._sample_offsets = sample_offsets
+
+    def _intern(self, name, value):
+        if value is None:
+            return -1
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._values[name])
+            self._values[name].append(value)
+        return code
+
+    def append(self, result):
+        """
+        Add a result dictionary as a new row.
+
+        Returns:
+            int: The row number
+        """
+        if self._size == self._capacity:
+            self._grow()
+        row = self._size
+        columns = self._columns
+
+        params = result.get("parameters") or {}
+        usage = result.get("usage") or {}
+        derived = result.get("derived_from") or {}
+        values = {key: params.get(key) for key in PARAMETERS}
+        values.update((key, result.get(key)) for key in TIMINGS)
+        values.update((key, usage.get(key)) for key in TOKENS)
+        values["index"] = result["index"]
+        values["derived_from_index"] = derived.get("index")
+        values["derived_from_max_tokens"] = derived.get("max_tokens")
+        for name, value in values.items():
+            if value is not None:
+                columns[name][row] = value
+        for name in BOOL_COLUMNS:
+            columns[name][row] = bool(result.get(name))
+        for name in STRING_COLUMNS:
+            columns[name][row] = self._intern(name, result.get(name))
+
+        response = result.get("response") if "error" not in result else None
+        self._has_response[row] = response is not None
+        self._responses.append(response or "")
+        samples = result.get("responses") or []
+        for sample in samples:
+            self._samples.append(sample)
+        self._sample_offsets[row + 1] = self._sample_offsets[row] + len(samples)
+
+        self._rows[result["index"]] = row
+        self._size += 1
+        return row
+
+    def extend(self, results):
+        """Append every result of an iterable."""
+        for result in results:
+            self.append(result)
+
+    def row_of(self, index):
+        """Return the latest row holding the result with this index, or None."""
+        return self._rows.get(index)
+
+    def result_for(self, index):
+        """Return the latest result with this index as a dictionary, or None."""
+        row = self._rows.get(index)
+        return self.result(row) if row is not None else None
+
+    def _string(self, name, row):
+        code = self._columns[name][row]
+        return self._values[name][code] if code >= 0 else None
+
+    def response(self, row):
+        """Return a row's (first) response text, or None for a failed cell."""
+        return self._responses.get(row) if self._has_response[row] else None
+
+    def samples(self, row):
+        """Return a row's samples when it asked for several, else an empty list."""
+        start, end = self._sample_offsets[row], self._sample_offsets[row + 1]
+        return [self._samples.get(item) for item in range(start, end)]
+
+    def sample_count(self, row):
+        return int(self._sample_offsets[row + 1] - self._sample_offsets[row])
+
+    def result(self, row):
+        """
+        Rebuild one row's result dictionary.
+
+        Returns:
+            dict: Result in the same shape the wrapper produces
+        """
+        columns = self._columns
+        result = {"index": int(columns["index"][row])}
+        for name in ("model", "system_prompt", "user_prompt", "product"):
+            result[name] = self._string(name, row)
+        result["parameters"] = {
+            "temperature": float(columns["temperature"][row]),
+            "max_tokens": int(columns["max_tokens"][row]),
+            "presence_penalty": float(columns["presence_penalty"][row]),
+            "frequency_penalty": float(columns["frequency_penalty"][row])
+        }
+
+        error = self._string("error", row)
+        if error is not None:
+            result["error"] = error
+        else:
+            result["response"] = self.response(row)
+        if self.sample_count(row):
+            result["responses"] = self.samples(row)
+        if columns["derived_from_index"][row] >= 0:
+            result["derived_from"] = {"index": int(columns["derived_from_index"][row]),
+                                      "max_tokens": int(columns["derived_from_max_tokens"][row])}
+
+        for name in TIMINGS:
+            if not np.isnan(columns[name][row]):
+                result[name] = float(columns[name][row])
+        if columns["prompt_tokens"][row] >= 0:
+            prompt_tokens = int(columns["prompt_tokens"][row])
+            completion_tokens = int(columns["completion_tokens"][row])
+            result["usage"] = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + max(completion_tokens, 0)
+            }
+            if columns["cached_tokens"][row] >= 0:
+                result["usage"]["cached_tokens"] = int(columns["cached_tokens"][row])
+        for name in ("finish_reason", "backend"):
+            value = self._string(name, row)
+            if value is not None:
+                result[name] = value
+        for name in BOOL_COLUMNS:
+            if columns[name][row]:
+                result[name] = True
+        return result
+
+    def column(self, name):
+        """
+        Return one column for every row.
+
+        Numeric columns are read-only views of the stored arrays (NaN, or -1
+        for counts, where unknown); string columns are object arrays of the
+        values (None where unknown).
+        """
+        if name in self._values:
+            values = np.array(self._values[name] + [None], dtype=object)
+            return values[self._columns[name][:self._size]]
+        if name == "response":
+            return np.array([self.response(row) for row in range(self._size)], dtype=object)
+        if name not in self._columns:
+            raise KeyError(f"Unknown column '{name}'")
+        view = self._columns[name][:self._size].view()
+        view.flags.writeable = False
+        return view
+
+    def rows(self, **conditions):
+        """
+        Find the rows matching every condition, e.g. rows(model="gpt-4",
+        temperature=(">=", 0.7)).
+
+        A condition is a value to match or an (operator, value) pair with an
+        operator from OPERATORS; string columns support "=" and "!=".
+
+        Returns:
+            numpy.ndarray: The matching row numbers, in row order
+        """
+        mask = np.ones(self._size, dtype=bool)
+        for name, condition in conditions.items():
+            operator, value = condition if isinstance(condition, tuple) else ("=", condition)
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown operator '{operator}'")
+            if name in self._values:
+                if operator not in ("=", "!="):
+                    raise ValueError(f"Column '{name}' only supports = and !=")
+                # Compare codes; a value never seen matches no row
+                value = self._codes[name].get(value, -2) if value is not None else -1
+            elif name not in self._columns:
+                raise KeyError(f"Unknown column '{name}'")
+            mask &= OPERATORS[operator](self._columns[name][:self._size], value)
+        return np.flatnonzero(mask)
+
+    def latest(self):
+        """
+        Mask of the rows holding the latest result for their index; use it
+        to aggregate over results without counting re-appended indexes twice.
+        """
+        mask = np.zeros(self._size, dtype=bool)
+        mask[np.fromiter(self._rows.values(), dtype=np.int64, count=len(self._rows))] = True
+        return mask
+
+    def filter(self, **conditions):
+        """Return the rows matching every condition (see rows) as a new ResultTable."""
+        return self.take(self.rows(**conditions))
+
+    def take(self, rows):
+        """Copy the given rows, in order, into a new ResultTable."""
+        rows = np.asarray(rows, dtype=np.int64)
+        table = ResultTable()
+        table._size = len(rows)
+        table._capacity = len(rows)
+        table._columns = {name: column[rows] for name, column in self._columns.items()}
+        table._values = {name: list(values) for name, values in self._values.items()}
+        table._codes = {name: dict(codes) for name, codes in self._codes.items()}
+        table._responses = self._responses.take(rows)
+        table._has_response = self._has_response[rows]
+
+        starts = self._sample_offsets[rows]
+        counts = self._sample_offsets[rows + 1] - starts
+        table._sample_offsets = np.zeros(table._capacity + 1, dtype=np.int64)
+        table._sample_offsets[1:len(rows) + 1] = np.cumsum(counts)
+        items = np.repeat(starts - table._sample_offsets[:len(rows)], counts) + np.arange(int(counts.sum()))
+        table._samples = self._samples.take(items)
+
+        table._rows = {int(index): row for row, index in enumerate(table._columns["index"][:len(rows)])}
+        return table
+
+    def sort_indices(self, name, indices, descending=False):
+        """
+        Order result indexes by a column; indexes without a row (or a value) go last.
+
+        Args:
+            name (str): Numeric or string column
+            indices (list): Result indexes to order
+            descending (bool): Largest first
+
+        Returns:
+            list: The indexes in sorted order
+        """
+        tracked = [index for index in indices if index in self._rows]
+        untracked = [index for index in indices if index not in self._rows]
+        rows = np.fromiter((self._rows[index] for index in tracked), dtype=np.int64, count=len(tracked))
+        keys = self._columns[name][rows].astype(np.float64)
+        if name in self._values:
+            # Rank the distinct values so codes sort alphabetically
+            order = sorted(range(len(self._values[name])), key=self._values[name].__getitem__)
+            ranks = np.empty(len(order) + 1)
+            ranks[order] = np.arange(len(order))
+            ranks[-1] = np.nan
+            keys = ranks[self._columns[name][rows]]
+        elif name in INT_COLUMNS:
+            keys[keys < 0] = np.nan
+        order = np.argsort(-keys if descending else keys, kind="stable")
+        return [tracked[i] for i in order] + untracked
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the table, in bytes."""
+        size = sum(column.nbytes for column in self._columns.values())
+        size += self._responses.nbytes + self._samples.nbytes
+        size += self._has_response.nbytes + self._sample_offsets.nbytes
+        size += sum(len(value) for values in self._values.values() for value in values)
+        return size
+
+    def to_arrow(self):
+        """
+        Export the table as a pyarrow.Table (columns in COLUMNS order).
+
+        Numbers, string codes and text are wrapped without copying; only
+        validity bitmaps, boolean columns and the distinct strings are built.
+        """
+        pa = _import_pyarrow()
+        size = self._size
+        arrays = {}
+        for name in FLOAT_COLUMNS + INT_COLUMNS:
+            values = self._columns[name][:size]
+            valid = ~np.isnan(values) if values.dtype == np.float64 else values >= 0
+            bitmap, nulls = _validity(pa, valid)
+            arrow_type = pa.float64() if values.dtype == np.float64 else pa.int64()
+            arrays[name] = pa.Array.from_buffers(arrow_type, size, [bitmap, pa.py_buffer(values)],
+                                                 null_count=nulls)
+        for name in BOOL_COLUMNS:
+            arrays[name] = pa.array(self._columns[name][:size])
+        for name in STRING_COLUMNS:
+            codes = self._columns[name][:size]
+            bitmap, nulls = _validity(pa, codes >= 0)
+            indices = pa.Array.from_buffers(pa.int32(), size, [bitmap, pa.py_buffer(codes)], null_count=nulls)
+            arrays[name] = pa.DictionaryArray.from_arrays(indices, pa.array(self._values[name], pa.string()))
+        arrays["response"] = self._responses.to_arrow(pa, self._has_response[:size])
+        arrays["responses"] = pa.LargeListArray.from_arrays(pa.array(self._sample_offsets[:size + 1]),
+                                                            self._samples.to_arrow(pa))
+        return pa.table([arrays[name] for name in COLUMNS], names=list(COLUMNS))
+
+    def __arrow_c_stream__(self, requested_schema=None):
+        # Arrow PyCapsule interface: polars.DataFrame(table) and other Arrow
+        # consumers read the table directly
+        return self.to_arrow().__arrow_c_stream__(requested_schema)
+
+    def to_pandas(self):
+        """Export the table as a pandas DataFrame (through Arrow)."""
+        return self.to_arrow().to_pandas()
+
+    def to_parquet(self, path, **kwargs):
+        """
+        Write the table to a Parquet file.
+
+        Args:
+            path (str): Output path
+            **kwargs: Passed to pyarrow.parquet.write_table (e.g. compression)
+        """
+        _import_pyarrow()
+        import pyarrow.parquet as pq
+        pq.write_table(self.to_arrow(), path, **kwargs)
+
+    def to_feather(self, path):
+        """Write the table to an Arrow IPC (Feather) file."""
+        _import_pyarrow()
+        import pyarrow.feather as feather
+        feather.write_feather(self.to_arrow(), path)
@@ -0,0 +1,137 @@
+"""
+Deterministic sharding of sweeps across processes and machines.
+
+A sweep's cells are numbered the same way wherever its spec is expanded, so
+shard k of n (1-based) simply runs the cells whose index leaves remainder
+k - 1 when divided by n. Striding instead of cutting the grid into blocks
+gives every shard the same mix of cheap and expensive cells (small and
+large max_tokens), so shards finish at about the same time. No shard needs
+to know about any other: each writes its own result file, and
+merge_results combines them afterwards.
+"""
+import os
+import json
+
+
+def parse_shard(value):
+    """
+    Parse a shard given as "k/n" (worker k of n, counting from 1).
+
+    Returns:
+        tuple: (k, n)
+    """
+    shard, _, count = value.partition("/")
+    try:
+        shard, count = int(shard), int(count)
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}' (expected k/n, e.g. 2/4)")
+    if not 1 <= shard <= count:
+        raise ValueError(f"Invalid shard '{value}' (k must be between 1 and n)")
+    return shard, count
+
+
+def shard_of(index, count):
+    """Return the shard (1-based) of count shards that runs the cell with this index."""
+    return index % count + 1
+
+
+def shard_path(output, shard, count):
+    """Return the result file of one shard of a sweep written to output, e.g. results.shard-2-of-4.jsonl."""
+    root, extension = os.path.splitext(output)
+    return f"{root}.shard-{shard}-of-{count}{extension or '.jsonl'}"
+
+
+class ShardSkip:
+    """
+    The cell indexes a shard doesn't run, as a collection for the wrapper's
+    skip argument (see OpenAIWrapper.iter_generate).
+    """
+
+    def __init__(self, shard, count, skip=None):
+        """
+        Args:
+            shard (int): This shard, counting from 1
+            count (int): Number of shards
+            skip (collection): Cells to skip within the shard as well
+                (e.g. the ones a resumed sweep already has)
+        """
+        self.shard = shard
+        self.count = count
+        self.skip = skip
+
+    def __contains__(self, index):
+        if shard_of(index, self.count) != self.shard:
+            return True
+        return self.skip is not None and index in self.skip
+
+    def __bool__(self):
+        return True
+
+
+def iter_result_files(paths):
+    """
+    Read results from JSONL result files, one file after another.
+
+    Blank lines and a truncated last line (from a shard that was killed
+    mid-write) are skipped.
+
+    Yields:
+        dict: One result at a time
+    """
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def merge_results(results, total=None):
+    """
+    Combine the results of several shards (or runs) of one sweep.
+
+    Each cell keeps a single result: a successful one over an error, and
+    the last one read among equals (so a retried or resumed cell replaces
+    its earlier attempt).
+
+    Args:
+        results (iterable): Result dictionaries with their sweep "index"
+        total (int): Number of cells in the sweep, if known; without it
+            only gaps below the highest index read can be reported missing
+
+    Returns:
+        tuple: (results in index order, stats) where stats holds the
+            number of results "read", "duplicates" dropped, "errors" left
+            and "missing" indexes
+    """
+    merged = {}
+    read = 0
+    for result in results:
+        read += 1
+        index = result["index"]
+        current = merged.get(index)
+        if current is None or "error" in current or "error" not in result:
+            merged[index] = result
+
+    ordered = [merged[index] for index in sorted(merged)]
+    if total is None:
+        total = ordered[-1]["index"] + 1 if ordered else 0
+    stats = {
+        "read": read,
+        "duplicates": read - len(ordered),
+        "errors": sum("error" in result for result in ordered),
+        "missing": [index for index in range(total) if index not in merged]
+    }
+    return ordered, stats
+
+
+def format_merge_summary(stats, count):
+    """Summarise a merge in one line."""
+    summary = (f"{count} results merged from {stats['read']} read"
+               f" ({stats['duplicates']} duplicates dropped, {stats['errors']} errors)")
+    if stats["missing"]:
+        summary += f"; {len(stats['missing'])} cells missing, e.g. index {stats['missing'][0]}"
+    return summary
@@ -0,0 +1,639 @@
+"""
+Headless sweep runner.
+
+Runs parameter sweeps through OpenAIWrapper without the Tk playground and
+streams every result to stdout (or a file) as one JSON line as soon as it
+completes. Sweep specs are read from a JSON, JSONL or YAML file; each spec
+lists the prompts, products, models and parameter values to combine:
+
+    {
+        "models": ["gpt-3.5-turbo", "gpt-4"],
+        "system_prompts": ["You are a helpful copywriter."],
+        "user_prompts": ["Write a compelling product description for the following product:"],
+        "products": ["iPhone", "running shoes"],
+        "temperatures": [0.0, 0.7, 1.2],
+        "max_tokens": [50, 150, 300],
+        "presence_penalties": [0.0, 1.5],
+        "frequency_penalties": [0.0, 1.5],
+        "stop_sequence": null,
+        "n": 1
+    }
+
+Singular keys ("model", "product", "temperature", ...) are accepted for single
+values, and omitted parameter lists fall back to the playground's default
+grid. "n" asks for several samples per cell in a single API call. A JSONL
+file holds one spec per line.
+
+Every result carries its call metrics (queue wait, time to first byte,
+token usage including cached prompt tokens, cost estimate and finish
+reason). --group-prefixes sends requests that share a prompt back to back
+(the first one alone, for prompts long enough to be cached) so the
+provider's prompt cache gets hits. A per-model latency and cost
+summary is printed to stderr at the end, and --metrics-out writes the full
+metrics as JSON (or in the Prometheus text format for a .prom file).
+
+With --batch-api the sweep is submitted as OpenAI Batch API jobs instead
+of live calls: half the price and outside the per-minute rate limits, but
+results arrive when a job finishes (within 24 hours). Job progress is
+printed to stderr every --poll-interval seconds.
+
+--deadline bounds each call (retries included) and --hedge-percentile
+resends a request that is slower than that percentile of the model's recent
+latencies, keeping whichever reply arrives first. Ctrl-C cancels the sweep:
+requests not yet started are dropped, running ones are reported as
+cancelled, and the results so far are kept; press it again to abort.
+
+--backends FILE spreads the calls over several API keys and/or
+OpenAI-compatible endpoints, listed in a JSON (or YAML) file as objects with
+any of "name", "base_url", "api_key" (or "api_key_env"), "weight", "rpm"
+and "tpm" (OPENAI_API_KEYS / OPENAI_BASE_URLS, comma separated, do the same
+without a file). Each attempt goes to the backend expected to answer
+soonest, failed attempts are retried on another backend, and a backend that
+keeps failing is skipped for a while (see backends.py).
+
+--similar-prompts reuses the answer to an already answered request whose
+prompts are nearly the same (MinHash-estimated similarity of at least the
+threshold given, default 0.9) and whose model, product and parameters
+match, instead of calling the API again.
+
+--search random|halving|tpe replaces the exhaustive grid with an adaptive
+search that spends at most --budget completions. Each spec's parameter
+lists give the search ranges (min to max; max_tokens picks between the
+values listed), every configuration is tried on all of the spec's prompts
+and products, and --scorer rates the outputs: "length:<words>",
+"keywords:<word>,<word>" or "<module>:<function>" (see param_search.py).
+Results carry their "score" and the best configuration is printed at the end.
+
+With --store every result is committed to the experiment store as soon as
+it completes, along with the sweep's specs. If a sweep is interrupted (or
+some cells failed), --resume <sweep id> runs only the cells without a
+successful result, appending to the same sweep and output file. Sweeps
+started from the playground's Batch Generate can be resumed the same way.
+
+Large sweeps can be split into shards with --shard k/n: worker k of n runs
+every n-th cell (see sharding.py), so the same spec run with 1/n ... n/n on
+different machines covers the sweep without any coordination. --merge
+combines the shards' result files into one, keeping a single result per
+cell (a success over an error). Given the spec as well, it also reports
+the cells at the end of the grid that no shard wrote:
+
+    python sweep_runner.py sweep.json --shard 1/2 -o part1.jsonl   # machine A
+    python sweep_runner.py sweep.json --shard 2/2 -o part2.jsonl   # machine B
+    python sweep_runner.py sweep.json --merge part1.jsonl part2.jsonl -o results.jsonl
+
+--processes n does the same on one machine: it runs n shards as separate
+processes, each writing <output>.shard-k-of-n.jsonl, and merges them into
+--output when they finish.
+
+--parquet FILE also writes the results (of a sweep or a merge) to a Parquet
+file at the end, collected in a columnar ResultTable (see result_table.py),
+for loading into pandas, polars or DuckDB.
+
+Requests share one HTTP connection pool, grown to --workers connections;
+--max-connections, --connect-timeout, --read-timeout and --http2 tune it
+(see connection_pool.py for the matching environment variables).
+
+Usage:
+    python sweep_runner.py sweep.json --workers 16 --output results.jsonl
+    python sweep_runner.py --resume 42 --output results.jsonl
+    python sweep_runner.py sweep.json --search tpe --budget 60 --scorer length:80
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import multiprocessing
+
+from batch_api import DEFAULT_POLL_INTERVAL
+from openai_wrapper import (
+    OpenAIWrapper, iter_sweep_requests, load_env, get_pool, DEFAULT_MAX_WORKERS, DEFAULT_TEMPERATURES,
+    DEFAULT_MAX_TOKENS_VALUES, DEFAULT_PRESENCE_PENALTIES, DEFAULT_FREQUENCY_PENALTIES
+)
+from response_cache import ResponseCache, DEFAULT_CACHE_PATH
+from rate_limiter import RateLimiter, RetryPolicy
+from backends import BackendPool
+from experiment_store import ExperimentStore, DEFAULT_STORE_PATH
+from metrics import MetricsRegistry
+from param_search import ParameterSearch, SEARCH_STRATEGIES, load_scorer, make_space
+from sharding import ShardSkip, parse_shard, shard_path, iter_result_files, merge_results, format_merge_summary
+
+# Spec keys: (list key, singular key, default values)
+SPEC_FIELDS = {
+    "models": ("model", ["gpt-3.5-turbo"]),
+    "system_prompts": ("system_prompt", [""]),
+    "user_prompts": ("user_prompt", None),
+    "products": ("product", None),
+    "temperatures": ("temperature", DEFAULT_TEMPERATURES),
+    "max_tokens": ("max_tokens", DEFAULT_MAX_TOKENS_VALUES),
+    "presence_penalties": ("presence_penalty", DEFAULT_PRESENCE_PENALTIES),
+    "frequency_penalties": ("frequency_penalty", DEFAULT_FREQUENCY_PENALTIES),
+}
+
+
+def load_specs(path):
+    """
+    Lazily read sweep specs from a JSON, JSONL or YAML file.
+
+    Args:
+        path (str): Path to the spec file
+
+    Yields:
+        dict: One sweep spec at a time
+    """
+    if path.endswith(".jsonl"):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("Reading YAML specs requires PyYAML (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    # A file may hold a single spec or a list of specs
+    if isinstance(data, list):
+        yield from data
+    else:
+        yield data
+
+
+def _spec_values(spec, key):
+    """Return the list of values a spec gives for a field."""
+    singular, default = SPEC_FIELDS[key]
+    if key in spec:
+        values = spec[key]
+    elif singular in spec:
+        values = spec[singular]
+    else:
+        values = default
+
+    if values is None:
+        raise ValueError(f"Sweep spec is missing '{key}'")
+    return values if isinstance(values, list) else [values]
+
+
+def iter_spec_requests(spec):
+    """
+    Expand a sweep spec into generate_response keyword arguments.
+
+    Args:
+        spec (dict): A sweep spec
+
+    Returns:
+        iterator: Keyword arguments for each generate_response call
+    """
+    return iter_sweep_requests(
+        _spec_values(spec, "models"), _spec_values(spec, "system_prompts"),
+        _spec_values(spec, "user_prompts"), _spec_values(spec, "products"),
+        _spec_values(spec, "temperatures"), _spec_values(spec, "max_tokens"),
+        _spec_values(spec, "presence_penalties"), _spec_values(spec, "frequency_penalties"),
+        stop_sequence=spec.get("stop_sequence"), n=spec.get("n", 1)
+    )
+
+
+def iter_requests(specs):
+    """Chain the requests of every spec into one lazy stream."""
+    for spec in specs:
+        yield from iter_spec_requests(spec)
+
+
+def count_requests(specs):
+    """Return the number of cells in the sweeps described by specs."""
+    return sum(1 for _ in iter_requests(specs))
+
+
+def iter_spec_prompts(spec):
+    """Return the distinct prompts (model, system prompt, user prompt, product) a spec covers."""
+    return [
+        dict(model=model, system_prompt=system_prompt, user_prompt=user_prompt, product=product,
+             stop_sequence=spec.get("stop_sequence"))
+        for model in _spec_values(spec, "models")
+        for system_prompt in _spec_values(spec, "system_prompts")
+        for user_prompt in _spec_values(spec, "user_prompts")
+        for product in _spec_values(spec, "products")
+    ]
+
+
+def make_spec_search(wrapper, spec, scorer, strategy, budget, max_workers=DEFAULT_MAX_WORKERS,
+                     seed=None, cancel=None):
+    """Create the ParameterSearch over a spec's prompts and parameter ranges."""
+    space = make_space(_spec_values(spec, "temperatures"), _spec_values(spec, "max_tokens"),
+                       _spec_values(spec, "presence_penalties"), _spec_values(spec, "frequency_penalties"))
+    return ParameterSearch(wrapper, iter_spec_prompts(spec), scorer, space=space, strategy=strategy,
+                           budget=budget, max_workers=max_workers, seed=seed, cancel=cancel)
+
+
+def iter_search_results(searches):
+    """Run searches one after another, numbering their results consecutively."""
+    offset = 0
+    for search in searches:
+        for result in search.iter_results():
+            result["index"] += offset
+            yield result
+        offset += search.requests_sent
+
+
+def report_batch_status(batch):
+    """Print a Batch API job's progress to stderr."""
+    counts = batch.request_counts
+    progress = f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else ""
+    print(f"batch job {batch.id}: {batch.status}{progress}", file=sys.stderr)
+
+
+def run_sweep(wrapper, requests, out, max_workers=DEFAULT_MAX_WORKERS, share_prefixes=False,
+              group_prefixes=False, store=None, sweep_id=None, batch_api=False, poll_interval=DEFAULT_POLL_INTERVAL,
+              cancel=None, skip=None, table=None):
+    """
+    Run requests and write each result to out as a JSON line.
+
+    Args:
+        wrapper (OpenAIWrapper): Wrapper used to call the API
+        requests (iterable): generate_response keyword arguments
+        out (file): Text stream to write JSONL to
+        max_workers (int): Maximum number of API calls running at once
+        share_prefixes (bool): Derive temperature 0 cells with smaller
+            max_tokens from the largest one (reads all requests up front)
+        group_prefixes (bool): Send requests grouped by prompt so the
+            provider's prompt cache gets hits (reads all requests up front)
+        store (ExperimentStore): Optional store to record every result in
+        sweep_id (int): Store sweep the results belong to
+        batch_api (bool): Run the requests as Batch API jobs instead of live calls
+        poll_interval (float): Seconds between Batch API job status checks
+        cancel (threading.Event): Stops a live sweep early when set
+        skip (collection): Indexes of requests not to run (cells already done)
+        table (ResultTable): Optional table to collect every result in as well
+
+    Returns:
+        tuple: (number of results, number of errors)
+    """
+    if batch_api:
+        results = wrapper.iter_batch_job(requests, poll_interval=poll_interval,
+                                         on_status=report_batch_status, skip=skip)
+    else:
+        results = wrapper.iter_generate(requests, max_workers=max_workers,
+                                        share_prefixes=share_prefixes,
+                                        group_prefixes=group_prefixes, cancel=cancel, skip=skip)
+    return write_results(results, out, store, sweep_id, table)
+
+
+def write_results(results, out, store=None, sweep_id=None, table=None):
+    """
+    Write each result to out as a JSON line (and to the store and table) as it arrives.
+
+    Returns:
+        tuple: (number of results, number of errors)
+    """
+    count = errors = 0
+    for result in results:
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        if store is not None:
+            store.add_run(sweep_id, result)
+        if table is not None:
+            table.append(result)
+
+        count += 1
+        if "error" in result:
+            errors += 1
+    return count, errors
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Run prompt parameter sweeps without the UI and stream results as JSONL.")
+    parser.add_argument("spec", nargs="?", help="Sweep spec file (.json, .jsonl, .yaml or .yml)")
+    parser.add_argument("-o", "--output", help="Write results to this file instead of stdout")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Maximum number of API calls running at once")
+    parser.add_argument("--share-prefixes", action="store_true",
+                        help="At temperature 0, derive smaller max_tokens cells by truncating the largest one")
+    parser.add_argument("--group-prefixes", action="store_true",
+                        help="Send requests grouped by prompt so the provider's prompt cache gets hits")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH,
+                        help="Use the response cache (optionally at the given path)")
+    parser.add_argument("--cache-max-temperature", type=float, default=0.0,
+                        help="Only cache requests at or below this temperature")
+    parser.add_argument("--store", nargs="?", const=DEFAULT_STORE_PATH,
+                        help="Also record results in the experiment store (optionally at the given path)")
+    parser.add_argument("--shard", metavar="K/N",
+                        help="Run only shard K of N (every N-th cell), e.g. 2/4")
+    parser.add_argument("--processes", type=int, metavar="N",
+                        help="Run the sweep as N shards in separate processes and merge their results into --output")
+    parser.add_argument("--merge", nargs="+", metavar="FILE",
+                        help="Merge shard result files into --output instead of running a sweep "
+                             "(with the spec file, cells no shard wrote are reported too)")
+    parser.add_argument("--resume", type=int, metavar="SWEEP_ID",
+                        help="Run the cells of a stored sweep that have no successful result yet")
+    parser.add_argument("--search", choices=SEARCH_STRATEGIES,
+                        help="Search the parameters adaptively instead of running the whole grid")
+    parser.add_argument("--budget", type=int, default=60,
+                        help="Completions each --search may use")
+    parser.add_argument("--scorer",
+                        help="How --search rates outputs: length:<words>, keywords:<a>,<b> or <module>:<function>")
+    parser.add_argument("--seed", type=int, help="Random seed for --search")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="Submit the sweep as OpenAI Batch API jobs (half price, results within 24 hours)")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="Seconds between Batch API job status checks")
+    parser.add_argument("--rpm", type=float, help="Client-side requests-per-minute limit")
+    parser.add_argument("--tpm", type=float, help="Client-side tokens-per-minute limit")
+    parser.add_argument("--max-retries", type=int, default=5,
+                        help="Retries for rate-limited or failed calls")
+    parser.add_argument("--deadline", type=float,
+                        help="Seconds each call may take, retries included")
+    parser.add_argument("--hedge-percentile", type=float,
+                        help="Resend calls slower than this percentile of recent latencies (e.g. 95)")
+    parser.add_argument("--backends", metavar="FILE",
+                        help="Route calls across the API keys and endpoints listed in this JSON or YAML file")
+    parser.add_argument("--similar-prompts", nargs="?", type=float, const=0.9, metavar="THRESHOLD",
+                        help="Reuse answers to prompts at least this similar (default 0.9) to one already answered")
+    parser.add_argument("--parquet", metavar="FILE",
+                        help="Also write the results to this Parquet file at the end (requires pyarrow)")
+    parser.add_argument("--metrics-out",
+                        help="Write call metrics to this file (Prometheus text format if it ends in .prom, JSON otherwise)")
+    parser.add_argument("--max-connections", type=int, help="HTTP connection pool size")
+    parser.add_argument("--connect-timeout", type=float, help="Seconds allowed to open a connection")
+    parser.add_argument("--read-timeout", type=float, help="Seconds allowed between bytes of a response")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 (requires the h2 package)")
+    return parser
+
+
+def format_metrics_summary(metrics):
+    """Summarise each model's latency, throughput and cost in one line."""
+    lines = []
+    for model, stats in sorted(metrics.snapshot().items()):
+        latency = stats["latency"]
+        line = f"{model}: {stats['calls']} calls, {stats['errors']} errors"
+        if latency["count"]:
+            line += f", latency p50 {latency['p50']:.2f}s p95 {latency['p95']:.2f}s"
+        line += f", {stats['throughput']:.1f} calls/s"
+        line += f", {stats['prompt_tokens'] + stats['completion_tokens']} tokens"
+        if stats["cached_tokens"]:
+            line += f" ({stats['cached_tokens']} cached)"
+        if stats["hedges"]:
+            line += f", {stats['hedges']} hedged"
+        line += f", ${stats['cost']:.4f}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def format_pool_summary(pool):
+    """Summarise how the connection pool was used in one line."""
+    stats = pool.stats()
+    return (f"connections: {stats['opened']} opened, {stats['reused']} reused, "
+            f"{stats['waited']} requests waited {stats['wait_time']:.2f}s (max {stats['max_connections']})")
+
+
+def format_backend_summary(backends):
+    """Summarise each backend's calls, errors, latency and circuit state, one line each."""
+    lines = []
+    for stats in backends.stats():
+        line = f"backend {stats['name']}: {stats['calls']} calls, {stats['errors']} errors"
+        if stats["latency"] is not None:
+            line += f", latency {stats['latency']:.2f}s"
+        lines.append(line + f", circuit {stats['state']}")
+    return "\n".join(lines)
+
+
+def merge_files(paths, output=None, parquet=None, total=None):
+    """
+    Merge shard result files into one JSONL file (or stdout), and a Parquet file if given.
+
+    total is the number of cells in the sweep, if known (see merge_results).
+
+    Returns:
+        int: Exit status, 1 if any cell is failed or missing
+    """
+    results, stats = merge_results(iter_result_files(paths), total)
+    out = open(output, "w") if output else sys.stdout
+    try:
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if parquet:
+        from result_table import ResultTable
+        table = ResultTable()
+        table.extend(results)
+        table.to_parquet(parquet)
+    print(format_merge_summary(stats, len(results)), file=sys.stderr)
+    return 1 if stats["errors"] or stats["missing"] else 0
+
+
+def _run_shard(args, shard, count):
+    """Run one shard of a --processes sweep (in a child process)."""
+    args.shard = f"{shard}/{count}"
+    args.processes = None
+    # The parent writes the merged Parquet file
+    args.parquet = None
+    args.output = shard_path(args.output, shard, count)
+    if args.metrics_out:
+        args.metrics_out = shard_path(args.metrics_out, shard, count)
+    sys.exit(run(args))
+
+
+def run_processes(args):
+    """
+    Run a sweep as args.processes shards in child processes, then merge them.
+
+    Ctrl-C reaches every child, which cancels its shard as usual; the
+    results written so far are still merged.
+
+    Returns:
+        int: Exit status, 1 if any shard failed or any cell is failed or missing
+    """
+    count = args.processes
+    workers = [multiprocessing.Process(target=_run_shard, args=(args, shard, count))
+               for shard in range(1, count + 1)]
+    for worker in workers:
+        worker.start()
+
+    # The children handle Ctrl-C themselves; the parent just waits for them
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: None)
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+    paths = [shard_path(args.output, shard, count) for shard in range(1, count + 1)]
+    print(f"Merging {', '.join(paths)}", file=sys.stderr)
+    status = merge_files([path for path in paths if os.path.exists(path)], args.output, args.parquet,
+                         count_requests(load_specs(args.spec)))
+    return max([status] + [1 if worker.exitcode else 0 for worker in workers])
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.parquet:
+        # Fail now rather than after the sweep has run
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--parquet requires pyarrow (pip install pyarrow)")
+    if args.merge:
+        if args.resume is not None:
+            parser.error("--merge can't be combined with --resume")
+        total = count_requests(load_specs(args.spec)) if args.spec is not None else None
+        return merge_files(args.merge, args.output, args.parquet, total)
+    if (args.spec is None) == (args.resume is None):
+        parser.error("give either a spec file or --resume")
+    if args.search and (args.resume is not None or args.batch_api):
+        parser.error("--search can't be combined with --resume or --batch-api")
+    if args.search and not args.scorer:
+        parser.error("--search needs a --scorer")
+    if args.shard:
+        if args.search:
+            parser.error("--search can't be sharded")
+        try:
+            parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.processes is not None:
+        if args.processes < 1 or not args.output:
+            parser.error("--processes needs a positive count and --output")
+        if args.shard or args.search or args.store or args.resume is not None:
+            parser.error("--processes can't be combined with --shard, --search, --store or --resume")
+        return run_processes(args)
+    return run(args)
+
+
+def run(args):
+    """Run the sweep described by parsed command-line arguments and return the exit status."""
+    cache = None
+    if args.cache:
+        cache = ResponseCache(args.cache, max_temperature=args.cache_max_temperature)
+
+    load_env()
+    rate_limiter = RateLimiter.from_env()
+    if args.rpm or args.tpm:
+        rate_limiter = RateLimiter(args.rpm, args.tpm)
+
+    pool = None
+    if args.max_connections or args.connect_timeout or args.read_timeout or args.http2:
+        from connection_pool import ConnectionPool
+        defaults = get_pool()
+        pool = ConnectionPool(
+            max_connections=args.max_connections or defaults.max_connections,
+            connect_timeout=args.connect_timeout or defaults.timeout.connect,
+            read_timeout=args.read_timeout or defaults.timeout.read,
+            http2=args.http2 or defaults.http2
+        )
+
+    similar_prompts = None
+    if args.similar_prompts is not None:
+        from near_duplicates import SimilarPromptCache
+        similar_prompts = SimilarPromptCache(args.similar_prompts)
+
+    backends = BackendPool.from_file(args.backends) if args.backends else BackendPool.from_env()
+
+    metrics = MetricsRegistry()
+    wrapper = OpenAIWrapper(cache=cache, rate_limiter=rate_limiter, backends=backends,
+                            retry_policy=RetryPolicy(max_retries=args.max_retries),
+                            metrics=metrics, pool=pool, deadline=args.deadline,
+                            hedge_percentile=args.hedge_percentile, similar_prompts=similar_prompts)
+
+    store = sweep_id = skip = None
+    if args.resume is not None:
+        store = ExperimentStore(args.store or DEFAULT_STORE_PATH)
+        sweep = store.get_sweep(args.resume)
+        if sweep is None or sweep["spec"] is None:
+            raise SystemExit(f"Sweep {args.resume} can't be resumed (it has no stored spec)")
+        specs = sweep["spec"]
+        sweep_id = args.resume
+        skip = {index for index, result in store.latest_runs(sweep_id).items() if "error" not in result}
+        print(f"Resuming sweep {sweep_id}: {len(skip)} cells already done", file=sys.stderr)
+    else:
+        specs = list(load_specs(args.spec))
+        if args.store:
+            store = ExperimentStore(args.store)
+            # A search's requests depend on its scores, so only grid sweeps can be resumed
+            description = f"{args.spec} (shard {args.shard})" if args.shard else args.spec
+            sweep_id = store.create_sweep("search" if args.search else "headless", description,
+                                          spec=None if args.search else specs)
+
+    if args.shard:
+        # Cells outside the shard are skipped like cells a resumed sweep already has
+        skip = ShardSkip(*parse_shard(args.shard), skip)
+
+    requests = iter_requests(specs)
+    table = None
+    if args.parquet:
+        from result_table import ResultTable
+        table = ResultTable()
+    # A resumed sweep adds to the results already written
+    out = open(args.output, "a" if args.resume is not None else "w") if args.output else sys.stdout
+
+    # The first Ctrl-C cancels the sweep but keeps its results; a second one aborts
+    cancel = threading.Event()
+
+    def interrupt(signum, frame):
+        if cancel.is_set():
+            raise KeyboardInterrupt
+        print("Cancelling sweep (press Ctrl-C again to abort)", file=sys.stderr)
+        cancel.set()
+
+    previous_handler = signal.signal(signal.SIGINT, interrupt)
+
+    start = time.perf_counter()
+    searches = []
+    try:
+        if args.search:
+            # One search per spec; results are numbered across all of them
+            scorer = load_scorer(args.scorer)
+            searches = [make_spec_search(wrapper, spec, scorer, args.search, args.budget,
+                                         max_workers=args.workers, seed=args.seed, cancel=cancel)
+                        for spec in specs]
+            count, errors = write_results(iter_search_results(searches), out, store, sweep_id, table)
+        else:
+            count, errors = run_sweep(wrapper, requests, out, max_workers=args.workers,
+                                      share_prefixes=args.share_prefixes,
+                                      group_prefixes=args.group_prefixes,
+                                      store=store, sweep_id=sweep_id, batch_api=args.batch_api,
+                                      poll_interval=args.poll_interval, cancel=cancel, skip=skip,
+                                      table=table)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if out is not sys.stdout:
+            out.close()
+
+    if cancel.is_set():
+        print("Sweep cancelled", file=sys.stderr)
+    elif store is not None:
+        store.finish_sweep(sweep_id)
+    for search in searches:
+        config, score = search.best()
+        if config is not None:
+            print(f"best of {search.used} completions: {json.dumps(config)} (score {score:.3f})", file=sys.stderr)
+    print(f"{count} results ({errors} errors) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if count:
+        summary = format_metrics_summary(metrics)
+        if summary:
+            print(summary, file=sys.stderr)
+        print(format_pool_summary(wrapper.connection_pool), file=sys.stderr)
+        if backends is not None:
+            print(format_backend_summary(backends), file=sys.stderr)
+    if similar_prompts is not None and similar_prompts.hits:
+        print(f"{similar_prompts.hits} answers reused from similar prompts", file=sys.stderr)
+
+    if table is not None:
+        table.to_parquet(args.parquet)
+    if args.metrics_out:
+        with open(args.metrics_out, "w") as f:
+            f.write(metrics.to_prometheus() if args.metrics_out.endswith(".prom") else metrics.to_json())
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+import backends
+from backends import CLOSED, HALF_OPEN, OPEN, Backend, BackendPool
+
+
+def status_error(status, headers=None):
+    request = httpx.Request("POST", "http://backend/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    error_class = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return error_class("Error", response=response, body=None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(backends.time, "monotonic", lambda: now[0])
+    return now
+
+
+def state(pool, index=0):
+    return pool.stats()[index]["state"]
+
+
+def open_circuit(pool, backend):
+    for _ in range(pool.failure_threshold):
+        assert pool.choose() == (backend, 0.0)
+        pool.release(backend, error=status_error(500))
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    backend = Backend(name="a")
+    pool = BackendPool([backend], failure_threshold=2, cooldown=10)
+
+    pool.choose()
+    pool.release(backend, error=status_error(500))
+    assert state(pool) == CLOSED
+    pool.choose()
+    pool.release(backend, error=status_error(500))
+    assert state(pool) == OPEN
+    assert pool.choose() == (None, 10)
+
+    clock[0] += 10
+    assert state(pool) == HALF_OPEN
+
+
+def test_trial_call_decides_whether_the_circuit_closes(clock):
+    backend = Backend(name="a")
+    pool = BackendPool([backend], failure_threshold=2, cooldown=10)
+    open_circuit(pool, backend)
+    clock[0] += 10
+
+    # Only one trial call at a time
+    assert pool.choose()[0] is backend
+    assert pool.choose()[0] is None
+
+    # A failed trial reopens the circuit for another cooldown
+    pool.release(backend, error=status_error(500))
+    assert state(pool) == OPEN
+    clock[0] += 10
+
+    pool.choose()
+    pool.release(backend, latency=0.5)
+    assert state(pool) == CLOSED
+    assert backend.failures == 0
+
+
+def test_aborted_trial_leaves_the_circuit_half_open(clock):
+    backend = Backend(name="a")
+    pool = BackendPool([backend], failure_threshold=2, cooldown=10)
+    open_circuit(pool, backend)
+    assert state(pool) == OPEN
+    clock[0] += 10
+    assert state(pool) == HALF_OPEN
+
+    assert pool.choose()[0] is backend
+    calls, errors, error_rate = backend.calls, backend.errors, backend.error_rate
+    pool.release(backend, aborted=True)
+
+    # Still unproven: not closed, no statistics touched, ready for another trial
+    assert state(pool) == HALF_OPEN
+    assert backend.failures == 2
+    assert backend.in_flight == 0
+    assert (backend.calls, backend.errors, backend.error_rate, backend.latency) == (calls, errors, error_rate, None)
+    assert pool.choose()[0] is backend
+
+
+def test_rate_limit_pauses_without_counting_as_a_failure(clock):
+    backend = Backend(name="a")
+    pool = BackendPool([backend], failure_threshold=1, cooldown=10)
+
+    pool.choose()
+    pool.release(backend, error=status_error(429, {"retry-after": "3"}))
+    assert state(pool) == CLOSED
+    assert backend.failures == 0
+    assert pool.choose() == (None, 3)
+
+    clock[0] += 3
+    assert pool.choose()[0] is backend
+
+
+def test_client_errors_do_not_count_against_health(clock):
+    backend = Backend(name="a")
+    pool = BackendPool([backend], failure_threshold=1)
+    request = httpx.Request("POST", "http://backend/v1/chat/completions")
+    error = openai.BadRequestError("Bad", response=httpx.Response(400, request=request), body=None)
+
+    pool.choose()
+    pool.release(backend, error=error)
+    assert state(pool) == CLOSED
+    assert backend.error_rate == 0
+
+
+def test_routes_to_the_backend_expected_to_answer_soonest(clock):
+    fast, slow = Backend(name="fast"), Backend(name="slow")
+    fast.latency, slow.latency = 0.2, 1.0
+    pool = BackendPool([fast, slow])
+
+    # In-flight calls make the fast backend slower until the slow one wins
+    chosen = [pool.choose()[0] for _ in range(6)]
+    assert chosen[:4] == [fast] * 4
+    assert slow in chosen
+    assert fast.in_flight + slow.in_flight == 6
+
+
+def test_weights_share_calls_in_flight(clock):
+    big, small = Backend(name="big", weight=3), Backend(name="small")
+    pool = BackendPool([big, small])
+    for _ in range(40):
+        pool.choose()
+    assert big.in_flight == pytest.approx(3 * small.in_flight, abs=2)
+
+
+def test_excluded_backends_are_only_used_as_a_last_resort(clock):
+    a, b = Backend(name="a"), Backend(name="b")
+    a.latency, b.latency = 0.1, 5.0
+    pool = BackendPool([a, b])
+    assert pool.choose(exclude={a})[0] is b
+    assert pool.choose(exclude={a, b})[0] is a
+    assert pool.available(exclude={a})
+    assert not pool.available(exclude={a, b})
+
+
+def test_error_rate_steers_calls_away(clock):
+    flaky, steady = Backend(name="flaky"), Backend(name="steady")
+    pool = BackendPool([flaky, steady], failure_threshold=100)
+    flaky.latency = steady.latency = 1.0
+    for _ in range(20):
+        flaky.in_flight += 1
+        pool.release(flaky, error=status_error(500))
+    assert flaky.error_rate > 0.5
+    assert pool.choose()[0] is steady
+
+
+def test_quota_headers_hold_a_backend_back_until_reset(clock):
+    backend = Backend(name="a")
+    pool = BackendPool([backend])
+    pool.choose()
+    pool.release(backend, latency=0.1, headers={"x-ratelimit-remaining-requests": "0",
+                                                "x-ratelimit-reset-requests": "1m30s"})
+    assert pool.choose() == (None, 90)
+    clock[0] += 90
+    assert pool.choose()[0] is backend
+
+
+@pytest.mark.parametrize("value, seconds", [("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02),
+                                            ("1h2m", 3720.0), ("", None), (None, None)])
+def test_parse_duration(value, seconds):
+    assert backends.parse_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+
+def test_acquire_gives_up_at_the_deadline_or_on_cancel(clock):
+    backend = Backend(name="a")
+    pool = BackendPool([backend], failure_threshold=1, cooldown=3600)
+    pool.choose()
+    pool.release(backend, error=status_error(500))
+
+    assert pool.acquire(deadline_at=time.perf_counter() + 0.05) is None
+    cancel = threading.Event()
+    cancel.set()
+    assert pool.acquire(cancel=cancel) is None
+
+
+def test_from_env_pairs_keys_and_endpoints(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEYS", "key-a, key-b")
+    monkeypatch.setenv("OPENAI_BASE_URLS", "http://one/v1")
+    pool = BackendPool.from_env()
+    assert [(b.base_url, b.api_key) for b in pool.backends] == [("http://one/v1", "key-a"),
+                                                                ("http://one/v1", "key-b")]
+
+    monkeypatch.setenv("OPENAI_BASE_URLS", "http://one/v1,http://two/v1,http://three/v1")
+    with pytest.raises(ValueError):
+        BackendPool.from_env()
+
+    monkeypatch.setenv("OPENAI_API_KEYS", "key-a")
+    monkeypatch.setenv("OPENAI_BASE_URLS", "")
+    assert BackendPool.from_env() is None
@@ -0,0 +1,67 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from batch_api import (BATCH_ENDPOINT, custom_id, index_from_custom_id, job_failure,
+                       parse_batch_line, write_batch_input)
+from mock_server import MockOpenAIServer
+from openai_wrapper import OpenAIWrapper
+
+
+def test_custom_ids_round_trip():
+    assert index_from_custom_id(custom_id(42)) == 42
+    assert index_from_custom_id("other-42") is None
+    assert index_from_custom_id("request-x") is None
+    assert index_from_custom_id(None) is None
+
+
+def test_input_file_has_one_request_per_line():
+    requests = [(3, {"model": "m", "messages": []}), (7, {"model": "m", "max_tokens": 5})]
+    f, count = write_batch_input(iter(requests))
+    lines = [json.loads(line) for line in f.read().decode("utf-8").splitlines()]
+    assert count == 2
+    assert lines == [{"custom_id": custom_id(index), "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+                     for index, body in requests]
+
+
+def test_parse_success():
+    body = {"id": "chatcmpl-1", "choices": []}
+    line = json.dumps({"custom_id": "request-5", "response": {"status_code": 200, "body": body}})
+    assert parse_batch_line(line) == (5, body, None)
+
+
+@pytest.mark.parametrize("record, message", [
+    ({"custom_id": "request-1", "error": {"code": "batch_expired", "message": "Expired"}}, "Expired"),
+    ({"custom_id": "request-1", "error": {"code": "batch_expired"}}, "batch_expired"),
+    ({"custom_id": "request-1", "response": {"status_code": 400,
+                                            "body": {"error": {"message": "Bad model"}}}}, "Bad model"),
+    ({"custom_id": "request-1", "response": {"status_code": 500, "body": None}},
+     "Batch request failed with status 500"),
+])
+def test_parse_failures(record, message):
+    assert parse_batch_line(json.dumps(record)) == (1, None, message)
+
+
+def test_job_failure_lists_the_job_errors():
+    errors = SimpleNamespace(data=[SimpleNamespace(message="Invalid JSON on line 3"),
+                                   SimpleNamespace(message=None)])
+    batch = SimpleNamespace(id="batch_1", status="failed", errors=errors)
+    assert job_failure(batch) == "Batch job batch_1 failed: Invalid JSON on line 3"
+    assert job_failure(SimpleNamespace(id="batch_2", status="expired", errors=None)) == "Batch job batch_2 expired"
+
+
+def test_batch_job_against_the_mock_server():
+    with MockOpenAIServer(batch_duration=0.1) as server:
+        wrapper = OpenAIWrapper(base_url=server.base_url, api_key="mock")
+        requests = [dict(model="gpt-4o-mini", system_prompt="You are a copywriter.", user_prompt="Describe:",
+                         product=f"product {index}", temperature=0.7, max_tokens=20)
+                    for index in range(4)]
+        statuses = []
+        results = list(wrapper.iter_batch_job(requests, poll_interval=0.05, skip={2},
+                                              on_status=lambda batch: statuses.append(batch.status)))
+
+    assert sorted(result["index"] for result in results) == [0, 1, 3]
+    assert all(result["response"] and "error" not in result for result in results)
+    assert all(result["usage"]["total_tokens"] > 0 for result in results)
+    assert statuses[-1] == "completed"
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from connection_pool import ConnectionPool
+from mock_server import MockOpenAIServer
+
+COMPLETION = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.fixture
+def slow_server():
+    with MockOpenAIServer(latency="const:5") as server:
+        yield server
+
+
+def start_request(pool, url):
+    """Send one request from a new thread; returns (thread, outcome dict)."""
+    outcome = {}
+    started = threading.Event()
+
+    def send():
+        outcome["thread"] = threading.get_ident()
+        started.set()
+        began = time.perf_counter()
+        try:
+            outcome["status"] = pool.http_client.post(url, json=COMPLETION).status_code
+        except Exception as e:
+            outcome["error"] = e
+        outcome["elapsed"] = time.perf_counter() - began
+
+    thread = threading.Thread(target=send, daemon=True)
+    thread.start()
+    started.wait()
+    return thread, outcome
+
+
+def wait_in_flight(pool, thread_id, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while thread_id not in pool._in_flight:
+        assert time.perf_counter() < deadline, "request never reached the connection pool"
+        time.sleep(0.01)
+
+
+def test_httpcore_internals_used_by_abort_are_present(slow_server):
+    # abort() relies on these private attributes; if an httpx/httpcore
+    # upgrade moves them, abort silently stops cancelling requests
+    pool = ConnectionPool()
+    thread, outcome = start_request(pool, slow_server.base_url + "/chat/completions")
+    wait_in_flight(pool, outcome["thread"])
+    time.sleep(0.3)
+
+    transport = pool._in_flight[outcome["thread"]][0]
+    requests = transport._pool._requests
+    assert len(requests) == 1
+    connection = requests[0].connection._connection
+    assert connection._network_stream.get_extra_info("socket") is not None
+    pool.abort(outcome["thread"])
+    thread.join(5)
+    pool.close()
+
+
+def test_abort_fails_a_request_waiting_for_its_response(slow_server):
+    pool = ConnectionPool()
+    thread, outcome = start_request(pool, slow_server.base_url + "/chat/completions")
+    wait_in_flight(pool, outcome["thread"])
+    # Let the request go out, so it's waiting on the server's slow reply
+    time.sleep(0.3)
+
+    assert pool.abort(outcome["thread"])
+    thread.join(2)
+    assert not thread.is_alive(), "aborted request kept waiting for the response"
+    assert isinstance(outcome.get("error"), httpx.TransportError), outcome
+    assert outcome["elapsed"] < 1.5
+    assert pool._transport.active == 0
+    pool.close()
+
+
+def test_aborted_thread_cannot_send_until_resumed(slow_server):
+    pool = ConnectionPool()
+    url = slow_server.base_url + "/models"
+    outcome = {}
+
+    def send():
+        thread = threading.get_ident()
+        pool.abort(thread)
+        try:
+            pool.http_client.get(url)
+        except ConnectionAbortedError as e:
+            outcome["error"] = e
+        pool.resume(thread)
+        # Resumed: the request goes through (the mock has no /models route)
+        outcome["status"] = pool.http_client.get(url).status_code
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    thread.join(10)
+    assert isinstance(outcome.get("error"), ConnectionAbortedError)
+    assert outcome.get("status") == 404
+    pool.close()
+
+
+def test_connections_are_reused_and_queued_requests_counted():
+    with MockOpenAIServer(latency="const:0.2") as server:
+        pool = ConnectionPool(max_connections=2)
+        url = server.base_url + "/chat/completions"
+        threads = [threading.Thread(target=pool.http_client.post, args=(url,), kwargs={"json": COMPLETION})
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = pool.stats()
+        assert stats["requests"] == 4
+        assert stats["opened"] == 2
+        assert stats["reused"] == 2
+        # Two requests arrived while both connections were busy
+        assert stats["waited"] == 2
+        assert stats["wait_time"] > 0.1
+        assert stats["open"] == 2
+        pool.close()
+
+
+def test_growing_retires_the_old_client_once_its_requests_finish(slow_server):
+    pool = ConnectionPool(max_connections=2)
+    thread, outcome = start_request(pool, slow_server.base_url + "/models")
+    thread.join()
+    old_client, old_transport = pool.http_client, pool._transport
+    generation = pool.generation
+
+    pool.ensure_capacity(1)
+    assert pool.generation == generation
+
+    # A request still in flight keeps the old transport open
+    old_transport.active += 1
+    pool.ensure_capacity(8)
+    assert pool.generation == generation + 1
+    assert pool.max_connections == 8
+    assert pool.http_client is not old_client
+    assert len(old_transport._pool.connections) == 1
+    pool._release(old_transport)
+    assert old_transport._pool.connections == []
+    pool.close()
@@ -0,0 +1,169 @@
+import sqlite3
+
+import pytest
+
+from experiment_store import ADDED_RUN_COLUMNS, ADDED_SWEEP_COLUMNS, ExperimentStore
+
+
+def make_result(index, **overrides):
+    result = {
+        "index": index,
+        "model": "gpt-4o-mini",
+        "system_prompt": "You are a copywriter.",
+        "user_prompt": "Describe:",
+        "product": f"product {index % 3}",
+        "parameters": {"temperature": [0.0, 0.5, None][index % 3], "max_tokens": 100,
+                       "presence_penalty": 0.0, "frequency_penalty": 0.0},
+        "response": f"response {index}",
+        "latency": 0.5,
+        "usage": {"prompt_tokens": 10, "completion_tokens": 20, "cached_tokens": 0},
+        "finish_reason": "stop",
+        "cost": 0.001
+    }
+    result.update(overrides)
+    return result
+
+
+@pytest.fixture
+def store():
+    store = ExperimentStore(":memory:")
+    yield store
+    store.close()
+
+
+def test_results_round_trip(store):
+    sweep_id = store.create_sweep("batch", "test", spec={"products": ["a"]})
+    result = make_result(0, responses=["a", "b"], derived_from={"index": 3, "max_tokens": 200}, score=0.5)
+    failed = make_result(1, error="Rate limited")
+    del failed["response"]
+    store.add_runs(sweep_id, [result, failed])
+
+    assert store.query_runs({"sweep_id": sweep_id}) == [result, failed]
+    assert store.get_sweep(sweep_id)["spec"] == {"products": ["a"]}
+    assert store.list_sweeps()[0]["runs"] == 2
+    assert store.list_sweeps()[0]["errors"] == 1
+
+
+@pytest.mark.parametrize("order_by", ["id", "temperature", "product", "latency"])
+def test_keyset_paging_matches_a_single_query(store, order_by):
+    sweep_id = store.create_sweep("batch")
+    # Ties and NULLs in the sort column must not lose or repeat rows across pages
+    store.add_runs(sweep_id, [make_result(index) for index in range(23)])
+    filters = {"sweep_id": sweep_id}
+
+    expected = store.query_runs(filters, limit=None, order_by=order_by)
+    paged = list(store.iter_runs(filters, page_size=4, order_by=order_by))
+    assert paged == expected
+    assert sorted(result["index"] for result in paged) == list(range(23))
+
+
+def test_filters_with_operators(store):
+    sweep_id = store.create_sweep("batch")
+    store.add_runs(sweep_id, [make_result(index) for index in range(6)])
+    runs = store.query_runs({"sweep_id": sweep_id, "temperature": (">=", 0.5)})
+    assert [run["index"] for run in runs] == [1, 4]
+    runs = store.query_runs({"product": ("LIKE", "%1")}, limit=1, offset=1)
+    assert [run["index"] for run in runs] == [4]
+
+
+@pytest.mark.parametrize("filters, order_by", [
+    ({"response; DROP TABLE runs": 1}, "id"),
+    ({"model": ("IS NOT", None)}, "id"),
+    ({}, "response"),
+])
+def test_rejects_unknown_columns_and_operators(store, filters, order_by):
+    with pytest.raises(ValueError):
+        store.query_runs(filters, order_by=order_by)
+
+
+def test_old_databases_are_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE sweeps (id INTEGER PRIMARY KEY, created_at REAL NOT NULL, kind TEXT NOT NULL,
+                             description TEXT);
+        CREATE TABLE runs (id INTEGER PRIMARY KEY, sweep_id INTEGER NOT NULL, cell_index INTEGER,
+                           created_at REAL NOT NULL, model TEXT, system_prompt TEXT, user_prompt TEXT,
+                           product TEXT, temperature REAL, max_tokens INTEGER, presence_penalty REAL,
+                           frequency_penalty REAL, response TEXT, responses TEXT, error TEXT,
+                           latency REAL, time_to_first_token REAL, prompt_tokens INTEGER,
+                           completion_tokens INTEGER, derived_from TEXT);
+        INSERT INTO sweeps VALUES (1, 0, 'batch', 'old');
+        INSERT INTO runs (sweep_id, cell_index, created_at, model, response, prompt_tokens, completion_tokens)
+            VALUES (1, 0, 0, 'gpt-4', 'old response', 5, 7);
+    """)
+    conn.close()
+
+    store = ExperimentStore(path)
+    columns = {row["name"] for row in store._conn.execute("PRAGMA table_info(runs)")}
+    assert {column for column, _ in ADDED_RUN_COLUMNS} <= columns
+    columns = {row["name"] for row in store._conn.execute("PRAGMA table_info(sweeps)")}
+    assert {column for column, _ in ADDED_SWEEP_COLUMNS} <= columns
+
+    old = store.query_runs({"sweep_id": 1})[0]
+    assert old["response"] == "old response"
+    assert old["usage"] == {"prompt_tokens": 5, "completion_tokens": 7}
+    assert store.get_sweep(1)["spec"] is None
+
+    # New runs with the added columns can be written next to the old ones
+    store.add_run(1, make_result(1, score=0.9))
+    assert store.query_runs({"score": 0.9})[0]["cost"] == 0.001
+    store.close()
+    # Opening an up-to-date database again changes nothing
+    ExperimentStore(path).close()
+
+
+def test_reflections(store):
+    sweep_id = store.create_sweep("batch")
+    store.add_reflection("first", sweep_id)
+    store.add_reflection("unlinked")
+    assert [r["text"] for r in store.get_reflections()] == ["unlinked", "first"]
+    assert [r["text"] for r in store.get_reflections(sweep_id)] == ["first"]
+
+
+def test_latest_runs_keep_the_last_run_of_each_cell(store):
+    sweep_id = store.create_sweep("batch")
+    other = store.create_sweep("batch")
+    store.add_runs(sweep_id, [make_result(0), make_result(1, error="Timeout"), make_result(2)])
+    store.add_run(other, make_result(1))
+    # The resumed cell's new run supersedes its failure
+    store.add_run(sweep_id, make_result(1, response="retried"))
+    store.add_run(sweep_id, make_result(2, error="Cancelled"))
+
+    latest = store.latest_runs(sweep_id)
+    assert sorted(latest) == [0, 1, 2]
+    assert latest[1]["response"] == "retried"
+    assert latest[2]["error"] == "Cancelled"
+    assert store.latest_runs(12345) == {}
+
+
+def test_resume_runs_only_the_cells_without_a_success(tmp_path, monkeypatch):
+    import openai_wrapper
+    import sweep_runner
+    from mock_server import MockOpenAIServer
+
+    path = str(tmp_path / "experiments.sqlite3")
+    spec = {"model": "gpt-4o-mini", "user_prompt": "Describe:", "products": ["a", "b"],
+            "temperatures": [0.0, 1.0], "max_tokens": [10], "presence_penalties": [0.0],
+            "frequency_penalties": [0.0]}
+    requests = list(sweep_runner.iter_spec_requests(spec))
+    store = ExperimentStore(path)
+    sweep_id = store.create_sweep("headless", spec=[spec])
+    store.add_runs(sweep_id, [make_result(0), make_result(1, error="Timeout"), make_result(3)])
+    store.close()
+
+    output = tmp_path / "results.jsonl"
+    with MockOpenAIServer() as server:
+        monkeypatch.setenv("OPENAI_API_KEY", "mock")
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setattr(openai_wrapper, "_client", None)
+        sweep_runner.main(["--resume", str(sweep_id), "--store", path, "--output", str(output)])
+        assert server.stats["requests"] == 2
+
+    store = ExperimentStore(path)
+    latest = store.latest_runs(sweep_id)
+    assert sorted(latest) == [0, 1, 2, 3]
+    assert all("error" not in result for result in latest.values())
+    assert latest[2]["product"] == requests[2]["product"]
+    assert store.get_sweep(sweep_id)["finished_at"] is not None
+    store.close()
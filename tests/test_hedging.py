@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from connection_pool import ConnectionPool
+from openai_wrapper import CallCancelled, DeadlineExceeded, HEDGE_MIN_SAMPLES, OpenAIWrapper
+from rate_limiter import RateLimiter
+
+REQUEST = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 10}
+
+
+def hedging_wrapper(rate_limiter=None, hedge_delay=0.05):
+    wrapper = OpenAIWrapper(api_key="test", rate_limiter=rate_limiter, hedge_percentile=50,
+                            pool=ConnectionPool())
+    wrapper._latencies["m"].extend([hedge_delay] * HEDGE_MIN_SAMPLES)
+    return wrapper
+
+
+def new_call():
+    return {"model": "m", "queue_wait": 0.0}
+
+
+def test_first_attempt_answering_during_the_rate_limit_wait_skips_the_hedge():
+    limiter = RateLimiter(requests_per_minute=1, tokens_per_minute=1000)
+    limiter.reserve(10)
+    wrapper = hedging_wrapper(limiter)
+    sends = []
+
+    def send(request, deadline_at=None, backend=None):
+        sends.append(time.perf_counter())
+        time.sleep(0.3)
+        return "response", 0.1
+
+    wrapper._send = send
+    started = time.perf_counter()
+    call = new_call()
+    assert wrapper._send_hedged(call, REQUEST, None, 10) == ("response", 0.1)
+
+    # The hedge would have waited a minute for the rate limiter
+    assert time.perf_counter() - started < 1
+    assert len(sends) == 1
+    assert "hedged" not in call
+    # Its reservation was given back
+    assert limiter.requests.tokens == pytest.approx(0, abs=0.01)
+    assert limiter.tokens.tokens == pytest.approx(990, abs=1)
+
+
+def test_hedge_is_skipped_when_the_rate_limiter_would_outlast_the_deadline():
+    limiter = RateLimiter(requests_per_minute=1)
+    limiter.reserve()
+    wrapper = hedging_wrapper(limiter)
+    sends = []
+
+    def send(request, deadline_at=None, backend=None):
+        sends.append(time.perf_counter())
+        time.sleep(0.2)
+        return "response", 0.1
+
+    wrapper._send = send
+    call = new_call()
+    assert wrapper._send_hedged(call, REQUEST, time.perf_counter() + 5, 10)[0] == "response"
+    assert len(sends) == 1
+    assert limiter.requests.tokens == pytest.approx(0, abs=0.01)
+
+
+def test_slow_attempt_is_hedged_and_the_loser_aborted():
+    wrapper = hedging_wrapper()
+    aborted = []
+
+    def send(request, deadline_at=None, backend=None):
+        if not aborted:
+            aborted.append(False)
+            # The first attempt hangs until the race aborts it
+            while not wrapper._was_aborted():
+                time.sleep(0.01)
+            aborted[0] = True
+            raise CallCancelled("Cancelled")
+        return "hedge", 0.01
+
+    wrapper._send = send
+    call = new_call()
+    assert wrapper._send_hedged(call, REQUEST, None, 10) == ("hedge", 0.01)
+    assert call["hedged"]
+    deadline = time.perf_counter() + 2
+    while not aborted[0] and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert aborted[0]
+
+
+def test_failing_to_acquire_the_hedge_backend_aborts_the_first_attempt():
+    wrapper = hedging_wrapper()
+    outcome = []
+
+    def send(request, deadline_at=None, backend=None):
+        while not wrapper._was_aborted():
+            time.sleep(0.01)
+        outcome.append("aborted")
+        raise CallCancelled("Cancelled")
+
+    def acquire_backend(*args):
+        raise DeadlineExceeded("Deadline of 1s exceeded (no backend available)")
+
+    wrapper._send = send
+    wrapper._acquire_backend = acquire_backend
+    with pytest.raises(DeadlineExceeded):
+        wrapper._send_hedged(new_call(), REQUEST, None, 10)
+    deadline = time.perf_counter() + 2
+    while not outcome and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert outcome == ["aborted"]
@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pytest
+
+from connection_pool import ConnectionPool
+from mock_server import MockOpenAIServer
+from openai_wrapper import HEDGE_MIN_SAMPLES, OpenAIWrapper
+from rate_limiter import RetryPolicy
+
+
+def make_requests(count, **overrides):
+    requests = []
+    for index in range(count):
+        request = dict(model="gpt-4o-mini", system_prompt="You are a copywriter.", user_prompt="Describe:",
+                       product=f"product {index}", temperature=0.7, max_tokens=10)
+        request.update(overrides)
+        requests.append(request)
+    return requests
+
+
+def latencies(*delays):
+    """A mock server latency that replays the given delays, then answers at once."""
+    delays = list(delays)
+    return lambda rng: delays.pop(0) if delays else 0.0
+
+
+def make_wrapper(server, **kwargs):
+    kwargs.setdefault("retry_policy", RetryPolicy(max_retries=0))
+    return OpenAIWrapper(base_url=server.base_url, api_key="mock", pool=ConnectionPool(), **kwargs)
+
+
+def test_runs_requests_concurrently_and_reports_every_index():
+    with MockOpenAIServer(latency="const:0.3") as server:
+        wrapper = make_wrapper(server)
+        started = time.perf_counter()
+        results = list(wrapper.iter_generate(make_requests(8), max_workers=4))
+        elapsed = time.perf_counter() - started
+
+    assert sorted(result["index"] for result in results) == list(range(8))
+    assert all(result["response"] and result["latency"] >= 0.3 for result in results)
+    assert all(result["product"] == f"product {result['index']}" for result in results)
+    # Two rounds of four, not eight calls in a row
+    assert 0.6 <= elapsed < 1.8
+
+
+def test_failures_are_reported_per_request():
+    with MockOpenAIServer(error_rate=1.0) as server:
+        wrapper = make_wrapper(server)
+        results = list(wrapper.iter_generate(make_requests(3), max_workers=2))
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    assert all("error" in result and "response" not in result for result in results)
+
+
+def test_skipped_requests_keep_the_other_indexes():
+    with MockOpenAIServer() as server:
+        wrapper = make_wrapper(server)
+        results = list(wrapper.iter_generate(make_requests(5), skip={1, 3}))
+        assert server.stats["requests"] == 3
+    assert sorted(result["index"] for result in results) == [0, 2, 4]
+
+
+def test_batch_generate_returns_the_grid_in_order():
+    with MockOpenAIServer() as server:
+        wrapper = make_wrapper(server)
+        results = wrapper.batch_generate("gpt-4o-mini", "", "Describe:", "phone",
+                                         [0.0, 1.0], [10, 20], [0.0], [0.0], max_workers=3)
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert [(r["parameters"]["temperature"], r["parameters"]["max_tokens"]) for r in results] == [
+        (0.0, 10), (0.0, 20), (1.0, 10), (1.0, 20)]
+
+
+def test_streamed_batch_reports_deltas_per_request():
+    deltas = {}
+    with MockOpenAIServer() as server:
+        wrapper = make_wrapper(server)
+        results = list(wrapper.iter_generate(
+            make_requests(3), max_workers=3,
+            on_delta=lambda index, request, delta: deltas.setdefault(index, []).append(delta)))
+    for result in results:
+        assert "".join(deltas[result["index"]]) == result["response"]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_pool_grows_to_the_worker_count(max_workers):
+    with MockOpenAIServer() as server:
+        wrapper = make_wrapper(server)
+        wrapper.connection_pool.max_connections = 2
+        list(wrapper.iter_generate(make_requests(2), max_workers=max_workers))
+        assert wrapper.connection_pool.max_connections == max(2, max_workers)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_cancel_ends_the_batch_and_aborts_running_requests(stream):
+    cancel = threading.Event()
+    with MockOpenAIServer(latency="const:5") as server:
+        wrapper = make_wrapper(server)
+        on_delta = (lambda index, request, delta: None) if stream else None
+        threading.Timer(0.5, cancel.set).start()
+        started = time.perf_counter()
+        results = list(wrapper.iter_generate(make_requests(10), max_workers=4, cancel=cancel,
+                                             on_delta=on_delta))
+        elapsed = time.perf_counter() - started
+
+        # The four running requests are reported; the rest never started
+        assert elapsed < 2
+        assert len(results) == 4
+        assert all(result["error"] == "Cancelled" for result in results)
+        deadline = time.perf_counter() + 2
+        while wrapper.connection_pool._transport.active and time.perf_counter() < deadline:
+            time.sleep(0.02)
+        assert wrapper.connection_pool._transport.active == 0
+    assert server.stats["requests"] <= 4
+
+
+def test_deadline_fails_slow_calls_quickly():
+    with MockOpenAIServer(latency="const:5") as server:
+        wrapper = make_wrapper(server, deadline=0.5, retry_policy=RetryPolicy(max_retries=3))
+        started = time.perf_counter()
+        results = list(wrapper.iter_generate(make_requests(2)))
+    assert time.perf_counter() - started < 2
+    assert all("Deadline" in result["error"] for result in results)
+
+
+def test_deadline_covers_retries():
+    with MockOpenAIServer(error_rate=1.0) as server:
+        wrapper = make_wrapper(server, deadline=0.5,
+                               retry_policy=RetryPolicy(max_retries=100, base_delay=0.05, max_delay=0.1))
+        started = time.perf_counter()
+        results = list(wrapper.iter_generate(make_requests(1)))
+    assert time.perf_counter() - started < 1.5
+    assert "Deadline" in results[0]["error"]
+
+
+def test_slow_calls_are_hedged_and_losers_aborted():
+    with MockOpenAIServer() as server:
+        # The first attempt hangs; its hedge answers at once
+        server.latency = latencies(5.0)
+        wrapper = make_wrapper(server, hedge_percentile=90)
+        wrapper._latencies["gpt-4o-mini"].extend([0.05] * HEDGE_MIN_SAMPLES)
+        started = time.perf_counter()
+        results = list(wrapper.iter_generate(make_requests(1)))
+        assert time.perf_counter() - started < 1.5
+
+        assert results[0]["hedged"] and results[0]["response"]
+        assert server.stats["requests"] == 2
+        deadline = time.perf_counter() + 2
+        while wrapper.connection_pool._transport.active and time.perf_counter() < deadline:
+            time.sleep(0.02)
+        assert wrapper.connection_pool._transport.active == 0
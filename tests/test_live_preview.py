@@ -0,0 +1,228 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from connection_pool import ConnectionPool
+from experiment_store import ExperimentStore
+from metrics import MetricsRegistry
+from mock_server import MockOpenAIServer
+from openai_wrapper import AsyncOpenAIWrapper, EventLoopThread, OpenAIWrapper
+from prompt_playground import LIVE_PREVIEW_MAX_TOKENS, PromptPlayground
+
+
+class Var:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class Text:
+    def __init__(self, text=""):
+        self.text = text
+
+    def get(self, start, end):
+        return self.text + "\n"
+
+    def delete(self, start, end):
+        self.text = ""
+
+    def insert(self, index, text):
+        self.text += text
+
+    def see(self, index):
+        pass
+
+
+class Widget:
+    def __init__(self, **options):
+        self.options = options
+
+    def config(self, **options):
+        self.options.update(options)
+
+    def __getitem__(self, key):
+        return self.options[key]
+
+
+class Timers:
+    """Stands in for Tk's after/after_cancel with a manual clock (in ms)."""
+
+    def __init__(self):
+        self.now = 0
+        self.pending = {}
+        self.ids = 0
+
+    def after(self, delay, callback, *args):
+        self.ids += 1
+        self.pending[self.ids] = (self.now + delay, callback, args)
+        return self.ids
+
+    def after_cancel(self, timer):
+        self.pending.pop(timer, None)
+
+    def advance(self, ms):
+        self.now += ms
+        for timer, (due, callback, args) in sorted(self.pending.items(), key=lambda item: item[1][0]):
+            if due <= self.now and self.pending.pop(timer, None):
+                callback(*args)
+
+
+def make_playground(server=None):
+    playground = PromptPlayground.__new__(PromptPlayground)
+    timers = Timers()
+    playground.after = timers.after
+    playground.after_cancel = timers.after_cancel
+    playground.timers = timers
+
+    playground.ui_queue = queue.Queue()
+    playground.single_deltas = []
+    playground.single_deltas_lock = threading.Lock()
+    playground.preview_timer = None
+    playground.preview_future = None
+    playground.preview_generation = 0
+    playground.preview_loop = None
+    playground.preview_api = None
+    playground.live_preview_var = Var(True)
+    playground.preview_delay_var = Var(600)
+
+    playground.model_var = Var("gpt-4o-mini")
+    playground.system_prompt = Text("You are a copywriter.")
+    playground.user_prompt = Text("Describe:")
+    playground.product_var = Var("phone")
+    playground.temp_var = Var(0.7)
+    playground.tokens_var = Var(500)
+    playground.presence_var = Var(0.0)
+    playground.frequency_var = Var(0.0)
+    playground.stop_var = Var("")
+    playground.cache_var = Var(False)
+    playground.rate_limiter = None
+    playground.metrics = MetricsRegistry()
+    playground.result_text = Text()
+    playground.param_summary = Widget(text="")
+    playground.generate_btn = Widget(state="normal")
+
+    if server is not None:
+        playground.preview_loop = EventLoopThread()
+        playground.preview_api = AsyncOpenAIWrapper(base_url=server.base_url, api_key="mock",
+                                                    metrics=playground.metrics, pool=ConnectionPool())
+    return playground
+
+
+def drain(playground, until, timeout=5.0):
+    """Apply queued UI updates (as _drain_ui_queue does) until until() holds."""
+    deadline = time.perf_counter() + timeout
+    while not until():
+        assert time.perf_counter() < deadline, "timed out waiting for the preview"
+        try:
+            handler, args = playground.ui_queue.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        handler(*args)
+
+
+def test_edits_restart_the_debounce_timer():
+    playground = make_playground()
+    started = []
+    playground._start_preview = lambda: started.append(playground.timers.now)
+
+    for _ in range(5):
+        playground._schedule_preview()
+        playground.timers.advance(400)
+    assert started == []
+    assert len(playground.timers.pending) == 1
+
+    playground.timers.advance(200)
+    assert started == [2200]
+
+
+def test_preview_off_schedules_nothing():
+    playground = make_playground()
+    playground.live_preview_var.set(False)
+    playground._schedule_preview()
+    assert playground.timers.pending == {}
+
+
+def test_edit_cancels_the_preview_in_flight_and_drops_its_late_deltas():
+    playground = make_playground()
+
+    class Future:
+        cancelled = False
+
+        def cancel(self):
+            self.cancelled = True
+
+    future = playground.preview_future = Future()
+    generation = playground.preview_generation
+    playground._schedule_preview()
+    assert future.cancelled
+    assert playground.preview_future is None
+
+    playground._append_preview_delta(generation, "stale")
+    playground._preview_finished(generation, {}, "stale", None, {})
+    assert playground.result_text.text == ""
+
+
+def test_preview_streams_into_the_result_box():
+    with MockOpenAIServer(token_interval=0.001) as server:
+        playground = make_playground(server)
+        playground._schedule_preview()
+        playground.timers.advance(600)
+        assert playground.preview_future is not None
+
+        drain(playground, lambda: playground.preview_future is None)
+        text = playground.result_text.text
+        assert text and not text.startswith("Error")
+        assert len(text.split()) <= LIVE_PREVIEW_MAX_TOKENS
+        assert playground.param_summary["text"].startswith("Live preview (gpt-4o-mini")
+        assert playground.metrics.snapshot()["gpt-4o-mini"]["calls"] == 1
+        playground.preview_loop.stop()
+
+
+def test_superseded_preview_is_cancelled_and_not_recorded():
+    with MockOpenAIServer(latency="const:5") as server:
+        playground = make_playground(server)
+        playground._schedule_preview()
+        playground.timers.advance(600)
+        future = playground.preview_future
+        time.sleep(0.3)
+
+        started = time.perf_counter()
+        playground._schedule_preview()
+        with pytest.raises(Exception):
+            future.result(timeout=2)
+        assert future.cancelled()
+        assert time.perf_counter() - started < 1
+        # Let the cancelled task wind down on the event loop
+        time.sleep(0.2)
+        assert playground.metrics.snapshot() == {}
+        playground.preview_loop.stop()
+
+
+def test_streamed_deltas_between_drains_are_inserted_together():
+    with MockOpenAIServer() as server:
+        playground = make_playground()
+        playground.experiment_store = ExperimentStore(":memory:")
+        api = OpenAIWrapper(base_url=server.base_url, api_key="mock", pool=ConnectionPool())
+        request = dict(model="gpt-4o-mini", system_prompt="", user_prompt="Describe:", product="phone",
+                       temperature=0.7, max_tokens=20, presence_penalty=0.0, frequency_penalty=0.0,
+                       stop_sequence=None, n=1)
+        # Nothing drains the queue while the worker runs: one insert, then the result
+        playground._generate_single_thread(api, request, True)
+
+    handlers = [handler for handler, _ in list(playground.ui_queue.queue)]
+    assert handlers == [playground._flush_single_deltas, playground._update_single_result]
+    handler, args = playground.ui_queue.get()
+    handler(*args)
+    streamed = playground.result_text.text
+    handler, (content, params) = playground.ui_queue.get()
+    assert streamed == content and len(content.split()) == 20
+    assert params["model"] == "gpt-4o-mini" and "latency" in params
+    assert playground.experiment_store.latest_runs(playground.current_sweep_id)[0]["response"] == content
+    playground.experiment_store.close()
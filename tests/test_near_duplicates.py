@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from near_duplicates import MinHasher, MinHashIndex, SimilarPromptCache, lsh_bands
+
+
+def random_text(rng, words=60):
+    return " ".join("w%d" % rng.randrange(5000) for _ in range(words))
+
+
+def edit(rng, text, changes):
+    words = text.split()
+    for position in rng.sample(range(len(words)), changes):
+        words[position] = "edited%d" % position
+    return " ".join(words)
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.7, 0.9])
+def test_lsh_bands_put_the_threshold_on_the_s_curve(threshold):
+    bands, rows = lsh_bands(threshold, 128)
+    assert bands * rows == 128
+
+    # Pairs at the threshold usually share a bucket, pairs above it almost
+    # always do and pairs well below it rarely do
+    def collides(s):
+        return 1 - (1 - s ** rows) ** bands
+    assert collides(threshold) > 0.5
+    assert collides(min(1.0, threshold + 0.1)) > 0.9
+    assert collides(threshold - 0.3) < 0.5
+
+
+def test_index_clusters_near_duplicates_only():
+    rng = random.Random(0)
+    index = MinHashIndex()
+    base = random_text(rng)
+    index.add("a", base)
+    index.add("b", edit(rng, base, 1))
+    index.add("c", random_text(rng))
+
+    assert index.cluster_of("a") == index.cluster_of("b")
+    assert index.cluster_of("a")[1] == 2
+    assert index.cluster_of("c")[1] == 1
+    assert [sorted(cluster) for cluster in index.clusters()] == [["a", "b"]]
+    assert [key for key, _ in index.query(base)][0] == "a"
+    assert index.cluster_of("missing") == (None, 0)
+
+
+def test_remove_keeps_the_rest_of_the_cluster():
+    rng = random.Random(1)
+    index = MinHashIndex()
+    base = random_text(rng)
+    for key in range(3):
+        index.add(key, edit(rng, base, 1))
+    root, size = index.cluster_of(0)
+    assert size == 3
+
+    index.remove(root)
+    assert root not in index
+    assert len(index) == 2
+    remaining = [key for key in range(3) if key != root]
+    assert index.cluster_of(remaining[0]) == index.cluster_of(remaining[1])
+    assert index.cluster_of(remaining[0])[1] == 2
+    assert all(key != root for key, _ in index.query(base, threshold=0.0))
+
+
+def test_similar_prompt_cache_forgets_evicted_answers():
+    rng = random.Random(2)
+    cache = SimilarPromptCache(max_prompts=50)
+    prompts = [random_text(rng) for _ in range(200)]
+    for number, prompt in enumerate(prompts):
+        request = {"model": "m", "temperature": 0.0, "messages": [{"role": "user", "content": prompt}]}
+        cache.put(request, "product", f"answer {number}")
+
+    (index,) = cache._indexes.values()
+    assert len(index) == 50
+    assert cache.get({"model": "m", "temperature": 0.0,
+                      "messages": [{"role": "user", "content": prompts[0]}]}, "product") is None
+    answer, similarity = cache.get({"model": "m", "temperature": 0.0,
+                                    "messages": [{"role": "user", "content": prompts[-1]}]}, "product")
+    assert answer == "answer 199"
+    assert similarity == pytest.approx(1.0)
+
+
+def test_similar_prompt_cache_hashes_outside_its_lock():
+    class CheckingHasher(MinHasher):
+        def signature(self, text):
+            assert not cache._lock.locked()
+            self.calls += 1
+            return super().signature(text)
+
+    hasher = CheckingHasher()
+    hasher.calls = 0
+    cache = SimilarPromptCache(hasher=hasher)
+    request = {"model": "m", "temperature": 0.0, "messages": [{"role": "user", "content": "Describe the phone"}]}
+    cache.put(request, "product", "answer")
+    # put hashes the prompt once, and the lookup once more
+    assert cache.get(request, "product")[0] == "answer"
+    assert hasher.calls == 2
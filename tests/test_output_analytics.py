@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+import pytest
+
+from output_analytics import OutputAnalytics, word_hash
+
+
+def random_texts(count, vocabulary=5000, length=120, seed=0):
+    rng = random.Random(seed)
+    words = ["w%d" % i for i in range(vocabulary)]
+    return [" ".join(rng.choice(words) for _ in range(length)) for _ in range(count)]
+
+
+def test_unrelated_outputs_have_no_overlap():
+    analytics = OutputAnalytics()
+    for index, text in enumerate(random_texts(20000)):
+        analytics.add(index, text)
+    overlap = analytics.metrics()["overlap"]
+    assert overlap.max() < 0.001
+
+
+def test_identical_outputs_overlap_fully():
+    analytics = OutputAnalytics()
+    analytics.add(0, "the cat sat on the mat")
+    analytics.add(1, "the cat sat on the mat")
+    analytics.add(2, "completely different words here")
+    metrics = analytics.metrics()
+    assert metrics["overlap"] == pytest.approx([0.5, 0.5, 0.0])
+    assert metrics["similarity"] == pytest.approx([0.5, 0.5, 0.0])
+    assert analytics.similarity_matrix([0, 1]) == pytest.approx(np.ones((2, 2)))
+    assert analytics.overlap_matrix([0, 2]) == pytest.approx(np.eye(2))
+
+
+def test_replacing_an_output_matches_adding_it_fresh():
+    replaced = OutputAnalytics()
+    for index, text in enumerate(random_texts(50, vocabulary=30, length=20)):
+        replaced.add(index, text)
+    replaced.metrics()
+    texts = random_texts(50, vocabulary=30, length=20, seed=1)
+    for index in range(0, 50, 3):
+        replaced.add(index, texts[index])
+
+    fresh = OutputAnalytics()
+    for index, text in enumerate(random_texts(50, vocabulary=30, length=20)):
+        fresh.add(index, texts[index] if index % 3 == 0 else text)
+
+    for name, values in fresh.metrics().items():
+        assert replaced.metrics()[name] == pytest.approx(values), name
+
+
+def test_word_hash_is_stable():
+    # Pinned so the hashes can't silently depend on PYTHONHASHSEED
+    assert word_hash("hello") == 0x7D34E501A8EDB6A7
+    assert word_hash("hello") != word_hash("world")
+
+
+def test_sort_indices_puts_untracked_last():
+    analytics = OutputAnalytics()
+    analytics.add(0, "one two three four")
+    analytics.add(1, "one")
+    analytics.add(2, "")
+    assert analytics.sort_indices("words", [5, 0, 1, 2]) == [2, 1, 0, 5]
+    assert analytics.sort_indices("words", [0, 1, 2], descending=True) == [0, 1, 2]
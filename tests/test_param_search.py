@@ -0,0 +1,120 @@
+import pytest
+
+from param_search import HALVING_ETA, ParameterSearch, length_scorer, load_scorer
+
+
+class FakeWrapper:
+    """Answers with as many words as the temperature asks for (10 per 0.1)."""
+
+    def __init__(self, fail=lambda request: False):
+        self.completions = 0
+        self.fail = fail
+
+    def iter_generate(self, requests, max_workers=None, cancel=None):
+        for index, request in enumerate(requests):
+            self.completions += request["n"]
+            if self.fail(request):
+                yield {"index": index, "error": "Cancelled"}
+                continue
+            words = round(request["temperature"] * 100)
+            text = " ".join(["word"] * words)
+            result = {"index": index, "response": text}
+            if request["n"] > 1:
+                result["responses"] = [text] * request["n"]
+            yield result
+
+
+PROMPTS = [
+    {"model": "m", "system_prompt": "s", "user_prompt": "u", "product": "a"},
+    {"model": "m", "system_prompt": "s", "user_prompt": "u", "product": "b"},
+]
+
+
+def search(strategy, budget, seed=0):
+    wrapper = FakeWrapper()
+    searcher = ParameterSearch(wrapper, PROMPTS, length_scorer(100), strategy=strategy,
+                               budget=budget, max_workers=4, seed=seed)
+    results = list(searcher.iter_results())
+    return searcher, wrapper, results
+
+
+def test_halving_cost_counts_every_rung():
+    searcher = ParameterSearch(FakeWrapper(), PROMPTS, length_scorer(100), strategy="halving")
+    # 9 configurations x 1 sample, 3 x 3 (2 new), 1 x 9 (6 new), on 2 prompts
+    assert searcher._halving_cost(9) == (9 * 1 + 3 * 2 + 1 * 6) * len(PROMPTS)
+    assert searcher._halving_cost(1) == len(PROMPTS)
+
+
+@pytest.mark.parametrize("budget", [2, 10, 37, 60, 200])
+def test_halving_stays_within_budget(budget):
+    searcher, wrapper, results = search("halving", budget)
+    assert wrapper.completions == searcher.used <= budget
+    assert results
+
+
+def test_halving_gives_survivors_more_samples():
+    searcher, _, _ = search("halving", 120)
+    samples = sorted(entry[2] for entry in searcher._scores.values())
+    # The winner went through every rung; the first rung's losers got one sample per prompt
+    assert samples[-1] in [HALVING_ETA ** rung * len(PROMPTS) for rung in range(2, 6)]
+    assert samples[0] == len(PROMPTS)
+    assert samples.count(samples[-1]) == 1
+
+
+@pytest.mark.parametrize("strategy", ["random", "tpe"])
+def test_searches_stay_within_budget(strategy):
+    searcher, wrapper, results = search(strategy, 41)
+    assert wrapper.completions == searcher.used <= 41
+    assert len(results) == searcher.requests_sent
+    assert sorted(result["index"] for result in results) == list(range(len(results)))
+
+
+def test_tpe_proposals_move_towards_the_best_scores():
+    searcher, _, _ = search("tpe", 120, seed=3)
+    config, score = searcher.best()
+    # The scorer peaks at temperature 1.0
+    assert config["temperature"] == pytest.approx(1.0, abs=0.1)
+    assert score > 0.9
+
+    # Proposals concentrate around the good configurations
+    proposals = [searcher._tpe_propose()["temperature"] for _ in range(50)]
+    assert sum(abs(temperature - 1.0) <= 0.3 for temperature in proposals) > 25
+
+
+def test_budget_must_cover_one_configuration():
+    with pytest.raises(ValueError):
+        ParameterSearch(FakeWrapper(), PROMPTS, length_scorer(10), budget=1)
+
+
+@pytest.mark.parametrize("spec", ["length:0", "length:-5", "length:many", "keywords:, ,", "length"])
+def test_load_scorer_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        load_scorer(spec)
+
+
+def test_load_scorer():
+    assert load_scorer("length:4")("one two three four") == 1.0
+    assert load_scorer("keywords:Fast, cheap")("fast and reliable") == 0.5
+
+
+@pytest.mark.parametrize("strategy", ["random", "halving", "tpe"])
+def test_failed_requests_are_not_scored(strategy):
+    # Configurations near the scorer's peak fail; they must not be ranked as scoring 0
+    wrapper = FakeWrapper(fail=lambda request: request["temperature"] >= 0.8)
+    searcher = ParameterSearch(wrapper, PROMPTS, length_scorer(100), strategy=strategy,
+                               budget=60, max_workers=4, seed=1)
+    results = list(searcher.iter_results())
+
+    failed = [result for result in results if "error" in result]
+    assert failed and all("score" not in result for result in failed)
+    assert all(config["temperature"] < 0.8 for config, _, _ in searcher.ranking())
+    assert all(samples > 0 for _, _, samples in searcher.ranking())
+    assert searcher.best()[1] > 0
+
+
+def test_tpe_keeps_exploring_when_everything_failed():
+    wrapper = FakeWrapper(fail=lambda request: True)
+    searcher = ParameterSearch(wrapper, PROMPTS, length_scorer(100), strategy="tpe", budget=20, seed=0)
+    results = list(searcher.iter_results())
+    assert len(results) == searcher.requests_sent > 0
+    assert searcher.best() == (None, None)
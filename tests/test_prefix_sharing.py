@@ -0,0 +1,67 @@
+import itertools
+
+from mock_server import MockOpenAIServer
+from openai_wrapper import OpenAIWrapper, iter_sweep_requests, plan_prefix_sharing, truncate_to_tokens
+
+
+def request(temperature=0, max_tokens=100, product="phone", n=1):
+    return dict(model="gpt-4o-mini", system_prompt="You are a copywriter.", user_prompt="Describe:",
+                product=product, temperature=temperature, max_tokens=max_tokens, n=n)
+
+
+def test_groups_temperature_zero_requests_that_differ_only_in_max_tokens():
+    requests = [request(max_tokens=50), request(max_tokens=200), request(max_tokens=100),
+                request(temperature=0.7, max_tokens=300), request(max_tokens=80, product="laptop"),
+                request(max_tokens=300, n=2)]
+    planned, followers = plan_prefix_sharing(enumerate(requests))
+
+    # Leaders and unshareable requests, in input order
+    assert [index for index, _ in planned] == [1, 3, 4, 5]
+    # Followers longest first
+    assert followers == {1: [(2, requests[2]), (0, requests[0])]}
+
+
+def test_nothing_to_share():
+    requests = [request(temperature=0.5), request(product="laptop")]
+    planned, followers = plan_prefix_sharing(enumerate(requests))
+    assert planned == list(enumerate(requests))
+    assert followers == {}
+
+
+def test_truncate_on_token_boundaries():
+    content = "Hello big world"
+    token_ends = [5, 9, 15]
+    assert truncate_to_tokens(content, token_ends, 1) == "Hello"
+    assert truncate_to_tokens(content, token_ends, 2) == "Hello big"
+    assert truncate_to_tokens(content, token_ends, 3) == content
+    assert truncate_to_tokens(content, token_ends, 10) == content
+
+
+def test_truncate_drops_a_split_multibyte_character():
+    # "é" is two bytes, split across two tokens
+    content = "café!"
+    token_ends = [4, 5, 6]
+    assert truncate_to_tokens(content, token_ends, 1) == "caf"
+    assert truncate_to_tokens(content, token_ends, 2) == "café"
+
+
+def test_shared_sweep_sends_one_request_per_group():
+    requests = list(iter_sweep_requests(["gpt-4o-mini"], ["You are a copywriter."], ["Describe:"],
+                                        ["phone", "laptop"], [0], [5, 10, 20], [0.0], [0.0]))
+    with MockOpenAIServer() as server:
+        wrapper = OpenAIWrapper(base_url=server.base_url, api_key="mock")
+        results = {result["index"]: result for result in wrapper.iter_generate(requests, share_prefixes=True)}
+        assert server.stats["requests"] == 2
+
+    assert sorted(results) == list(range(len(requests)))
+    assert all("error" not in result for result in results.values())
+    for product, group in itertools.groupby(sorted(results.values(), key=lambda r: r["index"]),
+                                            key=lambda r: r["product"]):
+        group = list(group)
+        leader = next(result for result in group if "derived_from" not in result)
+        assert leader["parameters"]["max_tokens"] == 20
+        for result in group:
+            assert leader["response"].startswith(result["response"])
+            if result is not leader:
+                assert result["derived_from"]["index"] == leader["index"]
+                assert len(result["response"].split()) == result["parameters"]["max_tokens"]
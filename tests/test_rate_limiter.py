@@ -0,0 +1,111 @@
+import httpx
+import openai
+import pytest
+
+from rate_limiter import RateLimiter, RetryPolicy, TokenBucket, estimate_tokens
+
+
+def status_error(status, headers=None):
+    request = httpx.Request("POST", "http://api/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    error_class = {429: openai.RateLimitError, 400: openai.BadRequestError}.get(status, openai.InternalServerError)
+    return error_class("Error", response=response, body=None)
+
+
+def test_estimate_tokens_counts_prompt_and_every_choice():
+    request = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 50, "n": 3}
+    assert estimate_tokens(request) == 100 + 150
+
+
+def test_bucket_goes_into_debt_and_reports_the_wait():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    assert bucket.reserve(60, 0.0) == 0.0
+    # One unit per second: the next 30 are covered after 30 seconds
+    assert bucket.reserve(30, 0.0) == pytest.approx(30.0)
+    assert bucket.delay(1, 0.0) == pytest.approx(31.0)
+    # Refilling is continuous
+    assert bucket.delay(1, 20.0) == pytest.approx(11.0)
+
+
+def test_bucket_clamps_oversized_reservations_to_its_capacity():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    assert bucket.reserve(1000, 0.0) == 0.0
+    assert bucket.tokens == 0.0
+
+
+def test_refund_is_capped_at_capacity():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    bucket.reserve(40, 0.0)
+    bucket.refund(25)
+    assert bucket.tokens == 45
+    bucket.refund(100)
+    assert bucket.tokens == 60
+
+
+def test_limiter_waits_for_the_tighter_of_its_limits():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=60)
+    assert limiter.reserve(60) == 0.0
+    # The request bucket has room, the token bucket needs a minute to refill
+    assert limiter.reserve(30) == pytest.approx(30.0, abs=0.1)
+    limiter.refund(30)
+    assert limiter.delay(30) == pytest.approx(30.0, abs=0.1)
+
+
+def test_limiter_refunds_an_unsent_request():
+    limiter = RateLimiter(requests_per_minute=1)
+    limiter.reserve()
+    assert limiter.delay() == pytest.approx(60.0, abs=0.1)
+    limiter.refund(0, requests=1)
+    assert limiter.delay() == pytest.approx(0.0, abs=0.1)
+
+
+def test_pause_holds_back_every_caller():
+    limiter = RateLimiter(requests_per_minute=600)
+    limiter.pause(5)
+    assert limiter.reserve() == pytest.approx(5.0, abs=0.1)
+
+
+def test_retryable_errors():
+    assert RetryPolicy.is_retryable(status_error(429))
+    assert RetryPolicy.is_retryable(status_error(500))
+    assert RetryPolicy.is_retryable(openai.APIConnectionError(request=httpx.Request("GET", "http://api")))
+    assert not RetryPolicy.is_retryable(status_error(400))
+    assert not RetryPolicy.is_retryable(ValueError("bad"))
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "250"}, 0.25),
+    ({"retry-after": "3"}, 3.0),
+    ({"retry-after-ms": "100", "retry-after": "3"}, 0.1),
+    ({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, None),
+    ({}, None),
+])
+def test_retry_after_reads_the_response_headers(headers, expected):
+    assert RetryPolicy.retry_after(status_error(429, headers)) == expected
+
+
+def test_retry_after_takes_precedence_with_a_little_jitter():
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    delays = [policy.delay_for(0, status_error(429, {"retry-after": "2"})) for _ in range(200)]
+    assert all(2.0 <= delay <= 2.25 for delay in delays)
+    assert len(set(delays)) > 1
+    # Capped at max_delay like any other wait
+    assert policy.delay_for(0, status_error(429, {"retry-after": "60"})) <= 10.25
+
+
+def test_backoff_is_full_jitter_up_to_the_exponential_cap():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    for attempt, cap in [(0, 1.0), (1, 2.0), (2, 4.0), (4, 5.0)]:
+        delays = [policy.delay_for(attempt, status_error(500)) for _ in range(200)]
+        assert all(0.0 <= delay <= cap for delay in delays)
+        assert max(delays) > cap / 2
+
+
+def test_gives_up_after_max_retries_or_on_client_errors():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.delay_for(1, status_error(500)) is not None
+    assert policy.delay_for(2, status_error(500)) is None
+    assert policy.delay_for(0, status_error(400)) is None
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+
+def size_of(value):
+    return len(json.dumps(value).encode("utf-8"))
+
+
+def test_keys_ignore_dict_order_but_not_parameters():
+    a = ResponseCache.make_key({"model": "m", "temperature": 0, "messages": []})
+    b = ResponseCache.make_key({"messages": [], "temperature": 0, "model": "m"})
+    c = ResponseCache.make_key({"model": "m", "temperature": 0.5, "messages": []})
+    assert a == b != c
+
+
+def test_only_low_temperatures_are_cacheable():
+    assert ResponseCache(":memory:").is_cacheable(0.0)
+    assert not ResponseCache(":memory:").is_cacheable(0.7)
+    assert ResponseCache(":memory:", max_temperature=None).is_cacheable(2.0)
+
+
+def test_round_trip_and_hit_counts(clock):
+    cache = ResponseCache(":memory:")
+    assert cache.get("a") is None
+    cache.put("a", {"content": "hello"})
+    assert cache.get("a") == {"content": "hello"}
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": size_of({"content": "hello"})}
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(":memory:", ttl=60)
+    cache.put("a", "old")
+    clock[0] += 30
+    cache.put("b", "new")
+    clock[0] += 31
+    assert cache.get("a") is None
+    assert cache.get("b") == "new"
+    assert cache.stats()["entries"] == 1
+
+    # Expired entries are also swept out when something else is stored
+    clock[0] += 61
+    cache.put("c", "newest")
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_first(clock):
+    cache = ResponseCache(":memory:", max_entries=3, ttl=None)
+    for key in "abc":
+        cache.put(key, key)
+        clock[0] += 1
+    # Reading a refreshes it, so b is now the least recently used
+    cache.get("a")
+    clock[0] += 1
+    cache.put("d", "d")
+    assert [key for key in "abcd" if cache.get(key) is not None] == ["a", "c", "d"]
+
+
+def test_byte_limit_evicts_until_under_it(clock):
+    value = "x" * 100
+    cache = ResponseCache(":memory:", max_bytes=3 * size_of(value), ttl=None)
+    for key in "abcd":
+        cache.put(key, value)
+        clock[0] += 1
+    assert cache.stats()["entries"] == 3
+    assert cache.stats()["bytes"] == 3 * size_of(value)
+    assert cache.get("a") is None
+
+
+def test_running_totals_track_replacements_and_survive_reopening(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path)
+    cache.put("a", "short")
+    cache.put("a", "a much longer value")
+    cache.put("b", "other")
+    expected = {"entries": 2, "bytes": size_of("a much longer value") + size_of("other")}
+    assert {key: cache.stats()[key] for key in expected} == expected
+    cache.close()
+
+    reopened = ResponseCache(path)
+    assert {key: reopened.stats()[key] for key in expected} == expected
+    reopened.clear()
+    assert reopened.stats()["entries"] == reopened.stats()["bytes"] == 0
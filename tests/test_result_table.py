@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from result_table import ResultTable
+
+
+def make_result(index, **overrides):
+    result = {
+        "index": index,
+        "model": "gpt-4o-mini",
+        "system_prompt": "You are a copywriter.",
+        "user_prompt": "Describe:",
+        "product": f"product {index % 3}",
+        "parameters": {"temperature": 0.1 * index, "max_tokens": 100,
+                       "presence_penalty": 0.0, "frequency_penalty": 0.5},
+        "response": f"response {index}",
+        "latency": 0.5 + index,
+        "usage": {"prompt_tokens": 10, "completion_tokens": 20 + index, "total_tokens": 30 + index},
+        "cost": 0.001 * index
+    }
+    result.update(overrides)
+    return result
+
+
+def sample_results():
+    results = [make_result(index) for index in range(5)]
+    results[1]["responses"] = ["first sample", "second sample"]
+    results[2] = {"index": 2, "model": "gpt-4o-mini", "system_prompt": "You are a copywriter.",
+                  "user_prompt": "Describe:", "product": "product 2",
+                  "parameters": {"temperature": 0.2, "max_tokens": 100,
+                                 "presence_penalty": 0.0, "frequency_penalty": 0.5},
+                  "error": "Rate limited"}
+    return results
+
+
+@pytest.fixture
+def table():
+    table = ResultTable()
+    table.extend(sample_results())
+    return table
+
+
+def test_rows_round_trip(table):
+    assert list(table) == sample_results()
+    assert table.result_for(1)["responses"] == ["first sample", "second sample"]
+    assert table.sample_count(table.row_of(1)) == 2
+
+
+def test_take_round_trips(table):
+    results = sample_results()
+    taken = table.take([4, 1, 2])
+    assert list(taken) == [results[4], results[1], results[2]]
+    assert taken.row_of(1) == 1
+    assert list(table.take([])) == []
+    assert list(table[1:3]) == results[1:3]
+
+
+def test_filter(table):
+    assert list(table.rows(temperature=(">=", 0.3))) == [3, 4]
+    assert [result["index"] for result in table.filter(product="product 1")] == [1, 4]
+    assert len(table.filter(product="unknown")) == 0
+
+
+def test_latest_skips_replaced_rows(table):
+    table.append(make_result(3, cost=1.0))
+    latest = table.latest()
+    assert list(latest) == [True, True, True, False, True, True]
+    assert np.nansum(table.column("cost")[latest]) == pytest.approx(0.001 * (1 + 4) + 1.0)
+    assert table.result_for(3)["cost"] == 1.0
+
+
+def test_to_arrow_round_trips(table):
+    pa = pytest.importorskip("pyarrow")
+    arrow = table.to_arrow()
+    assert isinstance(arrow, pa.Table)
+    assert arrow.num_rows == len(table)
+    assert arrow.column("response").to_pylist()[:2] == ["response 0", "response 1"]
+    assert arrow.column("response")[2].as_py() is None
+    assert arrow.column("latency").to_pylist()[2] is None
+
+
+def test_parquet_round_trips(table, tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "results.parquet"
+    table.to_parquet(str(path))
+    assert parquet.read_table(str(path)).equals(table.to_arrow())
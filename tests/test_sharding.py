@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from sharding import ShardSkip, iter_result_files, merge_results, parse_shard, shard_of
+
+
+def test_shards_partition_the_grid():
+    count = 4
+    owners = [shard_of(index, count) for index in range(100)]
+    assert set(owners) == set(range(1, count + 1))
+    for shard in range(1, count + 1):
+        skip = ShardSkip(shard, count)
+        assert [index for index in range(100) if index not in skip] == \
+            [index for index, owner in enumerate(owners) if owner == shard]
+
+
+@pytest.mark.parametrize("value", ["0/2", "3/2", "1", "a/b"])
+def test_parse_shard_rejects_bad_values(value):
+    with pytest.raises(ValueError):
+        parse_shard(value)
+
+
+def test_merge_prefers_successes_and_later_results():
+    results = [
+        {"index": 0, "response": "first"},
+        {"index": 2, "error": "Rate limited"},
+        {"index": 0, "response": "retried"},
+        {"index": 2, "response": "ok"},
+        {"index": 3, "response": "kept"},
+        {"index": 3, "error": "Cancelled"},
+        {"index": 5, "error": "Timed out"},
+    ]
+    merged, stats = merge_results(results)
+    assert merged == [
+        {"index": 0, "response": "retried"},
+        {"index": 2, "response": "ok"},
+        {"index": 3, "response": "kept"},
+        {"index": 5, "error": "Timed out"},
+    ]
+    assert stats == {"read": 7, "duplicates": 3, "errors": 1, "missing": [1, 4]}
+
+    # Cells after the last one read are only known to be missing given the grid size
+    merged, stats = merge_results(results, total=8)
+    assert len(merged) == 4
+    assert stats["missing"] == [1, 4, 6, 7]
+    assert merge_results([], total=2)[1]["missing"] == [0, 1]
+
+
+def test_merge_of_nothing():
+    assert merge_results([]) == ([], {"read": 0, "duplicates": 0, "errors": 0, "missing": []})
+
+
+def test_result_files_skip_truncated_lines(tmp_path):
+    first = tmp_path / "shard-1.jsonl"
+    second = tmp_path / "shard-2.jsonl"
+    first.write_text(json.dumps({"index": 0}) + "\n\n" + json.dumps({"index": 2}) + "\n")
+    second.write_text(json.dumps({"index": 1}) + "\n" + '{"index": 3, "resp')
+    merged, stats = merge_results(iter_result_files([str(first), str(second)]))
+    assert [result["index"] for result in merged] == [0, 1, 2]
+    assert stats["read"] == 3
+
+
+def test_merge_with_the_spec_reports_a_missing_tail(tmp_path, capsys):
+    import sweep_runner
+
+    spec = tmp_path / "sweep.json"
+    spec.write_text(json.dumps({"model": "gpt-4o-mini", "user_prompt": "Describe:", "products": ["a", "b"],
+                                "temperatures": [0.0, 1.0], "max_tokens": [10], "presence_penalties": [0.0],
+                                "frequency_penalties": [0.0]}))
+    # Shard 2 of 2 was killed before writing its last cell
+    first = tmp_path / "part1.jsonl"
+    second = tmp_path / "part2.jsonl"
+    first.write_text(json.dumps({"index": 0, "response": "a"}) + "\n" + json.dumps({"index": 2, "response": "c"}))
+    second.write_text(json.dumps({"index": 1, "response": "b"}) + "\n")
+    output = str(tmp_path / "results.jsonl")
+
+    assert sweep_runner.main(["--merge", str(first), str(second), "-o", output]) == 0
+    assert sweep_runner.main([str(spec), "--merge", str(first), str(second), "-o", output]) == 1
+    assert "1 cells missing, e.g. index 3" in capsys.readouterr().err